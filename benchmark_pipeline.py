@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+
+######################################################################
+# default library
+######################################################################
+
+import os
+import sys
+import argparse
+import re
+import json
+import time
+import shutil
+import platform
+import tempfile
+import subprocess
+
+#####################################################################
+# utility
+#####################################################################
+
+def output_error(msg):
+  print('ERROR:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+def output_warn(msg):
+  print('WARN:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+def output_info(msg):
+  print('INFO:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+#####################################################################
+# parameter
+#####################################################################
+
+parser = argparse.ArgumentParser(
+  description='measure the stamp, warp, recognize and match stages')
+parser.add_argument('-s', '--sizes', type=str, default='1920x1080,3840x2160',
+  help='stimulus sizes as <width>x<height>[,...]')
+parser.add_argument('-k', '--roi-counts', type=str, default='1,2,4',
+  help='numbers of rois (points) as <n>[,...]')
+parser.add_argument('-n', '--frames', type=int, default=60)
+parser.add_argument('-f', '--font-file', type=str, default='',
+  help='font file given to write_framenumber.py (default: its default)')
+parser.add_argument('-o', '--out-file', type=str, default='benchmark.json')
+parser.add_argument('-w', '--work-dir', type=str, default='',
+  help='directory for the generated files (default: temporary)')
+
+args = parser.parse_args()
+sizes      = args.sizes
+roi_counts = args.roi_counts
+frame_num  = args.frames
+font_file  = args.font_file
+out_file   = args.out_file
+work_dir   = args.work_dir
+
+if re.match(r'^[0-9]+x[0-9]+(,[0-9]+x[0-9]+)*$', sizes) is None:
+  output_error('invalid sizes specified <' + sizes + '>')
+  sys.exit(1)
+
+if re.match(r'^[0-9]+(,[0-9]+)*$', roi_counts) is None:
+  output_error('invalid roi counts specified <' + roi_counts + '>')
+  sys.exit(1)
+
+if frame_num <= 0:
+  output_error('invalid number of frames specified <' + str(frame_num) + '>')
+  sys.exit(1)
+
+if font_file != '' and not os.access(font_file, os.R_OK):
+  output_error('invalid font file specified <' + font_file + '>')
+  sys.exit(1)
+
+if os.path.isfile(work_dir):
+  output_error('<' + work_dir + '> exists as file')
+  sys.exit(1)
+
+size_list = []
+for size in sizes.split(','):
+  width, height = size.split('x')
+  size_list.append((int(width), int(height)))
+
+roi_count_list = list(map(int, roi_counts.split(',')))
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+#####################################################################
+# external library
+#####################################################################
+
+try:
+  import cv2
+except ImportError:
+  output_error('opencv not found')
+  sys.exit(1)
+
+try:
+  import numpy
+except ImportError:
+  output_error('numpy not found')
+  sys.exit(1)
+
+try:
+  from cvtest.stamp import default_font_file
+except ImportError:
+  output_error('cvtest not found')
+  sys.exit(1)
+
+# the stages run without their messages, so that the font is checked
+# here rather than on the first stamp
+if font_file == '' and default_font_file() == '':
+  output_error('no font file found (specify it by -f)')
+  sys.exit(1)
+
+#####################################################################
+# setting for the synthetic capture
+#####################################################################
+
+# Each point of write_framenumber.py is placed in its own cell, and each
+# cell becomes one roi. A cell is large enough for the number rectangle
+# and the 300x300 qr code below it.
+cell_width  = 480
+cell_height = 520
+point_offset = 40
+
+# the stimulus is seen slightly from the side in the capture
+capture_corners = [[0.06, 0.05], [0.95, 0.08], [0.92, 0.94], [0.04, 0.91]]
+
+#####################################################################
+# function for preparation
+#####################################################################
+
+def make_source_video(video_file, size):
+  width, height = size
+  writer = cv2.VideoWriter(video_file, cv2.VideoWriter_fourcc(*'MJPG'),
+    30, size)
+
+  if not writer.isOpened():
+    output_error('video writer cannot be opened <' + video_file + '>')
+    sys.exit(1)
+
+  # moving gradient to give the encoder and the detector some content
+  xs = numpy.arange(width, dtype=numpy.uint16)[numpy.newaxis, :]
+  ys = numpy.arange(height, dtype=numpy.uint16)[:, numpy.newaxis]
+  for i in range(frame_num):
+    frame = numpy.empty((height, width, 3), dtype=numpy.uint8)
+    frame[:, :, 0] = (xs + i * 4) % 256
+    frame[:, :, 1] = (ys + i * 2) % 256
+    frame[:, :, 2] = ((xs + ys) // 2 + i) % 256
+    writer.write(frame)
+
+  writer.release()
+
+def make_cells(size, roi_num):
+  width, height = size
+  col_num = width // cell_width
+  row_num = height // cell_height
+
+  if roi_num > col_num * row_num:
+    return None
+
+  cells = []
+  for i in range(roi_num):
+    cells.append(((i % col_num) * cell_width, (i // col_num) * cell_height))
+
+  return cells
+
+def make_capture_matrix(size):
+  width, height = size
+  src_points = numpy.float32([[0, 0], [width, 0], [width, height], [0, height]])
+  dst_points = numpy.float32([[x * width, y * height]
+    for x, y in capture_corners])
+
+  return cv2.getPerspectiveTransform(src_points, dst_points)
+
+def make_capture_video(video_file, image_files, size, matrix):
+  writer = cv2.VideoWriter(video_file, cv2.VideoWriter_fourcc(*'MJPG'),
+    30, size)
+
+  if not writer.isOpened():
+    output_error('video writer cannot be opened <' + video_file + '>')
+    sys.exit(1)
+
+  for image_file in image_files:
+    image = cv2.imread(image_file)
+    writer.write(cv2.warpPerspective(image, matrix, size))
+
+  writer.release()
+
+def write_roi_matrices(case_dir, cells, capture_matrix):
+  inverse = numpy.linalg.inv(capture_matrix)
+  matrix_files = []
+
+  for i, (left, top) in enumerate(cells, 1):
+    # from the capture back to the stimulus, then into the cell
+    shift = numpy.float64([[1, 0, -left], [0, 1, -top], [0, 0, 1]])
+    matrix_file = case_dir + '/roi_{0:02d}.txt'.format(i)
+    numpy.savetxt(matrix_file, shift @ inverse)
+    matrix_files.append(matrix_file)
+
+  return matrix_files
+
+def make_template(image_file, template_file):
+  image = cv2.imread(image_file)
+
+  # the top left finder pattern of the qr code (with its quiet zone)
+  # is the same on every frame
+  top  = point_offset + 30 * 2 + 100
+  left = point_offset
+  cv2.imwrite(template_file, image[top:top + 120, left:left + 120])
+
+  return left, top
+
+#####################################################################
+# function for measurement
+#####################################################################
+
+def get_size(path):
+  if os.path.isfile(path):
+    return os.path.getsize(path)
+
+  total = 0
+  for root, _, files in os.walk(path):
+    for file in files:
+      total += os.path.getsize(os.path.join(root, file))
+
+  return total
+
+# Run a stage as a forked child (not by subprocess, which reaps it by
+# itself), so that wait4 gives its own resource usage: the peak rss of
+# the stage is the largest of the script and its workers.
+def spawn_stage(command, cwd, stdout):
+  pid = os.fork()
+
+  if pid == 0:
+    try:
+      os.chdir(cwd)
+      os.dup2(stdout.fileno(), 1)
+      devnull = os.open(os.devnull, os.O_WRONLY)
+      os.dup2(devnull, 2)
+      os.execv(command[0], command)
+    finally:
+      os._exit(127)
+
+  _, status, usage = os.wait4(pid, 0)
+  return os.waitstatus_to_exitcode(status), usage
+
+def run_stage(name, command, cwd, out_path, stdout_file):
+  with open(stdout_file, 'w') as stdout:
+    start = time.perf_counter()
+    exit_code, usage = spawn_stage(command, cwd, stdout)
+    elapsed = time.perf_counter() - start
+
+  # ru_maxrss is in kilobytes except on macOS
+  if sys.platform == 'darwin':
+    peak_rss = usage.ru_maxrss
+  else:
+    peak_rss = usage.ru_maxrss * 1024
+
+  if exit_code != 0:
+    output_warn('stage failed <' + name + '> (' + str(exit_code) + ')')
+
+  return {
+    'stage':          name,
+    'exit_code':      exit_code,
+    'seconds':        elapsed,
+    'fps':            frame_num / elapsed if elapsed > 0 else 0.0,
+    'peak_rss_bytes': peak_rss,
+    'bytes_written':  get_size(out_path) if os.path.exists(out_path) else 0,
+  }
+
+def script(name):
+  return [sys.executable, os.path.join(script_dir, name)]
+
+#####################################################################
+# function for a case
+#####################################################################
+
+def run_case(case_dir, size, roi_num, cells):
+  width, height = size
+  os.makedirs(case_dir)
+
+  source_file = case_dir + '/source.avi'
+  make_source_video(source_file, size)
+
+  # stamp
+  points = ','.join('{},{}'.format(left + point_offset, top + point_offset)
+    for left, top in cells)
+  command = script('write_framenumber.py') + \
+    ['source.avi', '-p', points, '-a', '-d', 'stamped']
+  if font_file != '':
+    command += ['-f', os.path.abspath(font_file)]
+
+  stamp_list = case_dir + '/stamped.txt'
+  stage_list = [run_stage('stamp', command, case_dir,
+    case_dir + '/stamped', stamp_list)]
+
+  if stage_list[-1]['exit_code'] != 0:
+    return stage_list
+
+  with open(stamp_list) as f:
+    image_files = [case_dir + '/' + line.strip() for line in f if line.strip()]
+
+  # capture
+  capture_file = case_dir + '/capture.avi'
+  capture_matrix = make_capture_matrix(size)
+  make_capture_video(capture_file, image_files, size, capture_matrix)
+  matrix_files = write_roi_matrices(case_dir, cells, capture_matrix)
+
+  # warp
+  transform_command = script('homography_transform.py') + \
+    ['capture.avi', '-c', str(cell_width), '-r', str(cell_height),
+     '-m', ','.join(matrix_files)]
+
+  warped_list = case_dir + '/warped.txt'
+  stage_list.append(run_stage('transform',
+    transform_command + ['-d', 'warped', '-o', 'warped'], case_dir,
+    case_dir + '/warped', warped_list))
+
+  stage_list.append(run_stage('transform_recognize',
+    transform_command + ['--recognize'], case_dir,
+    case_dir + '/records.csv', case_dir + '/records.csv'))
+
+  if stage_list[-2]['exit_code'] != 0:
+    return stage_list
+
+  # recognize
+  stage_list.append(run_stage('recognize',
+    script('recognize_likely_number.py') +
+    ['warped/*.png', '--timeline', 'timeline.csv'], case_dir,
+    case_dir + '/timeline.csv', case_dir + '/statistics.txt'))
+
+  # match
+  with open(warped_list) as f:
+    warped_files = ['warped/' + line.strip() for line in f if line.strip()]
+
+  with open(case_dir + '/targets.txt', 'w') as f:
+    f.write('\n'.join(warped_files) + '\n')
+
+  template_x, template_y = make_template(case_dir + '/' + warped_files[0],
+    case_dir + '/template.png')
+  stage_list.append(run_stage('match',
+    script('is_match.py') +
+    ['template.png', 'targets.txt', '--batch',
+     '-x', str(template_x), '-y', str(template_y)], case_dir,
+    case_dir + '/matched.txt', case_dir + '/matched.txt'))
+
+  return stage_list
+
+#####################################################################
+# main routine
+#####################################################################
+
+if work_dir == '':
+  base_dir = tempfile.mkdtemp(prefix='cvtest_benchmark_')
+  is_temporary = True
+else:
+  base_dir = work_dir
+  is_temporary = False
+
+  if not os.access(base_dir, os.W_OK):
+    output_info('work directory is newly created <' + base_dir + '>')
+    os.makedirs(base_dir)
+
+result_list = []
+
+try:
+  for size in size_list:
+    for roi_num in roi_count_list:
+      cells = make_cells(size, roi_num)
+
+      if cells is None:
+        output_warn('{} rois do not fit in {}x{}'.format(roi_num, *size))
+        continue
+
+      case_name = '{}x{}_{}'.format(size[0], size[1], roi_num)
+      case_dir = base_dir + '/' + case_name
+
+      if os.path.exists(case_dir):
+        shutil.rmtree(case_dir)
+
+      output_info('case <' + case_name + '>')
+
+      for stage in run_case(case_dir, size, roi_num, cells):
+        stage.update({
+          'size':   '{}x{}'.format(*size),
+          'rois':   roi_num,
+          'frames': frame_num,
+        })
+        result_list.append(stage)
+
+        output_info('{:<20} {:>8.1f} fps {:>8.1f} MB rss {:>10.1f} MB written'
+          .format(stage['stage'], stage['fps'],
+            stage['peak_rss_bytes'] / 1e6, stage['bytes_written'] / 1e6))
+finally:
+  if is_temporary:
+    shutil.rmtree(base_dir, ignore_errors=True)
+
+#####################################################################
+# write out
+#####################################################################
+
+try:
+  revision = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=script_dir,
+    capture_output=True, text=True).stdout.strip()
+except OSError:
+  revision = ''
+
+report = {
+  'revision': revision,
+  'created':  time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+  'platform': platform.platform(),
+  'python':   platform.python_version(),
+  'opencv':   cv2.__version__,
+  'results':  result_list,
+}
+
+with open(out_file, 'w') as f:
+  json.dump(report, f, indent=2)
+
+print(out_file)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+######################################################################
+# default library
+######################################################################
+
+import os
+import sys
+import argparse
+import re
+import time
+
+#####################################################################
+# utility
+#####################################################################
+
+def output_error(msg):
+  print('ERROR:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+def output_warn(msg):
+  print('WARN:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+def output_info(msg):
+  print('INFO:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+#####################################################################
+# parameter
+#####################################################################
+
+parser = argparse.ArgumentParser(
+  description='compare warpPerspective with precomputed remap tables')
+parser.add_argument('-s', '--sizes', type=str, default='1920x1080,3840x2160',
+  help='input frame sizes as <width>x<height>[,...]')
+parser.add_argument('-c', '--cols', type=int, default=0,
+  help='output width (default: same as the input)')
+parser.add_argument('-r', '--rows', type=int, default=0,
+  help='output height (default: same as the input)')
+parser.add_argument('-n', '--iterations', type=int, default=100)
+
+args = parser.parse_args()
+sizes          = args.sizes
+target_width   = args.cols
+target_height  = args.rows
+iteration_num  = args.iterations
+
+if re.match(r'^[0-9]+x[0-9]+(,[0-9]+x[0-9]+)*$', sizes) is None:
+  output_error('invalid sizes specified <' + sizes + '>')
+  sys.exit(1)
+
+if target_width < 0:
+  output_error('invalid width specified <' + str(target_width) + '>')
+  sys.exit(1)
+
+if target_height < 0:
+  output_error('invalid height specified <' + str(target_height) + '>')
+  sys.exit(1)
+
+if iteration_num <= 0:
+  output_error('invalid iterations specified <' + str(iteration_num) + '>')
+  sys.exit(1)
+
+size_list = []
+for size in sizes.split(','):
+  width, height = size.split('x')
+  size_list.append((int(width), int(height)))
+
+#####################################################################
+# external library
+#####################################################################
+
+try:
+  import cv2
+except ImportError:
+  output_error('opencv not found')
+  sys.exit(1)
+
+try:
+  import numpy
+except ImportError:
+  output_error('numpy not found')
+  sys.exit(1)
+
+try:
+  from cvtest import build_remap_table
+except ImportError:
+  output_error('cvtest not found')
+  sys.exit(1)
+
+#####################################################################
+# function for measurement
+#####################################################################
+
+def make_matrix(in_size, out_size):
+  in_width, in_height = in_size
+  out_width, out_height = out_size
+
+  # a display seen slightly from the side, as with a real capture
+  src_points = numpy.float32([
+    [in_width * 0.10, in_height * 0.08],
+    [in_width * 0.92, in_height * 0.12],
+    [in_width * 0.88, in_height * 0.90],
+    [in_width * 0.06, in_height * 0.94],
+  ])
+  dst_points = numpy.float32([
+    [0, 0],
+    [out_width, 0],
+    [out_width, out_height],
+    [0, out_height],
+  ])
+
+  return cv2.getPerspectiveTransform(src_points, dst_points)
+
+def measure(func):
+  func()
+
+  start = time.perf_counter()
+  for _ in range(iteration_num):
+    func()
+  elapsed = time.perf_counter() - start
+
+  return elapsed / iteration_num
+
+#####################################################################
+# main routine
+#####################################################################
+
+print('input      output     perspective[ms]  remap[ms]  speedup  ' +
+  'table[ms]  max_diff')
+
+for in_size in size_list:
+  out_size = (
+    target_width  if target_width  > 0 else in_size[0],
+    target_height if target_height > 0 else in_size[1]
+  )
+
+  rng = numpy.random.default_rng(0)
+  frame = rng.integers(0, 256, (in_size[1], in_size[0], 3), dtype=numpy.uint8)
+  matrix = make_matrix(in_size, out_size)
+
+  start = time.perf_counter()
+  map1, map2 = build_remap_table(matrix, out_size)
+  table_time = time.perf_counter() - start
+
+  perspective_time = measure(
+    lambda: cv2.warpPerspective(frame, matrix, out_size))
+  remap_time = measure(
+    lambda: cv2.remap(frame, map1, map2, cv2.INTER_LINEAR))
+
+  perspective_frame = cv2.warpPerspective(frame, matrix, out_size)
+  remap_frame = cv2.remap(frame, map1, map2, cv2.INTER_LINEAR)
+  max_diff = int(numpy.max(cv2.absdiff(perspective_frame, remap_frame)))
+
+  print('{:<10} {:<10} {:>15.2f}  {:>9.2f}  {:>6.2f}x  {:>9.1f}  {:>8d}'.format(
+    '{}x{}'.format(*in_size), '{}x{}'.format(*out_size),
+    perspective_time * 1000, remap_time * 1000,
+    perspective_time / remap_time, table_time * 1000, max_diff), flush=True)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+######################################################################
+# default library
+######################################################################
+
+import os
+import sys
+import argparse
+import shutil
+
+#####################################################################
+# utility
+#####################################################################
+
+def output_error(msg):
+  print('ERROR:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+def output_warn(msg):
+  print('WARN:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+def output_info(msg):
+  print('INFO:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+#####################################################################
+# parameter
+#####################################################################
+
+# The index "<video>.index.csv" is written beside each video, and the
+# scripts (homography_transform.py, write_framenumber.py and
+# homography_information.py) seek by it when it is found:
+#   frame,pts,keyframe,pos
+#   1,0.000000,1,48
+#   ...
+
+parser = argparse.ArgumentParser(
+  description='scan videos once into the indexes of their frames')
+parser.add_argument('video_files', type=str, nargs='+')
+parser.add_argument('--prober', type=str, default='auto',
+  choices=['auto', 'ffprobe', 'opencv'],
+  help='ffprobe: read the packets (with the keyframes and the offsets), ' +
+    'opencv: decode the frames (only the times), auto: ffprobe if found')
+parser.add_argument('-f', '--force', action='store_true',
+  help='build the index again even if it is up to date')
+
+args = parser.parse_args()
+video_files = args.video_files
+prober      = args.prober
+is_force    = args.force
+
+for video_file in video_files:
+  if not os.access(video_file, os.R_OK):
+    output_error('invalid file specified <' + video_file + '>')
+    sys.exit(1)
+
+if prober == 'ffprobe' and shutil.which('ffprobe') is None:
+  output_error('ffprobe command not found')
+  sys.exit(1)
+
+#####################################################################
+# external library
+#####################################################################
+
+try:
+  import cv2
+except ImportError:
+  output_error('opencv not found')
+  sys.exit(1)
+
+try:
+  from cvtest import CvtestError
+  from cvtest.index import build_index, load_index, index_file_name
+except ImportError:
+  output_error('cvtest not found')
+  sys.exit(1)
+
+#####################################################################
+# main routine
+#####################################################################
+
+for video_file in video_files:
+  index_file = index_file_name(video_file)
+
+  # a stale index is told and built again
+  if not is_force and load_index(video_file, output_warn) is not None:
+    output_info('index is up to date <' + index_file + '>')
+    print(index_file, flush=True)
+    continue
+
+  try:
+    index = build_index(video_file, prober)
+  except CvtestError as e:
+    output_error(str(e))
+    sys.exit(1)
+
+  index.save(index_file)
+
+  key_num = int((index.keyframe == 1).sum())
+  output_info('{} frames ({} keyframes) in {:.1f} seconds <{}>'.format(
+    len(index), key_num if key_num > 0 else 'unknown', index.pts[-1],
+    video_file))
+  print(index_file, flush=True)
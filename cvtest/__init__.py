@@ -0,0 +1,46 @@
+######################################################################
+# cvtest
+######################################################################
+
+# Library behind the scripts. The core operations can be called
+# in-process, e.g.
+#
+#   warper = cvtest.FrameWarper(cvtest.load_matrices('a.txt,b.txt'), (w, h))
+#   recognizer = cvtest.NumberRecognizer()
+#   numbers = [recognizer.recognize(roi) for roi in warper.warp_all(frame)]
+#
+# The submodules are imported on first use, so that a light module (e.g.
+# cvtest.protocol for the client) does not pay for OpenCV, and PIL and
+# qrcode are needed only for stamping.
+
+import importlib
+
+from .error import CvtestError
+
+exported_names = {
+  'warp':      ['FrameWarper', 'load_matrix', 'load_matrices',
+                'build_remap_table', 'load_remap_table'],
+  'recognize': ['NumberRecognizer', 'parse_boxes', 'most_likely_number'],
+  'match':     ['TemplateMatcher', 'match_in_full', 'match_in_window',
+                'match_in_pyramid', 'search_range', 'load_gray'],
+  'timeline':  ['make_timeline', 'write_timeline', 'timeline_statistics'],
+  'video':     ['VideoEncoder', 'open_capture'],
+  'stamp':     ['FrameStamper'],
+  'layout':    ['parse_points', 'qr_corners'],
+  'roi':       ['locate_displays', 'locate_stamped_frame'],
+  'drift':     ['DriftTracker'],
+  'output':    ['RoiOutput', 'StackWriter', 'open_stack'],
+  'index':     ['FrameIndex', 'build_index', 'load_index'],
+}
+
+name_to_module = {name: module
+  for module, names in exported_names.items() for name in names}
+
+__all__ = ['CvtestError'] + sorted(name_to_module)
+
+def __getattr__(name):
+  if name in name_to_module:
+    module = importlib.import_module('.' + name_to_module[name], __name__)
+    return getattr(module, name)
+
+  raise AttributeError("module 'cvtest' has no attribute '" + name + "'")
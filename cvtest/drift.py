@@ -0,0 +1,187 @@
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+
+from .error import CvtestError
+
+#####################################################################
+# setting
+#####################################################################
+
+MAX_CORNERS = 300
+MIN_POINTS  = 12
+
+# pixels (in full resolution) around the rois left out of the features,
+# where the light of the displays changes
+ROI_MARGIN = 16
+
+# pixels (in the scaled frame) a feature may move between the forward and
+# the backward tracking
+MAX_FB_ERROR = 0.5
+
+# pixels (in full resolution) a feature may move between two checks
+MAX_UNSTABLE = 8.0
+
+# pixels (in the scaled frame) of an inlier of the drift
+RANSAC_THRESHOLD = 0.5
+
+# share of the stable features the drift has to agree with
+MIN_INLIER_RATIO = 0.6
+
+#####################################################################
+# tracker
+#####################################################################
+
+# Track the drift of the camera (e.g. a creeping tripod) against the
+# reference frame, on which the matrices of the rois are known to be
+# right.
+#
+# Corners are picked on the reference outside the given polygons and a
+# margin around them (the rois, whose contents change on every frame),
+# and followed by pyramidal Lucas-Kanade on frames downscaled by scale.
+# A feature is used only when it is tracked back onto itself and it has
+# stayed (within MAX_UNSTABLE) since the last check, so that a thing
+# moving in front of the camera is left out. The drift (a shift, a
+# rotation and a scale from the reference to the frame, in full
+# resolution) is fitted on them by RANSAC, and it is rejected when too
+# few of them agree with it, as a homography on a few features bends
+# far at the corners of the frame.
+#
+# A drift moving no corner of the frame by more than dead_band pixels is
+# taken as no drift, and a drift is taken only when it moves a corner by
+# more than threshold pixels from the drift taken last time. The matrix
+# of a roi is then the original one @ inverse of the drift.
+class DriftTracker:
+  def __init__(self, reference, scale=0.25, threshold=2.0, polygon_list=(),
+               dead_band=4.0):
+    if scale <= 0 or scale > 1:
+      raise CvtestError('invalid scale specified <' + str(scale) + '>')
+
+    if threshold <= 0:
+      raise CvtestError('invalid threshold specified <' + str(threshold) + '>')
+
+    if dead_band < 0:
+      raise CvtestError('invalid dead band specified <' + str(dead_band) + '>')
+
+    self.scale     = scale
+    self.threshold = threshold
+    self.dead_band = dead_band
+    self.scaling   = numpy.diag([scale, scale, 1.0])
+    self.matrix    = numpy.eye(3)
+
+    height, width = reference.shape[:2]
+    self.corners = numpy.float32([[[0, 0], [width, 0], [width, height],
+      [0, height]]])
+
+    self.reference_gray = self.prepare(reference)
+
+    mask = numpy.full(self.reference_gray.shape, 255, dtype=numpy.uint8)
+    margin = max(1, int(round(ROI_MARGIN * scale)))
+    for polygon in polygon_list:
+      scaled = numpy.int32(numpy.round(numpy.float64(polygon) * scale))
+      cv2.fillPoly(mask, [scaled.reshape(-1, 1, 2)], 0)
+      cv2.polylines(mask, [scaled.reshape(-1, 1, 2)], True, 0, margin*2)
+
+    self.reference_points = cv2.goodFeaturesToTrack(self.reference_gray,
+      MAX_CORNERS, 0.01, 8, mask=mask)
+
+    if self.reference_points is None or \
+       len(self.reference_points) < MIN_POINTS:
+      raise CvtestError('too few features to track outside the rois')
+
+    # where the features were found at the last check
+    self.last_points = self.reference_points.copy()
+
+  def prepare(self, frame):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    if self.scale == 1:
+      return gray
+
+    return cv2.resize(gray, None, fx=self.scale, fy=self.scale,
+      interpolation=cv2.INTER_AREA)
+
+  # the features in the frame and the mask of the stable ones
+  def track(self, gray):
+    points, status, _ = cv2.calcOpticalFlowPyrLK(self.reference_gray, gray,
+      self.reference_points, None, winSize=(21, 21), maxLevel=3)
+    back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(gray,
+      self.reference_gray, points, None, winSize=(21, 21), maxLevel=3)
+
+    fb_error = numpy.linalg.norm(back_points - self.reference_points, axis=2)
+    is_tracked = (status.ravel() == 1) & (back_status.ravel() == 1) & \
+      (fb_error.ravel() <= MAX_FB_ERROR)
+
+    # a drift is slow, while a thing moving in front of the camera moves
+    # its features far between two checks
+    moves = numpy.linalg.norm(points - self.last_points, axis=2).ravel()
+    is_stable = is_tracked & (moves <= MAX_UNSTABLE * self.scale)
+
+    self.last_points = numpy.where(is_tracked[:, numpy.newaxis, numpy.newaxis],
+      points, self.last_points)
+
+    return points, is_stable
+
+  # homography from the reference to the frame in full resolution
+  def measure(self, frame):
+    points, is_stable = self.track(self.prepare(frame))
+    stable_num = numpy.count_nonzero(is_stable)
+
+    if stable_num < MIN_POINTS:
+      raise CvtestError('drift tracking is lost')
+
+    affine, inliers = cv2.estimateAffinePartial2D(
+      self.reference_points[is_stable], points[is_stable], method=cv2.RANSAC,
+      ransacReprojThreshold=RANSAC_THRESHOLD)
+
+    if affine is None:
+      raise CvtestError('drift tracking is lost')
+
+    matrix = numpy.vstack([affine, [0, 0, 1]])
+
+    inlier_num = int(inliers.sum())
+
+    if inlier_num < MIN_POINTS or inlier_num < stable_num * MIN_INLIER_RATIO:
+      raise CvtestError('drift is not consistent ({}/{} features)'.format(
+        inlier_num, stable_num))
+
+    return numpy.linalg.inv(self.scaling) @ matrix @ self.scaling
+
+  # largest move of the corners of the frame between two drifts
+  def distance(self, matrix_a, matrix_b):
+    corners_a = cv2.perspectiveTransform(self.corners, matrix_a)
+    corners_b = cv2.perspectiveTransform(self.corners, matrix_b)
+
+    return float(numpy.max(numpy.linalg.norm(corners_a - corners_b, axis=2)))
+
+  # Check the frame. The new drift and its distance from the last one are
+  # returned when it is over the threshold, or None.
+  def update(self, frame):
+    matrix = self.measure(frame)
+
+    if self.distance(matrix, numpy.eye(3)) <= self.dead_band:
+      matrix = numpy.eye(3)
+
+    distance = self.distance(matrix, self.matrix)
+
+    if distance <= self.threshold:
+      return None
+
+    self.matrix = matrix
+    return matrix, distance
+
+  def correct(self, matrix_list):
+    inverse = numpy.linalg.inv(self.matrix)
+    return [matrix @ inverse for matrix in matrix_list]
+
+# corners of each roi in the capture for the mask of DriftTracker
+def roi_polygons(matrix_list, size):
+  width, height = size
+  corners = numpy.float32([[[0, 0], [width, 0], [width, height],
+    [0, height]]])
+
+  return [cv2.perspectiveTransform(corners, numpy.linalg.inv(matrix))[0]
+    for matrix in matrix_list]
@@ -0,0 +1,8 @@
+######################################################################
+# error
+######################################################################
+
+# Raised by the library instead of exiting. The message is in the same
+# form as the messages of the scripts (e.g. 'invalid file specified <x>').
+class CvtestError(Exception):
+  pass
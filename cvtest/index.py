@@ -0,0 +1,201 @@
+######################################################################
+# default library
+######################################################################
+
+import os
+import shutil
+import subprocess
+
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+
+from .error import CvtestError
+
+#####################################################################
+# setting
+#####################################################################
+
+# "<video>.index.csv" beside the video
+INDEX_SUFFIX = '.index.csv'
+
+PROBERS = ['auto', 'ffprobe', 'opencv']
+
+#####################################################################
+# index
+#####################################################################
+
+# The frames of a video in the order of presentation (frame n is the
+# n-th, 1-origin), each with
+#  pts:      time in seconds from the first frame
+#  keyframe: 1 for a keyframe, 0 for not, -1 for unknown
+#  pos:      byte offset of its packet in the file (-1 for unknown)
+# The index is stored as CSV with the size of the video, by which a
+# stale index is found.
+class FrameIndex:
+  def __init__(self, pts_list, keyframe_list, pos_list, video_size=0):
+    self.pts        = numpy.asarray(pts_list, dtype=numpy.float64)
+    self.keyframe   = numpy.asarray(keyframe_list, dtype=numpy.int8)
+    self.pos        = numpy.asarray(pos_list, dtype=numpy.int64)
+    self.video_size = video_size
+
+  def __len__(self):
+    return len(self.pts)
+
+  def check_frame(self, frame_number):
+    if frame_number <= 0 or frame_number > len(self):
+      raise CvtestError('frame out of the index <' + str(frame_number) + '>')
+
+  def pts_of(self, frame_number):
+    self.check_frame(frame_number)
+    return float(self.pts[frame_number - 1])
+
+  # the keyframe at or before the frame, or None if unknown
+  def keyframe_of(self, frame_number):
+    self.check_frame(frame_number)
+    key_list = numpy.flatnonzero(self.keyframe[:frame_number] == 1)
+
+    if len(key_list) == 0:
+      return None
+
+    return int(key_list[-1]) + 1
+
+  # frame (1-origin) nearest to the time in seconds
+  def frame_at(self, seconds):
+    index = int(numpy.searchsorted(self.pts, seconds))
+
+    if index == len(self) or (index > 0 and
+       seconds - self.pts[index - 1] <= self.pts[index] - seconds):
+      index -= 1
+
+    return max(index, 0) + 1
+
+  def save(self, index_file):
+    with open(index_file, 'w') as f:
+      f.write('# size={}\n'.format(self.video_size))
+      f.write('frame,pts,keyframe,pos\n')
+
+      for i, (pts, keyframe, pos) in enumerate(zip(self.pts, self.keyframe,
+          self.pos), 1):
+        f.write('{},{:.6f},{},{}\n'.format(i, pts, keyframe, pos))
+
+def index_file_name(video_file):
+  return video_file + INDEX_SUFFIX
+
+def read_index(index_file):
+  try:
+    with open(index_file) as f:
+      header = f.readline()
+
+      if not header.startswith('# size='):
+        raise ValueError('no size')
+
+      video_size = int(header[len('# size='):])
+      f.readline()
+      table = numpy.loadtxt(f, delimiter=',', ndmin=2)
+  except (OSError, ValueError):
+    raise CvtestError('invalid index <' + index_file + '>')
+
+  if len(table) == 0:
+    return FrameIndex([], [], [], video_size)
+
+  return FrameIndex(table[:, 1], table[:, 2], table[:, 3], video_size)
+
+# The index beside the video, or None if it has not been built. The
+# index is only to seek fast, so a stale or broken one is told to
+# output_warn (if given) and None is returned, by which the caller seeks
+# as without it.
+def load_index(video_file, output_warn=None):
+  index_file = index_file_name(video_file)
+
+  if not os.access(index_file, os.R_OK):
+    return None
+
+  try:
+    index = read_index(index_file)
+
+    if index.video_size != os.path.getsize(video_file):
+      raise CvtestError('index is stale <' + index_file + '>')
+  except CvtestError as e:
+    if output_warn is not None:
+      output_warn(str(e) + ', which is not used')
+    return None
+
+  return index
+
+#####################################################################
+# build
+#####################################################################
+
+# the packets of the first video stream by ffprobe, without decoding
+def probe_packets(video_file):
+  command = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+    '-show_entries', 'packet=pts_time,pos,flags', '-of', 'compact=p=0',
+    video_file]
+
+  proc = subprocess.Popen(command, stdout=subprocess.PIPE,
+    universal_newlines=True)
+  packet_list = []
+
+  for line in proc.stdout:
+    packet = dict(field.split('=', 1) for field in line.strip().split('|')
+      if '=' in field)
+
+    # a packet without the time is not shown
+    if packet.get('pts_time', 'N/A') == 'N/A':
+      continue
+
+    packet_list.append((float(packet['pts_time']),
+      1 if 'K' in packet.get('flags', '') else 0,
+      int(packet['pos']) if packet.get('pos', 'N/A') != 'N/A' else -1))
+
+  if proc.wait() != 0:
+    raise CvtestError('some error on ffprobe <' + video_file + '>')
+
+  # the packets come in the order of decoding
+  packet_list.sort()
+  return packet_list
+
+# the times of the frames by OpenCV, which tells no keyframe nor offset
+def scan_frames(video_file):
+  cap = cv2.VideoCapture(video_file)
+
+  if not cap.isOpened():
+    raise CvtestError('cannot open video <' + video_file + '>')
+
+  packet_list = []
+
+  while cap.grab():
+    packet_list.append((cap.get(cv2.CAP_PROP_POS_MSEC) / 1000, -1, -1))
+
+  cap.release()
+  return packet_list
+
+# Scan the video once into an index. ffprobe reads only the packets,
+# while OpenCV decodes all the frames (auto: ffprobe if it is found).
+def build_index(video_file, prober='auto'):
+  if prober not in PROBERS:
+    raise CvtestError('invalid prober specified <' + prober + '>')
+
+  if prober == 'auto':
+    prober = 'ffprobe' if shutil.which('ffprobe') is not None else 'opencv'
+
+  if prober == 'ffprobe':
+    if shutil.which('ffprobe') is None:
+      raise CvtestError('ffprobe command not found')
+
+    packet_list = probe_packets(video_file)
+  else:
+    packet_list = scan_frames(video_file)
+
+  if not packet_list:
+    raise CvtestError('no frame found <' + video_file + '>')
+
+  pts_list, keyframe_list, pos_list = zip(*packet_list)
+  pts = numpy.asarray(pts_list)
+
+  return FrameIndex(pts - pts[0], keyframe_list, pos_list,
+    os.path.getsize(video_file))
@@ -0,0 +1,72 @@
+######################################################################
+# default library
+######################################################################
+
+import re
+
+######################################################################
+# external library
+######################################################################
+
+import numpy
+
+from .error import CvtestError
+
+#####################################################################
+# layout of a stamp
+#####################################################################
+
+# Where write_framenumber.py puts the number and the qr code around a
+# point. This is also read by the scripts finding the stamps (e.g.
+# homography_information.py), which need neither PIL nor qrcode.
+#
+#   point - MARGIN         +----------------+
+#                          |     000123     |  text of FONT_SIZE
+#   point + MARGIN*2 +     +----------------+
+#           FONT_SIZE      +------+
+#                          |  qr  |  QR_WIDTH x QR_HEIGHT with the border
+#                          +------+
+
+FONT_SIZE = 100
+MARGIN    = 30
+
+QR_WIDTH  = 300
+QR_HEIGHT = 300
+
+# a version 1 code has 21 modules without the border of 4 modules
+QR_MODULES = 21
+QR_BORDER  = 4
+
+#####################################################################
+# points
+#####################################################################
+
+# "<x>,<y>[,...]" to a list of points
+def parse_points(points):
+  if re.match(r'^[0-9]+(,[0-9]+)*$', points) is None:
+    raise CvtestError('invalid points specified <' + points + '>')
+
+  points_all = points.split(',')
+
+  if len(points_all) % 2 != 0:
+    raise CvtestError('invalid number of points specified')
+
+  xs = list(map(int, points_all[0::2]))
+  ys = list(map(int, points_all[1::2]))
+
+  return list(zip(xs, ys))
+
+# Corners (top left, top right, bottom right, bottom left) of the qr
+# code stamped at the point in the frame, in the same order as found by
+# cv2.QRCodeDetector. The corners are those of the code itself without
+# the border, as the detector does not see the border.
+def qr_corners(point, font_size=FONT_SIZE):
+  x, y = point
+  module_size = QR_WIDTH / (QR_MODULES + QR_BORDER*2)
+  left   = x + QR_BORDER*module_size
+  top    = y + MARGIN*2 + font_size + QR_BORDER*module_size
+  right  = left + QR_MODULES*module_size
+  bottom = top  + QR_MODULES*module_size
+
+  return numpy.float32([[left, top], [right, top], [right, bottom],
+    [left, bottom]])
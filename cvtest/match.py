@@ -0,0 +1,209 @@
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+
+from .error import CvtestError
+
+#####################################################################
+# setting
+#####################################################################
+
+THRESHOLD = 0.95
+
+INT_MIN = -2147483648
+INT_MAX = 2147483647
+
+# the template is not reduced smaller than this on the pyramid
+PYRAMID_MIN_SIZE = 16
+
+# number of the peaks refined after the reduced match
+PYRAMID_PEAKS = 5
+
+#####################################################################
+# utility
+#####################################################################
+
+# range of the match location around a coordinate (-1: anywhere)
+def search_range(cord, delta):
+  if cord == -1:
+    return (INT_MIN, INT_MAX)
+  else:
+    return (cord - delta, cord + delta)
+
+def load_gray(file):
+  image = cv2.imread(file)
+
+  if image is None:
+    raise CvtestError('cannot open file as image <' + file + '>')
+
+  return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+#####################################################################
+# match
+#####################################################################
+
+# Match over the full target. The match is found if there is any
+# location over the threshold, and the maximum lies in the ranges.
+# The location (x, y) or None is returned.
+def match_in_full(target_gray, template_gray, x_range, y_range,
+                  threshold=THRESHOLD):
+  raw_result = cv2.matchTemplate(target_gray, template_gray,
+    cv2.TM_CCOEFF_NORMED)
+
+  candidate_result = numpy.where(raw_result >= threshold)
+  candidate_num = len(candidate_result[0])
+
+  if candidate_num <= 0:
+    return None
+
+  _, _, _, max_loc = cv2.minMaxLoc(raw_result)
+
+  if x_range[0] <= max_loc[0] <= x_range[1] and \
+     y_range[0] <= max_loc[1] <= y_range[1]:
+    return max_loc
+  else:
+    return None
+
+# (maximum, location) of the match inside the ranges of the location,
+# or None if the template does not fit in them
+def match_max_in_window(target_gray, template_gray, x_range, y_range):
+  template_height, template_width = template_gray.shape[:2]
+  target_height, target_width = target_gray.shape[:2]
+
+  # range of the match location (top left) to be searched
+  x_min = max(x_range[0], 0)
+  x_max = min(x_range[1], target_width - template_width)
+  y_min = max(y_range[0], 0)
+  y_max = min(y_range[1], target_height - template_height)
+
+  if x_min > x_max or y_min > y_max:
+    return None
+
+  window_gray = target_gray[y_min:y_max + template_height,
+                            x_min:x_max + template_width]
+  raw_result = cv2.matchTemplate(window_gray, template_gray,
+    cv2.TM_CCOEFF_NORMED)
+
+  _, max_val, _, max_loc = cv2.minMaxLoc(raw_result)
+
+  return max_val, (x_min + max_loc[0], y_min + max_loc[1])
+
+# Match only inside the ranges of the location. The match is found if
+# the maximum in the ranges is over the threshold.
+def match_in_window(target_gray, template_gray, x_range, y_range,
+                    threshold=THRESHOLD):
+  result = match_max_in_window(target_gray, template_gray, x_range, y_range)
+
+  if result is None or result[0] < threshold:
+    return None
+
+  return result[1]
+
+# Match over the full target as match_in_full(), coarse to fine: the
+# target and the template are reduced by half per level (as long as the
+# template keeps PYRAMID_MIN_SIZE), the peaks of the reduced match are
+# refined in small windows at the full resolution, and the best of them
+# is taken as the maximum. The maximum can be missed only when it is
+# not among the peaks at the reduced scale.
+def match_in_pyramid(target_gray, template_gray, x_range, y_range,
+                     threshold=THRESHOLD, levels=2, peak_num=PYRAMID_PEAKS):
+  while levels > 0 and \
+        min(template_gray.shape[:2]) >> levels < PYRAMID_MIN_SIZE:
+    levels -= 1
+
+  if levels == 0:
+    return match_in_full(target_gray, template_gray, x_range, y_range,
+      threshold)
+
+  small_target = target_gray
+  small_template = template_gray
+
+  for _ in range(levels):
+    small_target = cv2.pyrDown(small_target)
+    small_template = cv2.pyrDown(small_template)
+
+  if small_target.shape[0] < small_template.shape[0] or \
+     small_target.shape[1] < small_template.shape[1]:
+    return None
+
+  raw_result = cv2.matchTemplate(small_target, small_template,
+    cv2.TM_CCOEFF_NORMED)
+
+  # a location at the reduced scale covers this many at the full one
+  factor = 1 << levels
+  radius = factor * 2
+  # the peaks are apart by half the template
+  suppress_height = max(small_template.shape[0] // 2, 1)
+  suppress_width  = max(small_template.shape[1] // 2, 1)
+
+  best = None
+
+  for _ in range(peak_num):
+    _, peak_val, _, (peak_x, peak_y) = cv2.minMaxLoc(raw_result)
+
+    # no peak is left
+    if peak_val == -numpy.inf:
+      break
+
+    result = match_max_in_window(target_gray, template_gray,
+      (peak_x * factor - radius, peak_x * factor + radius),
+      (peak_y * factor - radius, peak_y * factor + radius))
+
+    # the first in the raster order on a tie, as cv2.minMaxLoc
+    if result is not None and (best is None or result[0] > best[0] or
+       (result[0] == best[0] and result[1][::-1] < best[1][::-1])):
+      best = result
+
+    raw_result[max(peak_y - suppress_height, 0):peak_y + suppress_height + 1,
+               max(peak_x - suppress_width, 0):peak_x + suppress_width + 1] = \
+      -numpy.inf
+
+  if best is None or best[0] < threshold:
+    return None
+
+  max_loc = best[1]
+
+  if x_range[0] <= max_loc[0] <= x_range[1] and \
+     y_range[0] <= max_loc[1] <= y_range[1]:
+    return max_loc
+  else:
+    return None
+
+# "<name> <x> <y> ..." line of is_match.py -b/-v for the location (or
+# None as "- -") of each template
+def format_locations(name, loc_list):
+  field_list = [name]
+
+  for loc in loc_list:
+    if loc is None:
+      field_list.extend(['-', '-'])
+    else:
+      field_list.extend([str(loc[0]), str(loc[1])])
+
+  return ' '.join(field_list)
+
+#####################################################################
+# matcher
+#####################################################################
+
+# Match the templates (loaded and converted to gray once) inside the
+# window of the location on many targets.
+class TemplateMatcher:
+  def __init__(self, template_file_list, x_range=(INT_MIN, INT_MAX),
+               y_range=(INT_MIN, INT_MAX), threshold=THRESHOLD):
+    self.template_list = [load_gray(file) for file in template_file_list]
+    self.x_range       = x_range
+    self.y_range       = y_range
+    self.threshold     = threshold
+
+  # a list of the location or None for each template
+  def match(self, target_gray):
+    return [match_in_window(target_gray, template_gray,
+      self.x_range, self.y_range, self.threshold)
+      for template_gray in self.template_list]
+
+  def match_file(self, file):
+    return self.match(load_gray(file))
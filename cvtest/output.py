@@ -0,0 +1,212 @@
+######################################################################
+# default library
+######################################################################
+
+import os
+import re
+import struct
+
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+
+from . import trace
+from .error import CvtestError
+from .video import VideoEncoder
+
+#####################################################################
+# setting
+#####################################################################
+
+FORMATS = ['png', 'jpeg', 'npy', 'video']
+
+# "<prefix>_roi_<roi>.npy" (or .mkv) written per roi
+STACK_PATTERN = re.compile(r'_roi_([0-9]+)\.[^.]+$')
+
+# the header of a stack has a fixed size, so that it can be written
+# again with the number of frames at the end
+NPY_HEADER_SIZE = 128
+
+#####################################################################
+# stack of frames
+#####################################################################
+
+def make_npy_header(shape, dtype):
+  header = "{'descr': '" + numpy.dtype(dtype).str + \
+    "', 'fortran_order': False, 'shape': " + repr(tuple(shape)) + ", }"
+  header = header.ljust(NPY_HEADER_SIZE - 10 - 1) + '\n'
+
+  return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + \
+    header.encode('latin1')
+
+# Write frames of the same shape into one .npy file as they come, which
+# numpy.load(..., mmap_mode='r') maps without reading it.
+class StackWriter:
+  def __init__(self, stack_file, frame_shape, dtype=numpy.uint8):
+    self.stack_file  = stack_file
+    self.frame_shape = tuple(frame_shape)
+    self.dtype       = numpy.dtype(dtype)
+    self.frame_num   = 0
+    self.file        = open(stack_file, 'wb')
+    self.file.write(make_npy_header((0,) + self.frame_shape, self.dtype))
+
+  def write(self, frame):
+    if frame.shape != self.frame_shape or frame.dtype != self.dtype:
+      raise CvtestError('invalid frame for the stack <' + self.stack_file + '>')
+
+    self.file.write(numpy.ascontiguousarray(frame).data)
+    self.frame_num += 1
+
+  def close(self):
+    self.file.seek(0)
+    self.file.write(make_npy_header((self.frame_num,) + self.frame_shape,
+      self.dtype))
+    self.file.close()
+
+# numbers of the frames in a stack (or a video) beside it
+# ("<stack>.frames", one per line)
+def write_frame_list(stack_file, frame_list):
+  with open(stack_file + '.frames', 'w') as f:
+    for frame_number in frame_list:
+      f.write(str(frame_number) + '\n')
+
+# the frames (memory mapped) and their numbers of a stack
+def open_stack(stack_file):
+  try:
+    frames = numpy.load(stack_file, mmap_mode='r')
+  except (OSError, ValueError):
+    raise CvtestError('cannot open file as stack <' + stack_file + '>')
+
+  frame_file = stack_file + '.frames'
+
+  if os.access(frame_file, os.R_OK):
+    frame_list = [int(line) for line in open(frame_file) if line.strip()]
+  else:
+    frame_list = list(range(1, len(frames) + 1))
+
+  if len(frame_list) != len(frames):
+    raise CvtestError('invalid frame list for the stack <' + stack_file + '>')
+
+  return frames, frame_list
+
+# roi of a stack file, or None if the name is not in the form
+def parse_stack_name(file):
+  match = STACK_PATTERN.search(os.path.basename(file))
+
+  if match is None:
+    return None
+
+  return int(match.group(1))
+
+#####################################################################
+# output of the rois
+#####################################################################
+
+# Write the warped rois of frames in one of the formats:
+#  png:   "<prefix>_<frame>_<roi>.png" with the compression level (0-9,
+#         -1 for the default of OpenCV)
+#  jpeg:  "<prefix>_<frame>_<roi>.jpg" with the quality (0-100)
+#  npy:   "<prefix>_roi_<roi>.npy" stack of all the frames per roi
+#  video: "<prefix>_roi_<roi>.mkv" lossless FFV1 video per roi
+# write() returns the names of the images written; the stacks and the
+# videos (with their frame lists) are returned by close().
+class RoiOutput:
+  def __init__(self, out_dir, prefix, out_format='png', png_level=-1,
+               jpeg_quality=95, frame_rate=30, writer='ffmpeg'):
+    if out_format not in FORMATS:
+      raise CvtestError('invalid format specified <' + out_format + '>')
+
+    if png_level < -1 or png_level > 9:
+      raise CvtestError('invalid png level specified <' + str(png_level) + '>')
+
+    if jpeg_quality < 0 or jpeg_quality > 100:
+      raise CvtestError('invalid jpeg quality specified <' +
+        str(jpeg_quality) + '>')
+
+    self.out_dir    = out_dir
+    self.prefix     = prefix
+    self.out_format = out_format
+    self.frame_rate = frame_rate
+    self.writer     = writer
+    self.stack_list = []
+    self.frame_list = []
+
+    if out_format == 'png':
+      self.extension = '.png'
+      self.params = [] if png_level < 0 else \
+        [cv2.IMWRITE_PNG_COMPRESSION, png_level]
+    elif out_format == 'jpeg':
+      self.extension = '.jpg'
+      self.params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+    elif out_format == 'npy':
+      self.extension = '.npy'
+    else:
+      self.extension = '.mkv'
+
+  # whether write() can be called on other processes
+  def is_per_frame(self):
+    return self.out_format in ['png', 'jpeg']
+
+  def stack_base(self, roi_number):
+    return self.prefix + '_roi_' + "{0:02d}".format(roi_number) + \
+      self.extension
+
+  def open_stacks(self, roi_list):
+    for roi_number, roi in enumerate(roi_list, 1):
+      stack_file = self.out_dir + '/' + self.stack_base(roi_number)
+
+      if self.out_format == 'npy':
+        self.stack_list.append(StackWriter(stack_file, roi.shape, roi.dtype))
+      else:
+        size = (roi.shape[1], roi.shape[0])
+        self.stack_list.append(VideoEncoder(stack_file, size, self.frame_rate,
+          writer=self.writer, lossless=True, is_color=(roi.ndim == 3)))
+
+  def write(self, roi_list, frame_number):
+    if not self.is_per_frame():
+      if not self.stack_list:
+        self.open_stacks(roi_list)
+
+      for stack, roi in zip(self.stack_list, roi_list):
+        stack.write(roi)
+
+      if self.out_format == 'npy':
+        trace.tracer.add_bytes(sum(roi.nbytes for roi in roi_list))
+
+      self.frame_list.append(frame_number)
+      return []
+
+    line_list = []
+
+    for roi_number, roi in enumerate(roi_list, 1):
+      out_base = self.prefix                + '_' + \
+        "{0:06d}".format(frame_number)      + '_' + \
+        "{0:02d}".format(roi_number)        + self.extension
+      out_file = self.out_dir + '/' + out_base
+
+      cv2.imwrite(out_file, roi, self.params)
+      line_list.append(out_base)
+
+      if trace.tracer.enabled:
+        trace.tracer.add_bytes(os.path.getsize(out_file))
+
+    return line_list
+
+  def close(self):
+    line_list = []
+
+    for roi_number, stack in enumerate(self.stack_list, 1):
+      stack.close()
+      stack_file = self.out_dir + '/' + self.stack_base(roi_number)
+      write_frame_list(stack_file, self.frame_list)
+      line_list.append(self.stack_base(roi_number))
+
+      # the size of an encoded video is known only here
+      if self.out_format == 'video' and trace.tracer.enabled:
+        trace.tracer.add_bytes(os.path.getsize(stack_file))
+
+    self.stack_list = []
+    return line_list
@@ -0,0 +1,152 @@
+######################################################################
+# default library
+######################################################################
+
+import collections
+import concurrent.futures
+import multiprocessing
+import multiprocessing.shared_memory
+
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+
+from . import trace
+from .error import CvtestError
+
+#####################################################################
+# pool
+#####################################################################
+
+# The workers are forked so that they inherit what the caller prepared
+# (matrices, detectors, templates and the frame slots below). A task
+# function must be defined at the top level of a module.
+
+def init_worker():
+  # the parallelism is given by the processes
+  cv2.setNumThreads(1)
+
+  # only the caller traces (the waits on the workers)
+  trace.detach_trace()
+
+def make_executor(job_num):
+  context = multiprocessing.get_context('fork')
+  return concurrent.futures.ProcessPoolExecutor(job_num, mp_context=context,
+    initializer=init_worker)
+
+# on a worker: the output of a task and the totals of its trace
+def run_task(func, *args):
+  output = func(*args)
+  return output, trace.tracer.take_totals()
+
+# the output of a task, where an error on the worker (or the worker
+# dying) comes out as CvtestError
+def wait_result(future):
+  with trace.tracer.span('wait'):
+    try:
+      output, totals = future.result()
+    except CvtestError:
+      raise
+    except Exception as e:
+      raise CvtestError('some error on a worker (' + type(e).__name__ +
+        ': ' + str(e) + ')') from e
+
+  if totals is not None:
+    trace.tracer.merge_totals(totals)
+
+  return output
+
+# Yield func(*args) for each args of args_iter in the same order. At most
+# depth (default: two per job) tasks are in flight to bound the memory.
+def map_ordered(func, args_iter, job_num, depth=0):
+  if job_num <= 1:
+    for args in args_iter:
+      yield func(*args)
+    return
+
+  depth = depth if depth > 0 else job_num * 2
+  pending = collections.deque()
+
+  with make_executor(job_num) as executor:
+    for args in args_iter:
+      trace.tracer.counter('workers', pending=len(pending))
+
+      if len(pending) >= depth:
+        yield wait_result(pending.popleft())
+
+      pending.append(executor.submit(run_task, func, *args))
+
+    while pending:
+      yield wait_result(pending.popleft())
+
+#####################################################################
+# frame slots
+#####################################################################
+
+frame_slots = []
+
+def run_slot(func, slot, key):
+  return run_task(func, frame_slots[slot], key)
+
+# Yield func(frame, key) in order for the frames given by read_frame.
+#
+# read_frame(dst) returns (frame, key), or None at the end. The frames
+# are passed to the workers through shared memory slots (two per job),
+# and dst is the slot the next frame can be decoded into directly (None
+# before the slots are allocated with the size of the first frame).
+def map_frames(func, read_frame, job_num):
+  result = read_frame(None)
+
+  if result is None:
+    return
+
+  frame, key = result
+  slot_num = job_num * 2
+  memory_list = []
+
+  try:
+    for _ in range(slot_num):
+      memory = multiprocessing.shared_memory.SharedMemory(
+        create=True, size=frame.nbytes)
+      memory_list.append(memory)
+      frame_slots.append(
+        numpy.ndarray(frame.shape, dtype=frame.dtype, buffer=memory.buf))
+
+    numpy.copyto(frame_slots[0], frame)
+    index = 0
+    pending = collections.deque()
+
+    with make_executor(job_num) as executor:
+      while True:
+        pending.append(executor.submit(run_slot, func, index % slot_num, key))
+        index += 1
+
+        slot = index % slot_num
+        trace.tracer.counter('workers', pending=len(pending))
+
+        if len(pending) >= slot_num:
+          # the oldest task is the one using the next slot
+          yield wait_result(pending.popleft())
+
+        result = read_frame(frame_slots[slot])
+
+        if result is None:
+          break
+
+        frame, key = result
+        if frame.ctypes.data != frame_slots[slot].ctypes.data:
+          numpy.copyto(frame_slots[slot], frame)
+
+      while pending:
+        yield wait_result(pending.popleft())
+  finally:
+    # drop the views on the slots before they are released
+    frame = result = None
+    frame_slots.clear()
+
+    for memory in memory_list:
+      memory.close()
+      memory.unlink()
@@ -0,0 +1,80 @@
+######################################################################
+# default library
+######################################################################
+
+import os
+import json
+import base64
+import socket
+
+from .error import CvtestError
+
+#####################################################################
+# setting
+#####################################################################
+
+# A job and its result are one JSON object per line on a Unix domain
+# socket (one job per connection). This module does not need OpenCV,
+# so that the client starts quickly.
+#
+#   job:    {"op": "recognize", "cwd": ..., "pattern": ..., ...}
+#           {"op": "match", "cwd": ..., "template": ..., "target": ..., ...}
+#   result: {"exit_code": 0, "stdout": "...", "errors": ["...", ...],
+#            "warnings": ["...", ...]}
+#
+# The options of a job are those of recognize_likely_number.py and
+# is_match.py. Paths are given as on the command line and resolved on
+# the cwd of the client, and raw image bytes (and the lines of stdin)
+# are given in the job.
+
+DEFAULT_SOCKET = '/tmp/cvtest-' + str(os.getuid()) + '.sock'
+
+def get_socket_path():
+  return os.environ.get('CVTEST_SOCKET', DEFAULT_SOCKET)
+
+#####################################################################
+# message
+#####################################################################
+
+def send_message(stream, message):
+  stream.write((json.dumps(message) + '\n').encode())
+  stream.flush()
+
+def receive_message(stream):
+  line = stream.readline()
+
+  if not line:
+    return None
+
+  return json.loads(line)
+
+def encode_bytes(data):
+  return base64.b64encode(data).decode('ascii')
+
+def decode_bytes(text):
+  return base64.b64decode(text)
+
+def make_result(exit_code, stdout='', errors=(), warnings=()):
+  return {'exit_code': exit_code, 'stdout': stdout, 'errors': list(errors),
+    'warnings': list(warnings)}
+
+#####################################################################
+# client
+#####################################################################
+
+# send a job to the server and wait for its result
+def request_job(socket_path, job):
+  with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+    try:
+      sock.connect(socket_path)
+    except OSError:
+      raise CvtestError('cannot connect to server <' + socket_path + '>')
+
+    with sock.makefile('rwb') as stream:
+      send_message(stream, job)
+      result = receive_message(stream)
+
+  if result is None:
+    raise CvtestError('no result from server <' + socket_path + '>')
+
+  return result
@@ -0,0 +1,185 @@
+######################################################################
+# default library
+######################################################################
+
+import re
+
+######################################################################
+# external library
+######################################################################
+
+import cv2
+
+from . import trace
+from .error import CvtestError
+
+#####################################################################
+# box
+#####################################################################
+
+# "<x>,<y>,<width>,<height>[,...]" to a list of boxes
+def parse_boxes(boxes):
+  if boxes == '':
+    return []
+
+  if re.match(r'^[0-9]+(,[0-9]+)*$', boxes) is None:
+    raise CvtestError('invalid boxes specified <' + boxes + '>')
+
+  box_values = list(map(int, boxes.split(',')))
+
+  if len(box_values) % 4 != 0:
+    raise CvtestError('invalid number of box values specified')
+
+  return [tuple(box_values[i:i + 4]) for i in range(0, len(box_values), 4)]
+
+#####################################################################
+# recognizer
+#####################################################################
+
+# frame number written by write_framenumber.py
+NUMBER_PATTERN = re.compile(r'^[0-9]{6}$')
+
+# adaptive threshold of the prefilter (on the downscaled image)
+PREFILTER_BLOCK = 31
+PREFILTER_C     = 10
+
+# Recognize the frame number in the qr code of an image.
+#
+# When boxes (x, y, width, height) are given, each of them is cropped
+# with box_margin and decoded as a single qr code at first. The search
+# on the full image is done only when every box misses. With learn,
+# the boxes of the successful full image detections are added (up to
+# learn_max boxes).
+#
+# With prefilter_scale (0 < scale <= 1), the image is made gray,
+# downscaled by it and binarized by an adaptive threshold, which is
+# cheaper to search, at first. The image as given is searched only when
+# the prefiltered one is not recognized.
+class NumberRecognizer:
+  def __init__(self, box_list=(), learn=False, box_margin=20, learn_max=16,
+               prefilter_scale=0):
+    if box_margin < 0:
+      raise CvtestError('invalid box margin specified <' + str(box_margin) + '>')
+
+    if prefilter_scale < 0 or prefilter_scale > 1:
+      raise CvtestError('invalid prefilter scale specified <' +
+        str(prefilter_scale) + '>')
+
+    self.detector   = cv2.QRCodeDetectorAruco()
+    self.box_list   = [tuple(box) for box in box_list]
+    self.learn      = learn
+    self.box_margin = box_margin
+    self.learn_max  = learn_max
+    self.prefilter_scale = prefilter_scale
+
+  # the boxes are in the image as given, which is scaled by scale
+  def crop_box(self, image, box, scale=1.0):
+    x, y, w, h = [int(round(value * scale)) for value in box]
+    margin = int(round(self.box_margin * scale))
+    top    = max(y - margin, 0)
+    left   = max(x - margin, 0)
+    bottom = min(y + h + margin, image.shape[0])
+    right  = min(x + w + margin, image.shape[1])
+
+    if top >= bottom or left >= right:
+      return None
+
+    return image[top:bottom, left:right]
+
+  def recognize_in_boxes(self, image, scale=1.0):
+    for box in self.box_list:
+      crop = self.crop_box(image, box, scale)
+
+      if crop is None:
+        continue
+
+      # a box is expected to contain only one QR code
+      with trace.tracer.span('detect_box'):
+        info, _, _ = self.detector.detectAndDecode(crop)
+
+      if NUMBER_PATTERN.match(info) is not None:
+        return info
+
+    return None
+
+  def learn_box(self, points, scale=1.0):
+    x, y, w, h = cv2.boundingRect(points.astype('float32') / scale)
+
+    # the same QR code position is found repeatedly
+    for bx, by, bw, bh in self.box_list:
+      if bx < x + w and x < bx + bw and by < y + h and y < by + bh:
+        return
+
+    if len(self.box_list) < self.learn_max:
+      self.box_list.append((x, y, w, h))
+
+  def recognize_in_full(self, image, scale=1.0):
+    with trace.tracer.span('detect_full'):
+      _, info_list, points_list, _ = self.detector.detectAndDecodeMulti(image)
+
+    # It is assumed that there is only one QR code
+    if len(info_list) != 1:
+      return None
+
+    if NUMBER_PATTERN.match(info_list[0]) is None:
+      return None
+
+    if self.learn:
+      self.learn_box(points_list[0], scale)
+
+    return info_list[0]
+
+  def recognize_in_image(self, image, scale=1.0):
+    if self.box_list:
+      number = self.recognize_in_boxes(image, scale)
+
+      if number is not None:
+        return number
+
+    # fall back to the search on the full image
+    return self.recognize_in_full(image, scale)
+
+  def prefilter(self, image):
+    with trace.tracer.span('prefilter'):
+      if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+      if self.prefilter_scale != 1:
+        image = cv2.resize(image, None, fx=self.prefilter_scale,
+          fy=self.prefilter_scale, interpolation=cv2.INTER_AREA)
+
+      return cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
+        cv2.THRESH_BINARY, PREFILTER_BLOCK, PREFILTER_C)
+
+  # the number as a string, or None if not recognized
+  def recognize(self, image):
+    if self.prefilter_scale > 0:
+      number = self.recognize_in_image(self.prefilter(image),
+        self.prefilter_scale)
+
+      if number is not None:
+        return number
+
+    return self.recognize_in_image(image)
+
+  def recognize_file(self, file):
+    # the detector searches in gray anyway, which is cheaper to load
+    if self.prefilter_scale > 0:
+      flags = cv2.IMREAD_GRAYSCALE
+    else:
+      flags = cv2.IMREAD_COLOR
+
+    with trace.tracer.span('read'):
+      image = cv2.imread(file, flags)
+
+    if image is None:
+      raise CvtestError('cannot open file as image <' + file + '>')
+
+    return self.recognize(image)
+
+# the representative (i.e. the latest) number of the recognized ones
+def most_likely_number(number_list):
+  if not number_list:
+    return None
+
+  return max(number_list, key=int)
@@ -0,0 +1,123 @@
+######################################################################
+# default library
+######################################################################
+
+import queue
+import threading
+
+######################################################################
+# external library
+######################################################################
+
+import numpy
+
+from . import trace
+
+#####################################################################
+# ring
+#####################################################################
+
+# A ring of depth preallocated slots, each of which is an input frame and
+# the outputs (e.g. the warped rois) made from it. The slots are reused
+# across the frames, so that nothing is allocated per frame once the
+# OpenCV calls are given them as dst.
+#
+# run() overlaps the stages on threads (OpenCV releases the GIL while it
+# decodes, warps and encodes):
+#   reader:  read_frame(dst) returns (frame, key) or None at the end, where
+#            dst is the input of a free slot to decode into
+#   warper:  warp_frame(frame, dst_list, key) makes the outputs into
+#            dst_list
+#   caller:  gets (dst_list, key) in order, and the slot is free again
+#            when the caller asks for the next one
+# At most depth frames are in flight, however slow a stage is.
+class FrameRing:
+  def __init__(self, depth, frame_shape, out_shape, out_num,
+               dtype=numpy.uint8):
+    self.depth = depth
+    self.frame_slots = [numpy.empty(frame_shape, dtype=dtype)
+      for _ in range(depth)]
+    self.out_slots = [[numpy.empty(out_shape, dtype=dtype)
+      for _ in range(out_num)] for _ in range(depth)]
+
+  def run(self, read_frame, warp_frame):
+    free_queue  = queue.Queue()
+    read_queue  = queue.Queue()
+    warp_queue  = queue.Queue()
+    stop_event  = threading.Event()
+    error_list  = []
+
+    for slot in range(self.depth):
+      free_queue.put(slot)
+
+    def read_stage():
+      try:
+        while not stop_event.is_set():
+          slot = free_queue.get()
+
+          if slot is None:
+            break
+
+          result = read_frame(self.frame_slots[slot])
+
+          if result is None:
+            break
+
+          frame, key = result
+          if frame.ctypes.data != self.frame_slots[slot].ctypes.data:
+            numpy.copyto(self.frame_slots[slot], frame)
+
+          read_queue.put((slot, key))
+      except BaseException as e:
+        error_list.append(e)
+      finally:
+        read_queue.put(None)
+
+    def warp_stage():
+      try:
+        while True:
+          item = read_queue.get()
+
+          if item is None:
+            break
+
+          slot, key = item
+          warp_frame(self.frame_slots[slot], self.out_slots[slot], key)
+          warp_queue.put(item)
+      except BaseException as e:
+        error_list.append(e)
+        stop_event.set()
+        free_queue.put(None)
+      finally:
+        warp_queue.put(None)
+
+    thread_list = [threading.Thread(target=read_stage, daemon=True),
+                   threading.Thread(target=warp_stage, daemon=True)]
+
+    for thread in thread_list:
+      thread.start()
+
+    try:
+      while True:
+        item = warp_queue.get()
+
+        if item is None:
+          break
+
+        slot, key = item
+        trace.tracer.counter('ring', read=read_queue.qsize(),
+          warped=warp_queue.qsize())
+
+        yield self.out_slots[slot], key
+        free_queue.put(slot)
+    finally:
+      # also when the caller stops early
+      stop_event.set()
+      free_queue.put(None)
+
+      # let the warper run out of the frames already read
+      for thread in thread_list:
+        thread.join()
+
+    if error_list:
+      raise error_list[0]
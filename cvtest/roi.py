@@ -0,0 +1,198 @@
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+
+from .error import CvtestError
+from .layout import FONT_SIZE, qr_corners
+
+#####################################################################
+# matrix
+#####################################################################
+
+# corners of an output of size (width, height) in the order of the clicks
+# of homography_information.py
+def rect_corners(size):
+  width, height = size
+  return numpy.float32([[0, 0], [width, 0], [width, height], [0, height]])
+
+# matrix from the frame (region x, y, width, height) to the output size
+def region_matrix(region, size):
+  x, y, w, h = region
+  scale_x = size[0] / w
+  scale_y = size[1] / h
+
+  return numpy.float64([
+    [scale_x, 0, -x * scale_x],
+    [0, scale_y, -y * scale_y],
+    [0, 0, 1]
+  ])
+
+# Homography from the corresponding points by RANSAC, so that a wrong
+# detection on some frames does not bend the matrix.
+def fit_homography(src_points, dst_points, threshold=3.0):
+  src_points = numpy.float32(src_points).reshape(-1, 2)
+  dst_points = numpy.float32(dst_points).reshape(-1, 2)
+
+  if len(src_points) < 4:
+    raise CvtestError('too few points for homography <' +
+      str(len(src_points)) + '>')
+
+  matrix, _ = cv2.findHomography(src_points, dst_points, cv2.RANSAC,
+    threshold)
+
+  if matrix is None:
+    raise CvtestError('homography is not found')
+
+  return matrix
+
+#####################################################################
+# display quadrilateral
+#####################################################################
+
+# order 4 corners as top left, top right, bottom right, bottom left
+def order_corners(corners):
+  corners = numpy.float32(corners).reshape(4, 2)
+  center = corners.mean(axis=0)
+  angles = numpy.arctan2(corners[:, 1] - center[1], corners[:, 0] - center[0])
+  corners = corners[numpy.argsort(angles)]
+
+  # clockwise from the corner nearest to the origin
+  head = numpy.argmin(corners.sum(axis=1))
+  return numpy.roll(corners, -head, axis=0)
+
+# Find the quad_num largest bright quadrilaterals (the displays) on an
+# image, from left to right. A display is separated from its darker
+# surroundings by Otsu's threshold, and its outline is approximated
+# into 4 corners.
+def find_display_quads(image, quad_num=1, min_area_ratio=0.02):
+  gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+  gray = cv2.GaussianBlur(gray, (5, 5), 0)
+  _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+  # fill the dark parts of the contents inside a display
+  kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 15))
+  binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+
+  contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL,
+    cv2.CHAIN_APPROX_SIMPLE)
+  min_area = image.shape[0] * image.shape[1] * min_area_ratio
+
+  quad_list = []
+  for contour in contours:
+    area = cv2.contourArea(contour)
+
+    if area < min_area:
+      continue
+
+    hull = cv2.convexHull(contour)
+    approx = cv2.approxPolyDP(hull, 0.02 * cv2.arcLength(hull, True), True)
+
+    if len(approx) != 4:
+      continue
+
+    quad_list.append((area, order_corners(approx)))
+
+  quad_list.sort(key=lambda x: -x[0])
+  quad_list = [corners for _, corners in quad_list[:quad_num]]
+
+  return sorted(quad_list, key=lambda x: x[:, 0].mean())
+
+# Homographies from an image to each of the quad_num displays (from left
+# to right) of the output size, from the corners found on the images.
+def locate_displays(image_list, quad_num, size):
+  corners_list = [[] for _ in range(quad_num)]
+
+  for image in image_list:
+    quad_list = find_display_quads(image, quad_num)
+
+    # the order is not known unless all the displays are found
+    if len(quad_list) != quad_num:
+      continue
+
+    for corners, quad in zip(corners_list, quad_list):
+      corners.append(quad)
+
+  if not corners_list[0]:
+    raise CvtestError('display is not found')
+
+  return [fit_homography(corners, numpy.tile(rect_corners(size),
+    (len(corners), 1))) for corners in corners_list]
+
+#####################################################################
+# stamped qr codes
+#####################################################################
+
+# corners of the qr codes with a frame number on an image
+def find_qr_codes(image, detector):
+  is_found, info_list, points_list, _ = detector.detectAndDecodeMulti(image)
+
+  if not is_found:
+    return []
+
+  return [numpy.float32(points).reshape(4, 2)
+    for info, points in zip(info_list, points_list) if info != '']
+
+# Which point of write_framenumber.py each detected code was stamped at.
+# A detected code and a point give a hypothesis of the homography from
+# the frame to the image, and the hypothesis that puts the most of the
+# other codes at the projected points is taken. The index of the point
+# (or -1) is returned for each code.
+def assign_qr_codes(code_list, point_list, font_size=FONT_SIZE):
+  source_list = [qr_corners(point, font_size) for point in point_list]
+  source_centers = numpy.float32([corners.mean(axis=0)
+    for corners in source_list])
+  code_centers = numpy.float32([corners.mean(axis=0) for corners in code_list])
+
+  best_assign = None
+  best_count = 0
+
+  for code in code_list:
+    # the size of a code in the image for the tolerance
+    tolerance = cv2.arcLength(code.reshape(-1, 1, 2), True) / 8
+
+    for source in source_list:
+      matrix = cv2.getPerspectiveTransform(source, code)
+      projected = cv2.perspectiveTransform(source_centers[numpy.newaxis],
+        matrix)[0]
+
+      distances = numpy.linalg.norm(
+        code_centers[:, numpy.newaxis] - projected[numpy.newaxis], axis=2)
+      nearest = numpy.argmin(distances, axis=1)
+      is_inlier = distances[numpy.arange(len(code_list)), nearest] < tolerance
+      count = int(numpy.count_nonzero(is_inlier))
+
+      if count > best_count:
+        best_count = count
+        best_assign = numpy.where(is_inlier, nearest, -1)
+
+  if best_assign is None:
+    return [-1] * len(code_list)
+
+  return best_assign.tolist()
+
+# Homography from an image to the frame given to write_framenumber.py,
+# from the qr codes stamped at the points and found on the images.
+def locate_stamped_frame(image_list, point_list, font_size=FONT_SIZE):
+  detector = cv2.QRCodeDetectorAruco()
+  code_list = []
+
+  for image in image_list:
+    code_list += find_qr_codes(image, detector)
+
+  if not code_list:
+    raise CvtestError('no qr code is found')
+
+  src_points = []
+  dst_points = []
+  for code, index in zip(code_list,
+      assign_qr_codes(code_list, point_list, font_size)):
+    if index < 0:
+      continue
+
+    src_points.append(code)
+    dst_points.append(qr_corners(point_list[index], font_size))
+
+  return fit_homography(src_points, dst_points)
@@ -0,0 +1,396 @@
+######################################################################
+# default library
+######################################################################
+
+import os
+import copy
+import glob
+import stat
+import itertools
+import socket
+import functools
+import socketserver
+
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+
+from .error import CvtestError
+from .recognize import NumberRecognizer, parse_boxes, most_likely_number
+from .match import match_in_full, match_in_window, match_in_pyramid, \
+  search_range, load_gray, format_locations, PYRAMID_PEAKS
+from .timeline import parse_roi_name, parse_record, make_timeline, \
+  write_timeline, timeline_statistics, format_statistics
+from .output import open_stack, parse_stack_name
+from .parallel import make_executor
+from .protocol import send_message, receive_message, decode_bytes, make_result
+
+#####################################################################
+# warm state of a worker
+#####################################################################
+
+# The detectors (one per setting of the boxes, the margin and the
+# prefilter) and the templates stay in the workers across the jobs. The
+# default detector is made before the workers are forked, so that every
+# worker has it from the start.
+#
+# The boxes learned in a job belong to the images of that job, so a job
+# with learn gets a copy of the cached recognizer (sharing the detector)
+# whose boxes start from the given ones.
+
+recognizer_cache = {}
+
+def get_recognizer(box_list=(), learn=False, box_margin=20,
+                   prefilter_scale=0):
+  key = (tuple(tuple(box) for box in box_list), box_margin, prefilter_scale)
+
+  if key not in recognizer_cache:
+    recognizer_cache[key] = NumberRecognizer(box_list, False, box_margin,
+      prefilter_scale=prefilter_scale)
+
+  recognizer = recognizer_cache[key]
+
+  if learn:
+    recognizer = copy.copy(recognizer)
+    recognizer.box_list = list(recognizer.box_list)
+    recognizer.learn = True
+
+  return recognizer
+
+# a template is loaded again only when the file is modified
+@functools.lru_cache(maxsize=64)
+def load_template(file, mtime_ns):
+  return load_gray(file)
+
+def decode_image(text, flags=cv2.IMREAD_COLOR):
+  data = numpy.frombuffer(decode_bytes(text), dtype=numpy.uint8)
+  image = cv2.imdecode(data, flags)
+
+  if image is None:
+    raise CvtestError('cannot decode image')
+
+  return image
+
+# a path of the job on the cwd of the client
+def resolve_path(job, path):
+  return os.path.join(job.get('cwd', '/'), path)
+
+#####################################################################
+# recognize job
+#####################################################################
+
+# The file and [((frame, roi) or None, number or None), ...] for the
+# images of each file, where a .npy file is a stack of
+# homography_transform.py -f npy.
+def recognize_files(recognizer, file_list):
+  for file in file_list:
+    if not file.endswith('.npy'):
+      yield file, [(parse_roi_name(file), recognizer.recognize_file(file))]
+      continue
+
+    frames, frame_list = open_stack(file)
+    roi = parse_stack_name(file)
+
+    yield file, [(None if roi is None else (frame_number, roi),
+      recognizer.recognize(numpy.asarray(image)))
+      for frame_number, image in zip(frame_list, frames)]
+
+def read_records(job, pattern, warning_list):
+  if 'record_lines' in job:
+    line_list = job['record_lines']
+  else:
+    with open(resolve_path(job, pattern)) as f:
+      line_list = f.readlines()
+
+  record_list = []
+
+  for line in line_list:
+    record = parse_record(line)
+
+    if record is None:
+      warning_list.append('invalid record skipped <' + line.strip() + '>')
+      continue
+
+    record_list.append(record)
+
+  return record_list
+
+# same as recognize_likely_number.py with the options of the job (the
+# images of the job are decoded on a worker without -j)
+def run_recognize(job):
+  pattern       = job.get('pattern', '')
+  timeline_file = job.get('timeline', '')
+  is_records    = job.get('records', False)
+  warning_list  = []
+
+  if is_records and timeline_file == '':
+    return make_result(1, errors=['records can be read only with the timeline'])
+
+  if is_records:
+    if 'record_lines' not in job and \
+       not os.access(resolve_path(job, pattern), os.R_OK):
+      return make_result(1, errors=['invalid file specified <' + pattern + '>'])
+  elif pattern != '':
+    glob_list = glob.glob(resolve_path(job, pattern))
+    file_list = list(filter(lambda x: os.access(x, os.F_OK), glob_list))
+
+    if not file_list:
+      return make_result(1, errors=['no file found <' + pattern + '>'])
+  else:
+    file_list = []
+
+  recognizer = get_recognizer(parse_boxes(job.get('boxes', '')),
+    job.get('learn', False), job.get('box_margin', 20),
+    job.get('prefilter', 0))
+
+  number_list = []
+  record_list = []
+
+  if is_records:
+    record_list = read_records(job, pattern, warning_list)
+  else:
+    result_iter = recognize_files(recognizer, file_list)
+
+    # images given in the job, as "-" of the client
+    if 'images' in job:
+      result_iter = itertools.chain(result_iter,
+        (('-', [(None, recognizer.recognize(decode_image(text)))])
+          for text in job['images']))
+
+    for file, result_list in result_iter:
+      for roi_name, number in result_list:
+        if timeline_file != '':
+          if roi_name is None:
+            warning_list.append('frame and roi are unknown <' + file + '>')
+            break
+
+          record_list.append(roi_name +
+            (-1 if number is None else int(number),))
+          continue
+
+        if number is not None:
+          number_list.append(number)
+
+  if timeline_file != '':
+    if not record_list:
+      return make_result(1, errors=['no record found <' + pattern + '>'],
+        warnings=warning_list)
+
+    timeline, roi_values = make_timeline(record_list)
+    write_timeline(resolve_path(job, timeline_file), timeline, roi_values)
+
+    line_list = format_statistics(timeline_statistics(timeline, roi_values))
+    return make_result(0, ''.join(line + '\n' for line in line_list),
+      warnings=warning_list)
+
+  number = most_likely_number(number_list)
+
+  if number is None:
+    return make_result(1, errors=['recognize failed <' + pattern + '>'],
+      warnings=warning_list)
+
+  return make_result(0, number + '\n', warnings=warning_list)
+
+#####################################################################
+# match job
+#####################################################################
+
+# the gray targets of is_match.py -b/-v as (name, image or None for an
+# unreadable file), with the errors on them appended to error_list
+def read_targets(job, target, is_video, error_list):
+  if is_video:
+    cap = cv2.VideoCapture(resolve_path(job, target))
+
+    if not cap.isOpened():
+      raise CvtestError('cannot open video <' + target + '>')
+
+    frame_number = 1
+
+    while True:
+      is_frame, frame = cap.read()
+
+      if not is_frame:
+        break
+
+      yield '{0:06d}'.format(frame_number), \
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+      frame_number += 1
+
+    cap.release()
+    return
+
+  if 'target_lines' in job:
+    line_list = job['target_lines']
+  else:
+    with open(resolve_path(job, target)) as f:
+      line_list = f.readlines()
+
+  for line in line_list:
+    name = line.strip()
+
+    if name == '':
+      continue
+
+    try:
+      yield name, load_gray(resolve_path(job, name))
+    except CvtestError as e:
+      error_list.append(str(e))
+      yield name, None
+
+# same as is_match.py with the options of the job (the targets are
+# matched on a worker without -j)
+def run_match(job):
+  template  = job['template']
+  target    = job.get('target', '-')
+  is_batch  = job.get('batch', False)
+  is_video  = job.get('video', False)
+  pyramid   = job.get('pyramid', 0)
+  peak_num  = job.get('peaks', PYRAMID_PEAKS)
+  is_multi  = is_batch or is_video
+
+  if is_batch and is_video:
+    return make_result(1,
+      errors=['batch and video cannot be specified together'])
+
+  template_list = template.split(',') if is_multi else [template]
+
+  for template_file in template_list:
+    if not os.access(resolve_path(job, template_file), os.F_OK):
+      return make_result(1, errors=['invalid template specified'])
+
+  if 'target_image' in job or 'target_lines' in job:
+    pass
+  elif not os.access(resolve_path(job, target), os.F_OK):
+    return make_result(1, errors=['invalid target specified'])
+
+  if pyramid < 0:
+    return make_result(1, errors=['invalid pyramid levels specified'])
+
+  if peak_num <= 0:
+    return make_result(1, errors=['invalid number of peaks specified'])
+
+  if pyramid > 0 and is_multi:
+    return make_result(1,
+      errors=['pyramid cannot be specified in the batch or video mode'])
+
+  template_gray_list = []
+  for template_file in template_list:
+    path = resolve_path(job, template_file)
+    template_gray_list.append(load_template(path, os.stat(path).st_mtime_ns))
+
+  delta = job.get('delta', 5)
+  x_range = search_range(job.get('cord_x', -1), delta)
+  y_range = search_range(job.get('cord_y', -1), delta)
+
+  if is_multi:
+    error_list = []
+    line_list = []
+
+    for name, target_gray in read_targets(job, target, is_video, error_list):
+      if target_gray is None:
+        loc_list = [None] * len(template_gray_list)
+      else:
+        loc_list = [match_in_window(target_gray, template_gray, x_range,
+          y_range) for template_gray in template_gray_list]
+
+      line_list.append(format_locations(name, loc_list) + '\n')
+
+    return make_result(0, ''.join(line_list), errors=error_list)
+
+  if 'target_image' in job:
+    target_gray = decode_image(job['target_image'], cv2.IMREAD_GRAYSCALE)
+  else:
+    target_gray = load_gray(resolve_path(job, target))
+
+  if pyramid > 0:
+    max_loc = match_in_pyramid(target_gray, template_gray_list[0], x_range,
+      y_range, levels=pyramid, peak_num=peak_num)
+  else:
+    max_loc = match_in_full(target_gray, template_gray_list[0], x_range,
+      y_range)
+
+  if max_loc is None:
+    return make_result(1)
+
+  return make_result(0, '{} {}\n'.format(max_loc[0], max_loc[1]))
+
+def run_job(job):
+  try:
+    if job.get('op') == 'recognize':
+      return run_recognize(job)
+    elif job.get('op') == 'match':
+      return run_match(job)
+    else:
+      return make_result(1, errors=['invalid job <' + str(job.get('op')) + '>'])
+  except CvtestError as e:
+    return make_result(1, errors=[str(e)])
+  except (KeyError, TypeError, ValueError) as e:
+    return make_result(1, errors=['invalid job (' + str(e) + ')'])
+
+def warm_up():
+  return os.getpid()
+
+#####################################################################
+# server
+#####################################################################
+
+class JobHandler(socketserver.StreamRequestHandler):
+  def handle(self):
+    try:
+      job = receive_message(self.rfile)
+    except ValueError:
+      send_message(self.wfile, make_result(1, errors=['invalid message']))
+      return
+
+    if job is None:
+      return
+
+    try:
+      result = self.server.executor.submit(run_job, job).result()
+    except Exception as e:
+      # e.g. a worker died on the job
+      result = make_result(1, errors=['job failed (' + str(e) + ')'])
+
+    send_message(self.wfile, result)
+
+# Serve the jobs on a Unix domain socket. A connection is handled on a
+# thread, and its job is run on the process pool of job_num workers.
+class JobServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+  daemon_threads = True
+
+  def __init__(self, socket_path, job_num):
+    if os.path.exists(socket_path):
+      remove_stale_socket(socket_path)
+
+    get_recognizer()
+    self.executor = make_executor(job_num)
+
+    # the workers are forked here, before any thread is started
+    self.executor.submit(warm_up).result()
+
+    self.socket_path = socket_path
+    super().__init__(socket_path, JobHandler)
+
+  def server_close(self):
+    super().server_close()
+    self.executor.shutdown()
+
+    if os.path.exists(self.socket_path):
+      os.unlink(self.socket_path)
+
+def remove_stale_socket(socket_path):
+  if not stat.S_ISSOCK(os.stat(socket_path).st_mode):
+    raise CvtestError('<' + socket_path + '> exists as file')
+
+  with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+    try:
+      sock.connect(socket_path)
+    except OSError:
+      # nobody is listening
+      os.unlink(socket_path)
+      return
+
+  raise CvtestError('server is already running <' + socket_path + '>')
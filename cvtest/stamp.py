@@ -0,0 +1,264 @@
+######################################################################
+# default library
+######################################################################
+
+import os
+import shutil
+import subprocess
+
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+import qrcode
+from PIL import ImageFont, ImageDraw, Image
+
+from . import trace
+from .error import CvtestError
+from .layout import FONT_SIZE, MARGIN, QR_WIDTH, QR_HEIGHT, QR_MODULES, \
+  QR_BORDER
+
+#####################################################################
+# setting for drawing
+#####################################################################
+
+# the sizes and the positions are in layout.py
+FONT_FILE  = '/Users/xxxx/Library/Fonts/RictyDiminished-Regular.ttf'
+FONT_COLOR = (255, 255, 255)
+
+# the font asked to fontconfig where FONT_FILE is not found (e.g. on Linux)
+FONT_PATTERN = 'monospace:fontformat=TrueType'
+
+SAMPLE_STR = '888888'
+DIGITS     = '0123456789'
+RECT_COLOR = (0, 0, 0)
+
+#####################################################################
+# setting for QR code
+#####################################################################
+
+QR_VERSION = 1
+QR_LEVEL   = qrcode.constants.ERROR_CORRECT_H
+QR_BOXSIZE = 20
+
+#####################################################################
+# font
+#####################################################################
+
+# FONT_FILE, or the font of FONT_PATTERN by fc-match, or '' if neither
+# is found
+def default_font_file():
+  if os.access(FONT_FILE, os.R_OK):
+    return FONT_FILE
+
+  if shutil.which('fc-match') is None:
+    return ''
+
+  try:
+    result = subprocess.run(['fc-match', '-f', '%{file}', FONT_PATTERN],
+      capture_output=True, text=True, timeout=10)
+  except (OSError, subprocess.SubprocessError):
+    return ''
+
+  font_file = result.stdout.strip()
+
+  if result.returncode != 0 or not os.access(font_file, os.R_OK):
+    return ''
+
+  return font_file
+
+#####################################################################
+# stamper
+#####################################################################
+
+# Weights of resizing module_num modules into size pixels, the same as
+# cv2.resize of the modules repeated by QR_BOXSIZE, so that a qr patch is
+# made from its modules by two small products.
+def qr_scaling(module_num, size):
+  expanded = numpy.repeat(numpy.eye(module_num, dtype=numpy.float32),
+    QR_BOXSIZE, axis=0)
+  return cv2.resize(expanded, (module_num, size))
+
+# Stamp the frame number and its qr code at the points of frames.
+#
+# Only the rectangle with the number and the qr code below it are
+# overwritten on each frame. They are made as small patches from the
+# pre-rendered glyphs and the qr modules (cached on disk under cache_dir
+# if given) once for a frame, and copied into the frame at each point by
+# slices precomputed with the clipping to the frame.
+class FrameStamper:
+  def __init__(self, frame_size, point_list, font_file=FONT_FILE,
+               font_size=FONT_SIZE, cache_dir=''):
+    if not os.access(font_file, os.F_OK) or not os.access(font_file, os.R_OK):
+      raise CvtestError('invalid font file specified <' + font_file + '>')
+
+    if not point_list:
+      raise CvtestError('no point specified')
+
+    self.frame_width, self.frame_height = frame_size
+    self.point_list = list(point_list)
+    self.font_size  = font_size
+    self.font       = ImageFont.truetype(font_file, font_size)
+    self.digit_num  = len(SAMPLE_STR)
+    self.str_format = '0' + str(self.digit_num) + 'd'
+
+    self.qr = qrcode.QRCode(QR_VERSION, QR_LEVEL, QR_BOXSIZE, QR_BORDER)
+
+    if cache_dir == '':
+      self.qr_cache_dir = ''
+    else:
+      self.qr_cache_dir = cache_dir + '/' + \
+        'qr_{}_{}_{}'.format(QR_VERSION, QR_LEVEL, QR_BORDER)
+      os.makedirs(self.qr_cache_dir, exist_ok=True)
+
+    self.prepare_glyphs()
+    self.prepare_copies()
+
+    module_num = QR_MODULES + QR_BORDER*2
+    self.qr_rows = qr_scaling(module_num, QR_HEIGHT)
+    self.qr_cols = qr_scaling(module_num, QR_WIDTH).T
+
+  def prepare_glyphs(self):
+    # only for measuring the text
+    dummy_draw = ImageDraw.Draw(Image.new('RGB', (1, 1), (0, 0, 0)))
+
+    # The digits are put one by one at their own advances, as PIL puts
+    # them in the string. With a proportional font the rectangle is also
+    # large enough for the widest digit at every place.
+    self.digit_advances = [self.font.getlength(digit) for digit in DIGITS]
+    box_list = [dummy_draw.textbbox((0, 0), SAMPLE_STR, font=self.font)]
+
+    if len(set(self.digit_advances)) > 1:
+      widest_digit = DIGITS[self.digit_advances.index(max(self.digit_advances))]
+      box_list.append(dummy_draw.textbbox((0, 0),
+        widest_digit * self.digit_num, font=self.font))
+
+    self.rect_box = tuple(int(f(box[i] for box in box_list))
+      for i, f in enumerate([min, min, max, max]))
+    self.rect_width  = self.rect_box[2] - self.rect_box[0] + MARGIN*2 + 1
+    self.rect_height = self.rect_box[3] - self.rect_box[1] + MARGIN*2 + 1
+    self.text_left   = MARGIN - self.rect_box[0]
+    text_top         = MARGIN - self.rect_box[1]
+
+    # glyph_masks[d] is the left of the coverage of the digit d from its
+    # origin and the coverage (as high as the rectangle)
+    self.glyph_masks = []
+    for digit in DIGITS:
+      left, _, right, _ = map(int,
+        dummy_draw.textbbox((0, 0), digit, font=self.font))
+      mask_image = Image.new('L', (max(right - left, 1), self.rect_height), 0)
+      ImageDraw.Draw(mask_image).text((-left, text_top), digit, fill=255,
+        font=self.font)
+      self.glyph_masks.append((left, numpy.array(mask_image)))
+
+    # colors of the rectangle by the coverage of the font
+    alpha = numpy.arange(256, dtype=numpy.uint16)[:, numpy.newaxis]
+    self.text_lut = ((numpy.array(RECT_COLOR, dtype=numpy.uint16) *
+      (255 - alpha) + numpy.array(FONT_COLOR, dtype=numpy.uint16) * alpha +
+      127) // 255).astype(numpy.uint8)
+
+  # Slices of the frame and of a patch of size at the point (moved by
+  # offset), clipped to the frame, or None if nothing is in the frame.
+  def clip_patch(self, point, offset, size):
+    left = point[0] + offset[0]
+    top  = point[1] + offset[1]
+    x0 = max(left, 0)
+    y0 = max(top, 0)
+    x1 = min(left + size[0], self.frame_width)
+    y1 = min(top + size[1], self.frame_height)
+
+    if x0 >= x1 or y0 >= y1:
+      return None
+
+    return ((slice(y0, y1), slice(x0, x1)),
+            (slice(y0 - top, y1 - top), slice(x0 - left, x1 - left)))
+
+  def prepare_copies(self):
+    # The rectangle is around the text at the point and the qr code is
+    # below it. The positions are relative to the point.
+    text_offset = (self.rect_box[0] - MARGIN, self.rect_box[1] - MARGIN)
+    qr_offset   = (0, MARGIN*2 + self.font_size)
+
+    # copy_list[i] is the text and the qr slices of the i-th point
+    self.copy_list = []
+    for point in self.point_list:
+      self.copy_list.append((
+        self.clip_patch(point, text_offset, (self.rect_width, self.rect_height)),
+        self.clip_patch(point, qr_offset, (QR_WIDTH, QR_HEIGHT))))
+
+  def make_text_patch(self, num_str):
+    with trace.tracer.span('text'):
+      coverage = numpy.zeros((self.rect_height, self.rect_width),
+        dtype=numpy.uint8)
+      advance = 0.0
+
+      for digit in map(int, num_str):
+        glyph_left, mask = self.glyph_masks[digit]
+        left  = self.text_left + int(round(advance)) + glyph_left
+        start = max(left, 0)
+        stop  = min(left + mask.shape[1], self.rect_width)
+        advance += self.digit_advances[digit]
+
+        if start >= stop:
+          continue
+
+        numpy.maximum(coverage[:, start:stop],
+          mask[:, start - left:stop - left], out=coverage[:, start:stop])
+
+      return numpy.take(self.text_lut, coverage, axis=0)
+
+  def load_qr_modules(self, num_str):
+    if self.qr_cache_dir != '':
+      cache_file = self.qr_cache_dir + '/' + num_str + '.npy'
+      if os.access(cache_file, os.R_OK):
+        return numpy.load(cache_file)
+
+    with trace.tracer.span('qrcode'):
+      self.qr.clear()
+      self.qr.add_data(num_str)
+      self.qr.make()
+      # the matrix includes the border (True is a dark module)
+      modules = numpy.array(self.qr.get_matrix(), dtype=bool)
+
+    if self.qr_cache_dir != '':
+      tmp_file = self.qr_cache_dir + '/.' + num_str + '.' + \
+        str(os.getpid()) + '.npy'
+      numpy.save(tmp_file, modules)
+      os.replace(tmp_file, cache_file)
+
+    return modules
+
+  # the gray qr code of QR_WIDTH x QR_HEIGHT
+  def make_qr_patch(self, num_str):
+    modules = self.load_qr_modules(num_str)
+    values = numpy.where(modules, 0.0, 255.0).astype(numpy.float32)
+    patch = self.qr_rows @ values @ self.qr_cols
+    return (patch + 0.5).astype(numpy.uint8)
+
+  def format_number(self, frame_number):
+    return format(frame_number, self.str_format)
+
+  # Stamp the frame number at all points, or at one point in rotation
+  # ((frame_number - 1) % number of points). The frame is stamped in
+  # place and returned.
+  def stamp(self, frame, frame_number, all_points=False):
+    num_str = self.format_number(frame_number)
+
+    if all_points:
+      copy_list = self.copy_list
+    else:
+      cur_idx = (frame_number - 1) % len(self.point_list)
+      copy_list = self.copy_list[cur_idx:cur_idx + 1]
+
+    text_patch = self.make_text_patch(num_str)
+    qr_patch   = cv2.cvtColor(self.make_qr_patch(num_str), cv2.COLOR_GRAY2BGR)
+
+    for text_copy, qr_copy in copy_list:
+      if text_copy is not None:
+        frame[text_copy[0]] = text_patch[text_copy[1]]
+      if qr_copy is not None:
+        frame[qr_copy[0]] = qr_patch[qr_copy[1]]
+
+    return frame
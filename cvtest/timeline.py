@@ -0,0 +1,129 @@
+######################################################################
+# default library
+######################################################################
+
+import os
+import re
+
+######################################################################
+# external library
+######################################################################
+
+import numpy
+
+#####################################################################
+# record
+#####################################################################
+
+# "<prefix>_<frame>_<roi>.png" as written by homography_transform.py
+NAME_PATTERN = re.compile(r'_([0-9]+)_([0-9]+)\.[^.]+$')
+
+# (frame, roi) of an image file, or None if the name is not in the form
+def parse_roi_name(file):
+  match = NAME_PATTERN.search(os.path.basename(file))
+
+  if match is None:
+    return None
+
+  return int(match.group(1)), int(match.group(2))
+
+# Parse a "frame,roi,number" record (empty number if not recognized)
+# into (frame, roi, number), where number is -1 if not recognized.
+# None is returned for an invalid record.
+def parse_record(line):
+  fields = line.strip().split(',')
+
+  if len(fields) != 3 or not fields[0].isdigit() or not fields[1].isdigit():
+    return None
+
+  number = int(fields[2]) if fields[2].isdigit() else -1
+  return int(fields[0]), int(fields[1]), number
+
+def format_record(frame_number, roi_number, number):
+  return '{},{},{}'.format(frame_number, roi_number,
+    '' if number is None else number)
+
+#####################################################################
+# timeline
+#####################################################################
+
+# Make a timeline from (frame, roi, number) records. A row is a captured
+# frame: the first column is the frame and the others are the numbers
+# of the rois (-1 is not recognized).
+def make_timeline(record_list):
+  frame_values = sorted(set(record[0] for record in record_list))
+  roi_values   = sorted(set(record[1] for record in record_list))
+  frame_index  = {frame: i for i, frame in enumerate(frame_values)}
+  roi_index    = {roi: i for i, roi in enumerate(roi_values)}
+
+  timeline = numpy.full((len(frame_values), 1 + len(roi_values)), -1,
+    dtype=numpy.int64)
+  timeline[:, 0] = frame_values
+
+  for frame, roi, number in record_list:
+    timeline[frame_index[frame], 1 + roi_index[roi]] = number
+
+  return timeline, roi_values
+
+# write as .npy or (for any other name) CSV
+def write_timeline(timeline_file, timeline, roi_values):
+  if timeline_file.endswith('.npy'):
+    numpy.save(timeline_file, timeline)
+  else:
+    header = ','.join(['frame'] +
+      ['roi_{0:02d}'.format(roi) for roi in roi_values])
+    numpy.savetxt(timeline_file, timeline, fmt='%d', delimiter=',',
+      header=header, comments='')
+
+# Statistics of each roi: recognized and missed frames, dropped frames
+# (skipped numbers) and repeated frames (same number again), and the
+# latency in frames behind the first roi on the same captured frame.
+def timeline_statistics(timeline, roi_values):
+  statistics = []
+
+  for i, roi in enumerate(roi_values, 1):
+    numbers = timeline[:, i]
+    recognized = numbers[numbers >= 0]
+    steps = numpy.diff(recognized)
+
+    stat = {
+      'roi':        roi,
+      'recognized': len(recognized),
+      'missed':     len(numbers) - len(recognized),
+      'dropped':    int(numpy.sum(steps[steps > 1] - 1)),
+      'repeated':   int(numpy.count_nonzero(steps == 0)),
+    }
+
+    both = (timeline[:, 1] >= 0) & (numbers >= 0)
+    if i > 1 and numpy.any(both):
+      latency = timeline[both, 1] - numbers[both]
+      stat['latency_mean'] = float(numpy.mean(latency))
+      stat['latency_min']  = int(numpy.min(latency))
+      stat['latency_max']  = int(numpy.max(latency))
+
+    statistics.append(stat)
+
+  return statistics
+
+# the lines of the statistics printed by recognize_likely_number.py -t
+def format_statistics(statistics):
+  line_list = []
+
+  for stat in statistics:
+    line_list.append(
+      'roi_{0:02d} recognized={1} missed={2} dropped={3} repeated={4}'
+      .format(stat['roi'], stat['recognized'], stat['missed'],
+        stat['dropped'], stat['repeated']))
+
+  # latency of each roi behind the first one on the same captured frame
+  for stat in statistics[1:]:
+    if 'latency_mean' not in stat:
+      line_list.append('roi_{0:02d} latency=none'.format(stat['roi']))
+      continue
+
+    line_list.append(
+      'roi_{0:02d} latency_mean={1:.2f} latency_min={2} latency_max={3}'
+      .format(stat['roi'], stat['latency_mean'], stat['latency_min'],
+        stat['latency_max']))
+
+  return line_list
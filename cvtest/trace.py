@@ -0,0 +1,247 @@
+######################################################################
+# default library
+######################################################################
+
+import os
+import json
+import time
+import threading
+import contextlib
+
+#####################################################################
+# setting
+#####################################################################
+
+# The trace is enabled by --trace <file> of a script, or by this variable
+# for all the scripts (a directory gets "<script>.<pid>.json" files).
+TRACE_ENV = 'CVTEST_TRACE'
+
+# beyond this, only the totals of the stages are kept
+MAX_EVENTS = 1000000
+
+#####################################################################
+# tracer
+#####################################################################
+
+# Record the stages of a run (wall and cpu time of each span, frames,
+# bytes written and queue depths) as Chrome trace events, which can be
+# opened in chrome://tracing or Perfetto. A summary line (frames, fps and
+# ETA) is given to output_info every interval seconds.
+#
+# A forked worker keeps no events, but gives the totals of its stages
+# and bytes back with the output of each task (see cvtest.parallel),
+# which are merged here as the stages of the workers.
+#
+#   with trace.tracer.span('decode'):
+#     is_frame, frame = cap.read()
+#
+# The disabled tracer (the default) does nothing: span() returns the
+# same empty context and the other calls return at once.
+class Tracer:
+  def __init__(self, trace_file, process_name, frame_total=0, interval=10.0,
+               output_info=None):
+    self.enabled      = True
+    self.trace_file   = trace_file
+    self.process_name = process_name
+    self.frame_total  = frame_total
+    self.interval     = interval
+    self.output_info  = output_info
+    self.pid          = os.getpid()
+    self.origin       = time.perf_counter()
+    self.event_list   = []
+    self.max_events   = MAX_EVENTS
+    self.stage_dict   = {}
+    self.worker_stage_dict = {}
+    self.frame_num    = 0
+    self.byte_num     = 0
+    self.last_report  = self.origin
+    self.lock         = threading.Lock()
+
+  def now_us(self):
+    return (time.perf_counter() - self.origin) * 1e6
+
+  def add_event(self, event):
+    if len(self.event_list) < self.max_events:
+      event['pid'] = self.pid
+      event['tid'] = threading.get_ident()
+      self.event_list.append(event)
+
+  @contextlib.contextmanager
+  def span(self, stage):
+    start_us  = self.now_us()
+    start_cpu = time.thread_time()
+
+    try:
+      yield
+    finally:
+      wall_us = self.now_us() - start_us
+      cpu_us  = (time.thread_time() - start_cpu) * 1e6
+
+      self.add_event({'name': stage, 'ph': 'X', 'ts': start_us,
+        'dur': wall_us, 'args': {'cpu_us': cpu_us}})
+
+      with self.lock:
+        add_stage(self.stage_dict, stage, 1, wall_us / 1e6, cpu_us / 1e6)
+
+  def counter(self, name, **values):
+    self.add_event({'name': name, 'ph': 'C', 'ts': self.now_us(),
+      'args': values})
+
+  def add_bytes(self, byte_num):
+    with self.lock:
+      self.byte_num += byte_num
+
+  # the totals of the stages and the bytes since the last call, which a
+  # worker gives back with the output of a task
+  def take_totals(self):
+    with self.lock:
+      totals = (self.stage_dict, self.byte_num)
+      self.stage_dict = {}
+      self.byte_num = 0
+
+    return totals
+
+  # add the totals of a worker
+  def merge_totals(self, totals):
+    stage_dict, byte_num = totals
+
+    with self.lock:
+      for stage, total in stage_dict.items():
+        add_stage(self.worker_stage_dict, stage, total['count'],
+          total['wall_s'], total['cpu_s'])
+
+      self.byte_num += byte_num
+
+  def summary(self):
+    elapsed = time.perf_counter() - self.origin
+    fps = self.frame_num / elapsed if elapsed > 0 else 0.0
+    line = 'frames {}{} in {:.1f}s ({:.1f} fps'.format(self.frame_num,
+      '/' + str(self.frame_total) if self.frame_total > 0 else '',
+      elapsed, fps)
+
+    if self.frame_total > 0 and fps > 0:
+      eta = max(self.frame_total - self.frame_num, 0) / fps
+      line += ', ETA {:d}:{:02d}'.format(int(eta) // 60, int(eta) % 60)
+
+    return line + ')'
+
+  def add_frames(self, frame_num=1):
+    self.frame_num += frame_num
+    self.counter('frames', frames=self.frame_num)
+
+    now = time.perf_counter()
+    if self.output_info is not None and now - self.last_report >= self.interval:
+      self.last_report = now
+      self.output_info(self.summary())
+
+  def close(self):
+    elapsed = time.perf_counter() - self.origin
+    stages = self.per_frame(self.stage_dict)
+    worker_stages = self.per_frame(self.worker_stage_dict)
+
+    trace = {
+      'traceEvents': [{'name': 'process_name', 'ph': 'M', 'pid': self.pid,
+        'args': {'name': self.process_name}}] + self.event_list,
+      'displayTimeUnit': 'ms',
+      'otherData': {
+        'process':       self.process_name,
+        'seconds':       elapsed,
+        'frames':        self.frame_num,
+        'bytes_written': self.byte_num,
+        'stages':        stages,
+        'worker_stages': worker_stages,
+      },
+    }
+
+    with open(self.trace_file, 'w') as f:
+      json.dump(trace, f)
+
+    if self.output_info is not None:
+      self.output_info(self.summary())
+
+      for label, stage_dict in [('', stages), (' (workers)', worker_stages)]:
+        for stage, total in sorted(stage_dict.items(),
+            key=lambda x: -x[1]['wall_s']):
+          self.output_info('{}{}: {} times, wall {:.2f}s, cpu {:.2f}s'.format(
+            stage, label, total['count'], total['wall_s'], total['cpu_s']))
+
+      self.output_info('trace is written <' + self.trace_file + '>')
+
+  def per_frame(self, stage_dict):
+    return {stage: dict(total,
+      per_frame_ms=total['wall_s'] * 1000 / self.frame_num
+        if self.frame_num > 0 else 0.0)
+      for stage, total in stage_dict.items()}
+
+def add_stage(stage_dict, stage, count, wall_s, cpu_s):
+  stage_total = stage_dict.setdefault(stage,
+    {'count': 0, 'wall_s': 0.0, 'cpu_s': 0.0})
+  stage_total['count']  += count
+  stage_total['wall_s'] += wall_s
+  stage_total['cpu_s']  += cpu_s
+
+class NullTracer:
+  enabled = False
+
+  def __init__(self):
+    self.null_span = contextlib.nullcontext()
+
+  def span(self, stage):
+    return self.null_span
+
+  def counter(self, name, **values):
+    pass
+
+  def add_bytes(self, byte_num):
+    pass
+
+  def add_frames(self, frame_num=1):
+    pass
+
+  def take_totals(self):
+    return None
+
+  def merge_totals(self, totals):
+    pass
+
+  def close(self):
+    pass
+
+# the tracer of this process, also used inside the library
+tracer = NullTracer()
+
+# Enable the tracer with the file of --trace or of TRACE_ENV (nothing is
+# done if neither is given). The tracer is returned.
+def start_trace(trace_file, script_file, frame_total=0, interval=10.0,
+                output_info=None):
+  global tracer
+
+  process_name = os.path.basename(script_file)
+
+  if trace_file == '':
+    trace_file = os.environ.get(TRACE_ENV, '')
+
+    if os.path.isdir(trace_file):
+      trace_file = os.path.join(trace_file,
+        '{}.{}.json'.format(os.path.splitext(process_name)[0], os.getpid()))
+
+  if trace_file != '':
+    tracer = Tracer(trace_file, process_name, frame_total, interval,
+      output_info)
+
+  return tracer
+
+# Called on a forked worker, which has a copy of the tracer of the caller
+# (also as the variable of a script): no event is kept there, and the
+# totals start from zero to be given back by take_totals().
+def detach_trace():
+  if tracer.enabled:
+    tracer.max_events = 0
+    tracer.event_list = []
+    tracer.output_info = None
+    tracer.stage_dict = {}
+    tracer.worker_stage_dict = {}
+    tracer.byte_num = 0
+
+    # the lock could be held by another thread of the caller on the fork
+    tracer.lock = threading.Lock()
@@ -0,0 +1,396 @@
+######################################################################
+# default library
+######################################################################
+
+import re
+import shlex
+import shutil
+import subprocess
+
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+
+from . import trace
+from .error import CvtestError
+
+#####################################################################
+# capture
+#####################################################################
+
+DECODERS = ['opencv', 'ffmpeg']
+
+# Open the video with a decoder:
+#  opencv: cv2.VideoCapture
+#  ffmpeg: FFmpegCapture below, which decodes on threads of an ffmpeg
+#          subprocess
+def open_capture(video_file, decoder='opencv'):
+  if decoder not in DECODERS:
+    raise CvtestError('invalid decoder specified <' + decoder + '>')
+
+  cap = cv2.VideoCapture(video_file)
+
+  if not cap.isOpened():
+    raise CvtestError('cannot open video <' + video_file + '>')
+
+  if decoder == 'ffmpeg':
+    cap = FFmpegCapture(video_file, cap)
+
+  return cap
+
+def get_frame_size(cap):
+  return (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+          int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+def get_frame_count(cap):
+  return int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+#####################################################################
+# ffmpeg decoder
+#####################################################################
+
+# bytes of the pipe from ffmpeg (the default of 64KB takes hundreds of
+# reads for a 4K frame)
+PIPE_SIZE = 1 << 20
+
+# A cv2.VideoCapture-like capture whose frames are decoded by an ffmpeg
+# subprocess (on its own threads, by -threads) and read as raw BGR from
+# the pipe. The frames are read by readinto() straight into the memory
+# of numpy arrays, without copying:
+#  read(dst): into dst (e.g. a slot of FrameRing or map_frames, or the
+#             frame read last time) when it is a contiguous uint8 array
+#             of the frame shape, as cv2.VideoCapture reuses it
+#  read():    into a newly allocated frame
+# The properties (size, frame rate and count) are those given by the
+# OpenCV capture, so that the frames and the chunks are the same with
+# either decoder. POS_FRAMES is set by starting ffmpeg again with -ss
+# (at the time of the frame in a FrameIndex, if any, by start()).
+class FFmpegCapture:
+  def __init__(self, video_file, cap=None, threads=0):
+    if shutil.which('ffmpeg') is None:
+      raise CvtestError('ffmpeg command not found')
+
+    if cap is None:
+      cap = cv2.VideoCapture(video_file)
+
+      if not cap.isOpened():
+        raise CvtestError('cannot open video <' + video_file + '>')
+
+    self.video_file = video_file
+    self.threads    = threads
+    self.prop_dict  = {prop: cap.get(prop) for prop in [
+      cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT,
+      cv2.CAP_PROP_FPS, cv2.CAP_PROP_FRAME_COUNT]}
+    cap.release()
+
+    width, height = get_frame_size(self)
+    self.shape       = (height, width, 3)
+    self.frame_bytes = width * height * 3
+    self.scratch     = self.new_frame()
+    self.position    = 0
+    self.proc        = None
+
+    self.start(0)
+
+  # (re)start ffmpeg at the frame (0-origin) shown at the time in seconds
+  def start(self, position, seconds=None):
+    self.release()
+
+    command = ['ffmpeg', '-nostdin', '-loglevel', 'error',
+      '-threads', str(self.threads)]
+
+    if position > 0:
+      fps = self.prop_dict[cv2.CAP_PROP_FPS]
+
+      if seconds is None:
+        seconds = position / fps
+
+      # half a frame before it, not to lose the frame on rounding
+      command += ['-ss', '{:.6f}'.format(max(seconds - 0.5 / fps, 0))]
+
+    command += ['-i', self.video_file, '-map', '0:v:0',
+      '-vsync', 'passthrough', '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-']
+
+    self.proc = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=0)
+    self.position = position
+
+    try:
+      import fcntl
+      fcntl.fcntl(self.proc.stdout.fileno(), fcntl.F_SETPIPE_SZ, PIPE_SIZE)
+    except (ImportError, AttributeError, OSError):
+      pass
+
+  def new_frame(self):
+    return numpy.frombuffer(bytearray(self.frame_bytes),
+      dtype=numpy.uint8).reshape(self.shape)
+
+  def isOpened(self):
+    return self.proc is not None
+
+  def get(self, prop):
+    if prop == cv2.CAP_PROP_POS_FRAMES:
+      return float(self.position)
+
+    return self.prop_dict.get(prop, 0.0)
+
+  def set(self, prop, value):
+    if prop != cv2.CAP_PROP_POS_FRAMES or value < 0 or \
+       self.prop_dict[cv2.CAP_PROP_FPS] <= 0:
+      return False
+
+    self.start(int(value))
+    return True
+
+  # fill the memory with the next frame, False at the end of the video
+  def read_into(self, buffer):
+    if self.proc is None:
+      return False
+
+    view = memoryview(buffer).cast('B')
+    size = 0
+
+    while size < self.frame_bytes:
+      read_size = self.proc.stdout.readinto(view[size:])
+
+      if not read_size:
+        # the end of the video, or ffmpeg has failed
+        if self.proc.wait() != 0:
+          raise CvtestError('some error on ffmpeg <' + self.video_file + '>')
+
+        return False
+
+      size += read_size
+
+    self.position += 1
+    return True
+
+  def is_buffer(self, dst):
+    return isinstance(dst, numpy.ndarray) and dst.shape == self.shape and \
+      dst.dtype == numpy.uint8 and dst.flags['C_CONTIGUOUS'] and \
+      dst.flags['WRITEABLE']
+
+  def read(self, dst=None):
+    if not self.is_buffer(dst):
+      dst = self.new_frame()
+
+    if not self.read_into(dst):
+      return False, None
+
+    return True, dst
+
+  # the frame is decoded by ffmpeg anyway, and only not returned
+  def grab(self):
+    return self.read_into(self.scratch)
+
+  def release(self):
+    if self.proc is None:
+      return
+
+    # killed before the pipe is closed, not to complain of it
+    self.proc.kill()
+    self.proc.wait()
+    self.proc.stdout.close()
+    self.proc = None
+
+#####################################################################
+# range and seek
+#####################################################################
+
+# "<i>/<n>" into (i, n), where the chunk i is 1-origin
+def parse_chunk(chunk):
+  match = re.match(r'^([0-9]+)/([0-9]+)$', chunk)
+
+  if match is None:
+    raise CvtestError('invalid chunk specified <' + chunk + '>')
+
+  index, count = int(match.group(1)), int(match.group(2))
+
+  if count <= 0 or index <= 0 or index > count:
+    raise CvtestError('invalid chunk specified <' + chunk + '>')
+
+  return index, count
+
+# First and last frames (1-origin, inclusive) to process. The last
+# frame is 0 for "until the end of the video". A chunk i/n is the i-th
+# of n even parts of the frames reported by the container, so that the
+# chunks of a capture do not overlap and leave no frame out.
+def frame_range(cap, start_frame=1, end_frame=0, chunk=''):
+  if chunk != '':
+    index, count = parse_chunk(chunk)
+    frame_count = get_frame_count(cap)
+
+    if frame_count <= 0:
+      raise CvtestError('number of frames is unknown for the chunk')
+
+    start_frame = (index - 1) * frame_count // count + 1
+    end_frame = index * frame_count // count
+
+    # the last chunk runs to the end, in case the count is not exact
+    if index == count:
+      end_frame = 0
+
+  if start_frame <= 0:
+    raise CvtestError('invalid start frame specified <' + str(start_frame) + '>')
+
+  if end_frame < 0 or (end_frame > 0 and end_frame < start_frame):
+    raise CvtestError('invalid end frame specified <' + str(end_frame) + '>')
+
+  return start_frame, end_frame
+
+# Move the capture to the frame (1-origin) so that the next read()
+# returns it. The backend seeks to the keyframe before it and decodes up
+# to the frame; if it cannot seek, the frames are skipped by grab()
+# without being decoded into images. With a FrameIndex of the video, the
+# seek is by the time of the frame, which is exact also when the frame
+# rate is not constant. The backend tells the frame it has landed on, and
+# a seek by the time landing elsewhere is done again by the frame.
+def seek_capture(cap, frame_number, index=None):
+  position = frame_number - 1
+
+  if position == int(cap.get(cv2.CAP_PROP_POS_FRAMES)):
+    return
+
+  if index is not None and 0 < frame_number <= len(index):
+    seconds = index.pts_of(frame_number)
+
+    if isinstance(cap, FFmpegCapture):
+      cap.start(position, seconds)
+      return
+
+    if cap.set(cv2.CAP_PROP_POS_MSEC, seconds * 1000) and \
+       int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == position:
+      return
+
+  if cap.set(cv2.CAP_PROP_POS_FRAMES, position) and \
+     int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == position:
+    return
+
+  cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+  for _ in range(position):
+    if not cap.grab():
+      raise CvtestError('cannot seek to frame <' + str(frame_number) + '>')
+
+# Skip the frames by grab(), which does not convert them into BGR
+# images (nor copy them out). False is returned at the end of the video.
+def skip_frames(cap, frame_num):
+  if frame_num <= 0:
+    return True
+
+  with trace.tracer.span('skip'):
+    for _ in range(frame_num):
+      if not cap.grab():
+        return False
+
+  return True
+
+# frame (1-origin) shown at the time in seconds (by the times of the
+# frames in the FrameIndex, if any)
+def time_to_frame(cap, seconds, index=None):
+  if index is not None and len(index) > 0:
+    return index.frame_at(seconds)
+
+  fps = cap.get(cv2.CAP_PROP_FPS)
+
+  if fps <= 0:
+    raise CvtestError('frame rate is unknown for the seek')
+
+  return int(round(seconds * fps)) + 1
+
+#####################################################################
+# encoder
+#####################################################################
+
+PROFILES = ['baseline', 'main', 'high']
+WRITERS  = ['ffmpeg', 'opencv']
+
+# same naming as convert_images2video.sh
+def encode_file_name(name):
+  if name.endswith('.mp4'):
+    name = name[:-len('.mp4')]
+
+  return name + '.mp4'
+
+# Encode BGR (or gray) frames into a video in one pass, with the same choices as
+# convert_images2video.sh (frame rate, profile, H264/H265 and custom
+# options for ffmpeg), or losslessly by FFV1 (e.g. into .mkv or .avi).
+#  ffmpeg: the raw frames are piped into an ffmpeg subprocess
+#  opencv: cv2.VideoWriter (the profile cannot be chosen)
+class VideoEncoder:
+  def __init__(self, video_file, size, frame_rate=30, profile='main',
+               h265=False, ffmpeg_options='', writer='ffmpeg', lossless=False,
+               is_color=True):
+    if frame_rate <= 0:
+      raise CvtestError('invalid frame rate specified <' + str(frame_rate) + '>')
+
+    if profile not in PROFILES or (h265 and profile != 'main'):
+      raise CvtestError('invalid profile specified <' + profile + '>')
+
+    if writer not in WRITERS:
+      raise CvtestError('invalid writer specified <' + writer + '>')
+
+    self.video_file   = video_file
+    self.proc         = None
+    self.video_writer = None
+
+    if writer == 'ffmpeg':
+      if shutil.which('ffmpeg') is None:
+        raise CvtestError('ffmpeg command not found')
+
+      if lossless:
+        # no chroma subsampling not to lose any pixel
+        codec_options = ['-pix_fmt', 'bgr0' if is_color else 'gray',
+          '-c:v', 'ffv1']
+      else:
+        codec_options = [
+          '-pix_fmt', 'yuv420p',
+          '-c:v', 'libx265' if h265 else 'libx264',
+          '-profile:v', profile,
+        ]
+
+      # the raw frames are given in the frame rate so as not to duplicate
+      # or drop any of them
+      command = [
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-f', 'rawvideo',
+        '-pix_fmt', 'bgr24' if is_color else 'gray',
+        '-s', '{}x{}'.format(size[0], size[1]),
+        '-r', str(frame_rate),
+        '-i', '-',
+      ] + codec_options + [
+        '-r', str(frame_rate),
+      ] + shlex.split(ffmpeg_options) + [video_file]
+
+      self.proc = subprocess.Popen(command, stdin=subprocess.PIPE)
+    else:
+      if lossless:
+        fourcc = cv2.VideoWriter_fourcc(*'FFV1')
+      else:
+        fourcc = cv2.VideoWriter_fourcc(*('hvc1' if h265 else 'avc1'))
+
+      self.video_writer = cv2.VideoWriter(video_file, fourcc, frame_rate,
+        tuple(size), is_color)
+
+      if not self.video_writer.isOpened():
+        raise CvtestError('video writer cannot be opened <' + video_file + '>')
+
+  def write(self, frame):
+    if self.proc is not None:
+      try:
+        self.proc.stdin.write(frame.data)
+      except BrokenPipeError:
+        raise CvtestError('some error on ffmpeg')
+    else:
+      self.video_writer.write(frame)
+
+  def close(self):
+    if self.proc is not None:
+      self.proc.stdin.close()
+
+      if self.proc.wait() != 0:
+        raise CvtestError('some error on ffmpeg')
+    else:
+      self.video_writer.release()
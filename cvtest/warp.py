@@ -0,0 +1,193 @@
+######################################################################
+# default library
+######################################################################
+
+import os
+import hashlib
+
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+
+from .error import CvtestError
+from .layout import QR_WIDTH, QR_MODULES, QR_BORDER
+
+#####################################################################
+# matrix
+#####################################################################
+
+# load a homography matrix written by homography_information.py
+def load_matrix(matrix_file):
+  if not os.access(matrix_file, os.F_OK) or not os.access(matrix_file, os.R_OK):
+    raise CvtestError('invalid file specified <' + matrix_file + '>')
+
+  try:
+    matrix = numpy.loadtxt(matrix_file)
+  except ValueError:
+    raise CvtestError('invalid contents are included <' + matrix_file + '>')
+
+  if matrix.shape != (3, 3):
+    raise CvtestError('invalid contents are included <' + matrix_file + '>')
+
+  return matrix
+
+def load_matrices(matrix_files):
+  return [load_matrix(matrix_file) for matrix_file in matrix_files.split(',')]
+
+#####################################################################
+# remap table
+#####################################################################
+
+# lookup tables in CV_16SC2 form which give the same warp as
+# cv2.warpPerspective(frame, matrix, size) through cv2.remap
+def build_remap_table(matrix, size):
+  width, height = size
+  inverse = numpy.linalg.inv(matrix)
+
+  map_x = numpy.empty((height, width), dtype=numpy.float32)
+  map_y = numpy.empty((height, width), dtype=numpy.float32)
+  xs = numpy.arange(width, dtype=numpy.float64)
+
+  # compute the source position of each output pixel by blocks of rows
+  # to keep the temporary arrays small on large outputs
+  block_rows = 256
+  for top in range(0, height, block_rows):
+    bottom = min(top + block_rows, height)
+    ys = numpy.arange(top, bottom, dtype=numpy.float64)[:, numpy.newaxis]
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+      w = inverse[2, 0] * xs + inverse[2, 1] * ys + inverse[2, 2]
+      src_x = (inverse[0, 0] * xs + inverse[0, 1] * ys + inverse[0, 2]) / w
+      src_y = (inverse[1, 0] * xs + inverse[1, 1] * ys + inverse[1, 2]) / w
+
+    # a point at infinity is mapped out of the frame (i.e. border)
+    src_x[~numpy.isfinite(src_x)] = -1
+    src_y[~numpy.isfinite(src_y)] = -1
+    map_x[top:bottom] = src_x
+    map_y[top:bottom] = src_y
+
+  return cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+
+# same as build_remap_table but cached in cache_dir (if not empty) by
+# the matrix and the size
+def load_remap_table(matrix, size, cache_dir=''):
+  if cache_dir == '':
+    return build_remap_table(matrix, size)
+
+  key_source = numpy.ascontiguousarray(matrix, dtype=numpy.float64).tobytes() + \
+    '{}x{}:CV_16SC2'.format(size[0], size[1]).encode()
+  key = hashlib.sha256(key_source).hexdigest()[:16]
+  cache_file = cache_dir + '/remap_' + key + '.npz'
+
+  if os.access(cache_file, os.R_OK):
+    with numpy.load(cache_file) as cache:
+      return cache['map1'], cache['map2']
+
+  map1, map2 = build_remap_table(matrix, size)
+
+  os.makedirs(cache_dir, exist_ok=True)
+
+  # write to a temporary file at first not to leave a broken cache
+  tmp_file = cache_dir + '/.remap_' + key + '.' + str(os.getpid()) + '.npz'
+  numpy.savez(tmp_file, map1=map1, map2=map2)
+  os.replace(tmp_file, cache_file)
+
+  return map1, map2
+
+#####################################################################
+# scale
+#####################################################################
+
+# scale of the rois to give module_pixels pixels per module to the qr
+# codes of write_framenumber.py (with the border), which are qr_size
+# pixels in the rois (never above 1)
+def module_scale(module_pixels, qr_size=QR_WIDTH):
+  return min(1.0, module_pixels * (QR_MODULES + QR_BORDER*2) / qr_size)
+
+# the matrices and the size of the rois scaled down
+def scale_rois(matrix_list, size, scale):
+  scaled_size = (max(1, int(round(size[0] * scale))),
+                 max(1, int(round(size[1] * scale))))
+  scaling = numpy.diag([scaled_size[0] / size[0], scaled_size[1] / size[1],
+    1.0])
+
+  return [scaling @ matrix for matrix in matrix_list], scaled_size
+
+#####################################################################
+# warper
+#####################################################################
+
+WARP_METHODS = ['perspective', 'remap']
+
+# Warp frames into rois by a list of homography matrices.
+#  perspective: cv2.warpPerspective on every frame
+#  remap:       lookup tables are built once for each roi (the fixed
+#               point maps round the coordinates, so the pixels may
+#               differ from perspective by a few levels)
+# With gray, a frame is converted into gray once before the rois are
+# warped (a third of the pixels to warp, write and decode).
+class FrameWarper:
+  def __init__(self, matrix_list, size, method='perspective', cache_dir='',
+               gray=False):
+    if method not in WARP_METHODS:
+      raise CvtestError('invalid warp method specified <' + method + '>')
+
+    self.matrix_list = list(matrix_list)
+    self.size        = tuple(size)
+    self.method      = method
+    self.cache_dir   = cache_dir
+    self.gray        = gray
+    self.gray_frame  = None
+    self.table_list  = []
+
+    if method == 'remap':
+      for matrix in self.matrix_list:
+        self.table_list.append(load_remap_table(matrix, self.size, cache_dir))
+
+  def __len__(self):
+    return len(self.matrix_list)
+
+  # replace the matrices (e.g. after a drift of the camera), where the
+  # tables are built again only for the changed ones
+  def set_matrices(self, matrix_list):
+    for i, matrix in enumerate(matrix_list):
+      if numpy.array_equal(matrix, self.matrix_list[i]):
+        continue
+
+      self.matrix_list[i] = matrix
+
+      if self.method == 'remap':
+        self.table_list[i] = load_remap_table(matrix, self.size,
+          self.cache_dir)
+
+  # the frame to give to warp() (the gray frame is reused across frames)
+  def prepare(self, frame):
+    if not self.gray:
+      return frame
+
+    self.gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY,
+      dst=self.gray_frame)
+    return self.gray_frame
+
+  # shape of a warped roi
+  def out_shape(self):
+    if self.gray:
+      return (self.size[1], self.size[0])
+
+    return (self.size[1], self.size[0], 3)
+
+  # dst is an optional preallocated output to warp into
+  def warp(self, frame, roi_index, dst=None):
+    if self.method == 'remap':
+      map1, map2 = self.table_list[roi_index]
+      return cv2.remap(frame, map1, map2, cv2.INTER_LINEAR, dst=dst)
+    else:
+      return cv2.warpPerspective(frame, self.matrix_list[roi_index], self.size,
+        dst=dst)
+
+  def warp_all(self, frame):
+    frame = self.prepare(frame)
+    return [self.warp(frame, i) for i in range(len(self.matrix_list))]
@@ -7,6 +7,7 @@
 import os
 import sys
 import argparse
+import re
 
 #####################################################################
 # utility
@@ -30,12 +31,47 @@ parser.add_argument('input_file', type=str)
 parser.add_argument('-r', '--rows', type=int, default='0')
 parser.add_argument('-c', '--cols', type=int, default='0')
 parser.add_argument('-p', '--print', action='store_true')
+parser.add_argument('--stride', type=int, default=1,
+  help='frames to step by [n] (the others are skipped without decoding)')
+parser.add_argument('--seek-time', type=float, default=0.0,
+  help='show the frame at the time in seconds first')
+parser.add_argument('--decoder', type=str, default='opencv',
+  choices=['opencv', 'ffmpeg'],
+  help='decoder of the video (ffmpeg: decoded on threads of an ffmpeg ' +
+    'subprocess)')
+parser.add_argument('-o', '--out-files', type=str, default='',
+  help='write the matrices for -m of homography_transform.py as <file>[,...]')
+parser.add_argument('-a', '--auto', type=str, default='',
+  choices=['', 'quad', 'qr'],
+  help='find the rois without clicks: quad for the bright display ' +
+    'quadrilaterals, qr for the qr codes stamped by write_framenumber.py')
+parser.add_argument('--auto-frames', type=int, default=3,
+  help='number of the head frames to find the rois on')
+parser.add_argument('-n', '--roi-num', type=int, default=1,
+  help='number of displays from left to right (quad)')
+parser.add_argument('--points', type=str, default='',
+  help='points given to write_framenumber.py as <x>,<y>[,...] (qr)')
+parser.add_argument('--source-size', type=str, default='',
+  help='frame size given to write_framenumber.py as <width>x<height> (qr)')
+parser.add_argument('--regions', type=str, default='',
+  help='rois in the stamped frame as <x>,<y>,<width>,<height>[,...] ' +
+    '(qr, default: the whole frame)')
 
 args = parser.parse_args()
 input_file  = args.input_file
 target_height = args.rows
 target_width  = args.cols
 is_print      = args.print
+stride        = args.stride
+seek_seconds  = args.seek_time
+decoder       = args.decoder
+out_files     = args.out_files
+auto_mode     = args.auto
+auto_frames   = args.auto_frames
+roi_num       = args.roi_num
+points        = args.points
+source_size   = args.source_size
+regions       = args.regions
 
 if not os.access(input_file, os.F_OK) or not os.access(input_file, os.R_OK):
   output_error('invalid file specified <' + input_file + '>')
@@ -49,6 +85,33 @@ if target_width < 0:
   output_error('invalid width specified <' + target_width + '>')
   sys.exit(1)
 
+if stride <= 0:
+  output_error('invalid stride specified <' + str(stride) + '>')
+  sys.exit(1)
+
+if seek_seconds < 0:
+  output_error('invalid seek time specified <' + str(seek_seconds) + '>')
+  sys.exit(1)
+
+if auto_frames <= 0:
+  output_error('invalid number of frames specified <' + str(auto_frames) + '>')
+  sys.exit(1)
+
+if roi_num <= 0:
+  output_error('invalid number of rois specified <' + str(roi_num) + '>')
+  sys.exit(1)
+
+if auto_mode == 'qr' and points == '':
+  output_error('points are required for qr')
+  sys.exit(1)
+
+if auto_mode == 'qr' and regions == '' and \
+   re.match(r'^[0-9]+x[0-9]+$', source_size) is None:
+  output_error('invalid source size specified <' + source_size + '>')
+  sys.exit(1)
+
+out_file_list = out_files.split(',') if out_files != '' else []
+
 #####################################################################
 # external library
 #####################################################################
@@ -65,6 +128,18 @@ except ImportError:
   output_error('numpy not found')
   sys.exit(1)
 
+try:
+  from cvtest import CvtestError, open_capture
+  from cvtest.video import seek_capture, skip_frames, time_to_frame, \
+    get_frame_count
+  from cvtest.index import load_index
+  from cvtest.recognize import parse_boxes
+  from cvtest.roi import region_matrix, locate_displays, locate_stamped_frame
+  from cvtest.layout import parse_points
+except ImportError:
+  output_error('cvtest not found')
+  sys.exit(1)
+
 #####################################################################
 # function for drawing
 #####################################################################
@@ -209,17 +284,102 @@ if input_file.endswith('.jpg') or input_file.endswith('.png'):
   raw_image = cv2.imread(input_file)
 else:
   is_image = False
-  cap = cv2.VideoCapture(input_file)
+  try:
+    cap = open_capture(input_file, decoder)
 
-  if not cap.isOpened():
-    output_error('cannot open video')
+    # the index of build_frame_index.py, if any, for the exact seek
+    frame_index = load_index(input_file, output_warn)
+  except CvtestError as e:
+    output_error(str(e))
     sys.exit(1)
 
+  frame_number = 1
+
+  if frame_index is not None:
+    frame_total = len(frame_index)
+  else:
+    frame_total = get_frame_count(cap)
+
+  if seek_seconds > 0:
+    try:
+      frame_number = time_to_frame(cap, seek_seconds, frame_index)
+      seek_capture(cap, frame_number, frame_index)
+    except CvtestError as e:
+      output_error(str(e))
+      sys.exit(1)
+
   is_frame, raw_image = cap.read()
   if not is_frame:
     output_error('cannot get the head frame')
     sys.exit(1)
 
+#####################################################################
+# function for output
+#####################################################################
+
+# same format as numpy.loadtxt for -m of homography_transform.py
+def write_matrices(matrix_list):
+  if out_file_list:
+    if len(out_file_list) != len(matrix_list):
+      output_error('{} output files are required'.format(len(matrix_list)))
+      sys.exit(1)
+
+    for out_file, matrix in zip(out_file_list, matrix_list):
+      np.savetxt(out_file, matrix)
+      output_info('matrix is written <' + out_file + '>')
+  elif len(matrix_list) == 1:
+    np.savetxt(sys.stdout, matrix_list[0])
+  else:
+    output_error('output files are required for several rois')
+    sys.exit(1)
+
+#####################################################################
+# automatic mode
+#####################################################################
+
+def get_target_size(default_width, default_height):
+  return (target_width  if target_width  > 0 else default_width,
+          target_height if target_height > 0 else default_height)
+
+if auto_mode != '':
+  image_list = [raw_image]
+
+  while not is_image and len(image_list) < auto_frames:
+    is_frame, image = cap.read()
+
+    if not is_frame:
+      break
+
+    image_list.append(image)
+
+  try:
+    if auto_mode == 'quad':
+      # each display into the output as the four clicks do
+      matrix_list = locate_displays(image_list, roi_num,
+        get_target_size(raw_image.shape[1], raw_image.shape[0]))
+    else:
+      # into the stamped frame, and then into each region of it
+      matrix = locate_stamped_frame(image_list, parse_points(points))
+
+      if regions == '':
+        width, height = map(int, source_size.split('x'))
+        region_list = [(0, 0, width, height)]
+      else:
+        region_list = parse_boxes(regions)
+
+      matrix_list = [region_matrix(region, get_target_size(*region[2:])) @
+        matrix for region in region_list]
+  except CvtestError as e:
+    output_error(str(e))
+    sys.exit(1)
+
+  write_matrices(matrix_list)
+  sys.exit(0)
+
+#####################################################################
+# interactive mode
+#####################################################################
+
 window_name = "Perspective Transform"
 point_list  = []
 raw_width   = raw_image.shape[1]
@@ -238,6 +398,57 @@ params = {
 cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
 cv2.setMouseCallback(window_name, on_mouse_event, params)
 
+#####################################################################
+# function for frame
+#####################################################################
+
+trackbar_name = "frame"
+
+def show_frame(image):
+  global raw_image
+
+  raw_image = image
+  output_info('frame ' + str(frame_number))
+  params["raw_image"] = raw_image
+  params["point_list"].clear()
+  cv2.imshow(window_name, raw_image)
+
+  if not is_image and frame_total > 0:
+    cv2.setTrackbarPos(trackbar_name, window_name, frame_number)
+
+# seek to the frame (1-origin) and show it
+def jump_frame(target):
+  global frame_number
+
+  if target <= 0 or (frame_total > 0 and target > frame_total):
+    output_warn('invalid frame specified <' + str(target) + '>')
+    return
+
+  try:
+    seek_capture(cap, target, frame_index)
+  except CvtestError as e:
+    output_warn(str(e))
+    return
+
+  is_frame, image = cap.read()
+
+  if not is_frame:
+    output_warn('frame is not found <' + str(target) + '>')
+    return
+
+  frame_number = target
+  show_frame(image)
+
+def on_trackbar(position):
+  # also called back when the position is set on the frame shown
+  if position != frame_number:
+    jump_frame(position)
+
+if not is_image and frame_total > 0:
+  cv2.createTrackbar(trackbar_name, window_name, frame_number, frame_total,
+    on_trackbar)
+  cv2.setTrackbarMin(trackbar_name, window_name, 1)
+
 #####################################################################
 # main routine
 #####################################################################
@@ -262,15 +473,26 @@ while True:
     if is_image:
       output_warn("The input data is an image")
     else:
-      is_frame, raw_image = cap.read()
+      is_frame = skip_frames(cap, stride - 1)
+      if is_frame:
+        is_frame, image = cap.read()
       if not is_frame:
         output_warn('No frame is left')
       else:
-        params["raw_image"] = raw_image
-        params["point_list"].clear()
-        cv2.imshow(window_name, raw_image)
+        frame_number += stride
+        show_frame(image)
+  elif keycode == 0x6A:
+    # [j]
+    if is_image:
+      output_warn("The input data is an image")
+    else:
+      try:
+        jump_frame(int(input('frame to jump to: ')))
+      except (ValueError, EOFError):
+        output_warn('invalid frame specified')
   else:
-    output_info("[q] for quit of [Enter] for term input")
+    output_info("[q] for quit of [Enter] for term input " +
+      "([n] for the next frame, [j] to jump to a frame)")
 
 #####################################################################
 # post process
@@ -308,4 +530,7 @@ if is_print:
   print("src: {}".format(point_list))
   print("dst: {}".format(final_list))
 
-print(M)
+if out_file_list:
+  write_matrices([M])
+else:
+  print(M)
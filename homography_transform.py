@@ -7,6 +7,7 @@
 import os
 import sys
 import argparse
+import shutil
 
 #####################################################################
 # utility
@@ -33,6 +34,67 @@ parser.add_argument('-c', '--cols', type=int, required=True)
 parser.add_argument('-r', '--rows', type=int, required=True)
 parser.add_argument('-m', '--homography-matrix-files', type=str)
 parser.add_argument('--round-only', action='store_true')
+parser.add_argument('--recognize', action='store_true',
+  help='decode the frame number on each warped roi instead of writing images')
+parser.add_argument('-f', '--format', type=str, default='png',
+  choices=['png', 'jpeg', 'npy', 'video'],
+  help='png or jpeg: an image per frame and roi, npy: a stack of the frames ' +
+    'per roi, video: a lossless (FFV1) video per roi')
+parser.add_argument('--png-level', type=int, default=-1,
+  help='compression level of png from 0 (fast) to 9 (small) ' +
+    '(-1: default of opencv)')
+parser.add_argument('--jpeg-quality', type=int, default=95,
+  help='quality of jpeg from 0 to 100')
+parser.add_argument('--writer', type=str, default='ffmpeg',
+  choices=['ffmpeg', 'opencv'],
+  help='writer of the video format')
+parser.add_argument('--decoder', type=str, default='opencv',
+  choices=['opencv', 'ffmpeg'],
+  help='decoder of the video (ffmpeg: decoded on threads of an ffmpeg ' +
+    'subprocess)')
+parser.add_argument('-w', '--workers', type=int, default=0,
+  help='number of worker processes for warping and writing (0: no worker)')
+parser.add_argument('--warp', type=str, default='perspective',
+  choices=['perspective', 'remap'],
+  help='perspective: warpPerspective per frame, remap: precomputed lookup ' +
+    'tables (faster, but the pixels may differ by a few levels)')
+parser.add_argument('--remap-cache', type=str, default='',
+  help='directory to cache the lookup tables in')
+parser.add_argument('--gray', action='store_true',
+  help='convert the frames into gray before warping (e.g. for recognition)')
+parser.add_argument('--scale', type=float, default=1.0,
+  help='scale of the rois to the cols and the rows (up to 1)')
+parser.add_argument('--module-pixels', type=float, default=0,
+  help='scale the rois to the pixels per module of the qr codes instead ' +
+    '(0: not scaled by the qr codes)')
+parser.add_argument('--qr-size', type=int, default=300,
+  help='size of the qr codes in the rois before scaling by --module-pixels')
+parser.add_argument('--start-frame', type=int, default=1,
+  help='first frame to process (1-origin)')
+parser.add_argument('--end-frame', type=int, default=0,
+  help='last frame to process (0: until the end)')
+parser.add_argument('--chunk', type=str, default='',
+  help='process the i-th of n even parts of the video as <i>/<n>')
+parser.add_argument('--stride', type=int, default=1,
+  help='process every N-th frame (the others are skipped without decoding)')
+parser.add_argument('--seek-time', type=float, default=0.0,
+  help='start from the time in seconds instead of the start frame')
+parser.add_argument('--depth', type=int, default=0,
+  help='overlap reading, warping and writing on threads over a ring of ' +
+    'N preallocated frames (0: one frame at a time)')
+parser.add_argument('--track', type=int, default=0,
+  help='check the drift of the camera every N frames (0: fixed matrices)')
+parser.add_argument('--track-scale', type=float, default=0.25,
+  help='scale of the frames the drift is tracked on')
+parser.add_argument('--track-threshold', type=float, default=2.0,
+  help='drift in pixels over which the matrices are corrected')
+parser.add_argument('--track-dead-band', type=float, default=4.0,
+  help='drift in pixels up to which the camera is taken as not moved')
+parser.add_argument('--track-log', type=str, default='',
+  help='write the matrices in use as "frame,roi,m00,...,m22" to the file')
+parser.add_argument('--trace', type=str, default='',
+  help='write the time of the stages as Chrome trace events to the file ' +
+    '(also enabled by CVTEST_TRACE)')
 args = parser.parse_args()
 
 in_file       = args.in_file
@@ -42,6 +104,31 @@ out_width     = args.cols
 out_height    = args.rows
 matrix_files  = args.homography_matrix_files
 is_round_only = args.round_only
+is_recognize  = args.recognize
+out_format    = args.format
+png_level     = args.png_level
+jpeg_quality  = args.jpeg_quality
+writer        = args.writer
+decoder       = args.decoder
+worker_num    = args.workers
+warp_method   = args.warp
+remap_cache   = args.remap_cache
+is_gray       = args.gray
+roi_scale     = args.scale
+module_pixels = args.module_pixels
+qr_size       = args.qr_size
+start_frame   = args.start_frame
+end_frame     = args.end_frame
+chunk         = args.chunk
+stride        = args.stride
+seek_seconds  = args.seek_time
+ring_depth    = args.depth
+track_num     = args.track
+track_scale   = args.track_scale
+track_thresh  = args.track_threshold
+track_band    = args.track_dead_band
+track_log     = args.track_log
+trace_file    = args.trace
 
 if not os.access(in_file, os.F_OK) or not os.access(in_file, os.R_OK):
   output_error('invalid file specified <' + in_file + '>')
@@ -55,12 +142,100 @@ if out_height <= 0:
   output_error('invalid height specified <' + out_height + '>')
   sys.exit(1)
 
+if worker_num < 0:
+  output_error('invalid number of workers specified <' + str(worker_num) + '>')
+  sys.exit(1)
+
+if chunk != '' and (start_frame != 1 or end_frame != 0):
+  output_error('chunk cannot be specified with start or end frame')
+  sys.exit(1)
+
+if seek_seconds < 0:
+  output_error('invalid seek time specified <' + str(seek_seconds) + '>')
+  sys.exit(1)
+
+if seek_seconds > 0 and (chunk != '' or start_frame != 1):
+  output_error('seek time cannot be specified with chunk or start frame')
+  sys.exit(1)
+
+if stride <= 0:
+  output_error('invalid stride specified <' + str(stride) + '>')
+  sys.exit(1)
+
+if roi_scale <= 0 or roi_scale > 1:
+  output_error('invalid scale specified <' + str(roi_scale) + '>')
+  sys.exit(1)
+
+if module_pixels < 0:
+  output_error('invalid module pixels specified <' + str(module_pixels) + '>')
+  sys.exit(1)
+
+if module_pixels > 0 and roi_scale != 1:
+  output_error('scale cannot be specified with module pixels')
+  sys.exit(1)
+
+if qr_size <= 0:
+  output_error('invalid qr size specified <' + str(qr_size) + '>')
+  sys.exit(1)
+
+if png_level < -1 or png_level > 9:
+  output_error('invalid png level specified <' + str(png_level) + '>')
+  sys.exit(1)
+
+if jpeg_quality < 0 or jpeg_quality > 100:
+  output_error('invalid jpeg quality specified <' + str(jpeg_quality) + '>')
+  sys.exit(1)
+
+if not is_recognize and out_format == 'video' and writer == 'ffmpeg' and \
+   shutil.which('ffmpeg') is None:
+  output_error('ffmpeg command not found')
+  sys.exit(1)
+
+if decoder == 'ffmpeg' and shutil.which('ffmpeg') is None:
+  output_error('ffmpeg command not found')
+  sys.exit(1)
+
+if not is_recognize and out_format in ['npy', 'video'] and worker_num > 0:
+  output_error(out_format + ' cannot be written with workers')
+  sys.exit(1)
+
+if ring_depth < 0 or ring_depth == 1:
+  output_error('invalid depth specified <' + str(ring_depth) + '>')
+  sys.exit(1)
+
+if ring_depth > 0 and worker_num > 0:
+  output_error('depth cannot be specified with workers')
+  sys.exit(1)
+
+if track_num < 0:
+  output_error('invalid tracking interval specified <' + str(track_num) + '>')
+  sys.exit(1)
+
+if track_scale <= 0 or track_scale > 1:
+  output_error('invalid tracking scale specified <' + str(track_scale) + '>')
+  sys.exit(1)
+
+if track_thresh <= 0:
+  output_error('invalid tracking threshold specified <' + str(track_thresh) + '>')
+  sys.exit(1)
+
+if track_band < 0:
+  output_error('invalid tracking dead band specified <' + str(track_band) + '>')
+  sys.exit(1)
+
+if os.path.isfile(remap_cache):
+  output_error('<' + remap_cache + '> exists as file')
+  sys.exit(1)
+
 if out_name == "":
   out_name_prefix = os.path.basename(in_file) + '_transformed'
 else:
   out_name_prefix = os.path.splitext(os.path.basename(out_name))[0]
 
-if os.path.isfile(out_dir):
+if is_recognize:
+  # nothing is written in the recognition mode
+  pass
+elif os.path.isfile(out_dir):
   output_error('<' + out_dir + '> exists as file')
   sys.exit(1)
 elif not os.access(out_dir, os.W_OK):
@@ -87,67 +262,263 @@ except ImportError:
   output_error('numpy not found')
   sys.exit(1)
 
+try:
+  from cvtest import CvtestError, FrameWarper, NumberRecognizer, \
+    load_matrices, open_capture, trace
+  from cvtest.video import frame_range, seek_capture, skip_frames, \
+    time_to_frame, get_frame_size, get_frame_count
+  from cvtest.drift import DriftTracker, roi_polygons
+  from cvtest.index import load_index
+  from cvtest.parallel import map_frames
+  from cvtest.ring import FrameRing
+  from cvtest.warp import module_scale, scale_rois
+  from cvtest.output import RoiOutput
+  from cvtest.timeline import format_record
+except ImportError:
+  output_error('cvtest not found')
+  sys.exit(1)
+
 #####################################################################
-# prepare matrix
+# prepare
 #####################################################################
 
-matrix_file_list = matrix_files.split(",")
+try:
+  base_matrix_list = load_matrices(matrix_files)
 
-matrix_list = []
+  # the rois are warped directly into the smaller size
+  if module_pixels > 0:
+    roi_scale = module_scale(module_pixels, qr_size)
 
-for matrix_file in matrix_file_list:
-  if not os.access(matrix_file, os.F_OK) or not os.access(matrix_file, os.R_OK):
-    output_error('invalid file specified <' + matrix_file + '>')
-    sys.exit(1)
+  if roi_scale != 1:
+    base_matrix_list, out_size = scale_rois(base_matrix_list, out_size,
+      roi_scale)
+    output_info('rois are scaled to {}x{}'.format(*out_size))
 
-  try:
-    M = numpy.loadtxt(matrix_file)
-  except ValueError:
-    output_error('invalid contents are included <' + matrix_file + '>')
-    sys.exit(1)
+  warper = FrameWarper(base_matrix_list, out_size, warp_method, remap_cache,
+    is_gray)
+  cap = open_capture(in_file, decoder)
+
+  # the index of build_frame_index.py, if any, for the exact seek
+  frame_index = load_index(in_file, output_warn)
 
-  matrix_list.append(M)
+  # the frames keep their numbers in the whole video, so that the
+  # outputs of the chunks can be merged by merge_chunks.py
+  if seek_seconds > 0:
+    start_frame = time_to_frame(cap, seek_seconds, frame_index)
+
+  start_frame, end_frame = frame_range(cap, start_frame, end_frame, chunk)
+  seek_capture(cap, start_frame, frame_index)
+except CvtestError as e:
+  output_error(str(e))
+  sys.exit(1)
+
+last_frame = end_frame if end_frame > 0 else get_frame_count(cap)
+frame_total = (last_frame - start_frame) // stride + 1 if last_frame > 0 else 0
+tracer = trace.start_trace(trace_file, __file__, frame_total,
+  output_info=output_info)
+
+if is_recognize:
+  recognizer = NumberRecognizer()
+else:
+  frame_rate = cap.get(cv2.CAP_PROP_FPS)
+  roi_output = RoiOutput(out_dir, out_name_prefix, out_format, png_level,
+    jpeg_quality, frame_rate if frame_rate > 0 else 30, writer)
 
 #####################################################################
-# prepare capture
+# function for a frame
 #####################################################################
 
-cap = cv2.VideoCapture(in_file)
+def output_rois(transformed_list, frame_number):
+  line_list = []
 
-if not cap.isOpened():
-  output_error('cannot open video <' + in_file + '>')
-  sys.exit(1)
+  if not is_recognize:
+    with tracer.span('write'):
+      return roi_output.write(transformed_list, frame_number)
+
+  for roi_index, transformed_frame in enumerate(transformed_list):
+    roi_number = roi_index + 1
+
+    # emit "frame,roi,number" (empty number when not recognized)
+    with tracer.span('recognize'):
+      number = recognizer.recognize(transformed_frame)
+    line_list.append(format_record(frame_number, roi_number, number))
+
+  return line_list
+
+def process_frame(frame, frame_number, matrix_list=None):
+  # the matrices corrected on the drift come with the frame on the workers
+  if matrix_list is not None:
+    warper.set_matrices(matrix_list)
+
+  with tracer.span('warp'):
+    transformed_list = warper.warp_all(frame)
+
+  return output_rois(transformed_list, frame_number)
+
+def process_keyed_frame(frame, key):
+  return process_frame(frame, *key)
+
+# warp into the preallocated outputs of a ring slot
+def warp_keyed_frame(frame, dst_list, key):
+  warper.set_matrices(key[1])
+
+  with tracer.span('warp'):
+    frame = warper.prepare(frame)
+
+    for roi_index, dst in enumerate(dst_list):
+      warper.warp(frame, roi_index, dst)
+
+def output_lines(line_list):
+  for line in line_list:
+    print(line, flush=True)
+
+  tracer.add_frames()
+
+#####################################################################
+# function for drift tracking
+#####################################################################
+
+tracker = None
+tracked_num = 0
+matrix_list = base_matrix_list
+
+def log_matrices(frame_number):
+  if track_log == '':
+    return
+
+  with open(track_log, 'a') as f:
+    for roi_index, matrix in enumerate(matrix_list):
+      f.write('{},{},'.format(frame_number, roi_index + 1) +
+        ','.join(repr(float(v)) for v in matrix.ravel()) + '\n')
+
+# The first frame is the reference, and every track_num-th frame after it
+# is checked. True is returned when the matrices are changed.
+def track_drift(frame, frame_number):
+  global tracker, tracked_num, matrix_list
+
+  if track_num == 0:
+    return False
+
+  tracked_num += 1
+
+  if tracker is None:
+    try:
+      tracker = DriftTracker(frame, track_scale, track_thresh,
+        roi_polygons(base_matrix_list, out_size), track_band)
+    except CvtestError as e:
+      output_error(str(e))
+      sys.exit(1)
+
+    if track_log != '':
+      open(track_log, 'w').close()
+    log_matrices(frame_number)
+    return False
+
+  if (tracked_num - 1) % track_num != 0:
+    return False
+
+  try:
+    with tracer.span('track'):
+      result = tracker.update(frame)
+  except CvtestError as e:
+    output_warn(str(e) + ' at frame ' + str(frame_number))
+    return False
+
+  if result is None:
+    return False
+
+  matrix_list = tracker.correct(base_matrix_list)
+  output_info('matrices are corrected at frame {} (drift {:.1f} pixels)'
+    .format(frame_number, result[1]))
+  log_matrices(frame_number)
+
+  return True
 
 #####################################################################
 # main routine
 #####################################################################
 
-frame_number = 1
+frame_number = start_frame
+frame = None
+
+def is_end():
+  return end_frame > 0 and frame_number > end_frame
 
-while True:
-  is_frame, frame = cap.read()
+# an error of the decoder (e.g. ffmpeg failing) is not the end of the video
+try:
+  if worker_num == 0 and ring_depth == 0:
+    while not is_end():
+      # the frame read last time is decoded into again
+      with tracer.span('decode'):
+        is_frame, frame = cap.read(frame)
 
-  if is_frame:
-    for roi_number, matrix in enumerate(matrix_list, 1):
-      out_base = out_name_prefix       + '_' + \
-        "{0:06d}".format(frame_number) + '_' + \
-        "{0:02d}".format(roi_number)   + '.png'
-      out_file = out_dir + '/' + out_base
+      if is_frame:
+        if track_drift(frame, frame_number):
+          warper.set_matrices(matrix_list)
 
-      transformed_frame = cv2.warpPerspective(frame, matrix, out_size)
+        output_lines(process_frame(frame, frame_number))
 
-      cv2.imwrite(out_file, transformed_frame)
-      print(out_base, flush=True)
+        frame_number += stride
 
-    frame_number += 1
+        if is_round_only and (frame_number == 1):
+          break
 
-    if is_round_only and (frame_number == 1):
-      break
+        if is_end() or not skip_frames(cap, stride - 1):
+          break
+      else:
+        break
   else:
-    break
+    def read_frame(dst):
+      global frame_number
+
+      if is_end():
+        return None
+
+      if frame_number > start_frame and not skip_frames(cap, stride - 1):
+        return None
+
+      with tracer.span('decode'):
+        is_frame, frame = cap.read(dst)
+
+      if not is_frame:
+        return None
+
+      track_drift(frame, frame_number)
+
+      frame_number += stride
+      return frame, (frame_number - stride, matrix_list)
+
+    if worker_num > 0:
+      # the frames are decoded here and warped (and written) on the workers
+      for line_list in map_frames(process_keyed_frame, read_frame, worker_num):
+        output_lines(line_list)
+    else:
+      frame_width, frame_height = get_frame_size(cap)
+      ring = FrameRing(ring_depth, (frame_height, frame_width, 3),
+        warper.out_shape(), len(warper))
+
+      for transformed_list, key in ring.run(read_frame, warp_keyed_frame):
+        output_lines(output_rois(transformed_list, key[0]))
+except CvtestError as e:
+  output_error(str(e))
+  sys.exit(1)
 
 #####################################################################
 # cleanup
 #####################################################################
 
 cap.release()
+
+# the stacks and the videos of the rois
+if not is_recognize:
+  try:
+    with tracer.span('close'):
+      line_list = roi_output.close()
+  except CvtestError as e:
+    output_error(str(e))
+    sys.exit(1)
+
+  for line in line_list:
+    print(line, flush=True)
+
+tracer.close()
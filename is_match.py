@@ -7,8 +7,6 @@
 import os
 import sys
 import argparse
-import cv2
-import numpy
 
 #####################################################################
 # parameter
@@ -20,6 +18,21 @@ parser.add_argument('target',     type=str)
 parser.add_argument('-x', '--cord_x', type=int, default='-1')
 parser.add_argument('-y', '--cord_y', type=int, default='-1')
 parser.add_argument('-d', '--delta', type=int, default='5')
+parser.add_argument('-b', '--batch', action='store_true',
+                    help='target is a file listing target images (- for stdin)')
+parser.add_argument('-v', '--video', action='store_true',
+                    help='target is a video whose frames are matched')
+parser.add_argument('-j', '--jobs', type=int, default=1,
+                    help='number of processes in the batch or video mode')
+parser.add_argument('-p', '--pyramid', type=int, default=0,
+                    help='match the target reduced by half N times first ' +
+                    'and refine the peaks at the full resolution ' +
+                    '(0: match at the full resolution)')
+parser.add_argument('--peaks', type=int, default=5,
+                    help='number of the peaks refined in the pyramid mode')
+parser.add_argument('--trace', type=str, default='',
+                    help='write the time of the stages as Chrome trace ' +
+                    'events to the file (also enabled by CVTEST_TRACE)')
 args = parser.parse_args()
 
 template_file = args.template
@@ -27,64 +40,185 @@ target_file = args.target
 cord_x = args.cord_x
 cord_y = args.cord_y
 delta = args.delta
+is_batch = args.batch
+is_video = args.video
+job_num = args.jobs
+pyramid_levels = args.pyramid
+peak_num = args.peaks
+trace_file = args.trace
 
 def print_error(msg):
     file_name = os.path.basename(__file__) 
     print('ERROR:' + file_name + ':' + msg, file=sys.stderr)
 
-if not os.access(template_file, os.F_OK):
-    print_error('invalid template specified')
+def print_info(msg):
+    file_name = os.path.basename(__file__)
+    print('INFO:' + file_name + ':' + msg, file=sys.stderr)
+
+if is_batch and is_video:
+    print_error('batch and video cannot be specified together')
     sys.exit(1)
 
-if not os.access(target_file, os.F_OK):
+is_multi = is_batch or is_video
+
+# several templates can be given as a comma separated list in the
+# batch and video mode
+if is_multi:
+    template_file_list = template_file.split(',')
+else:
+    template_file_list = [template_file]
+
+for template_file in template_file_list:
+    if not os.access(template_file, os.F_OK):
+        print_error('invalid template specified')
+        sys.exit(1)
+
+if is_batch and target_file == '-':
+    pass
+elif not os.access(target_file, os.F_OK):
     print_error('invalid target specified')
     sys.exit(1)
 
-my_int_min = -2147483648
-my_int_max = 2147483647
+if job_num <= 0:
+    print_error('invalid number of jobs specified')
+    sys.exit(1)
 
-if cord_x == -1:
-    x_lower = my_int_min
-    x_upper = my_int_max
-else:
-    x_lower = cord_x - delta
-    x_upper = cord_x + delta
+if pyramid_levels < 0:
+    print_error('invalid pyramid levels specified')
+    sys.exit(1)
 
-if cord_y == -1:
-    y_lower = my_int_min
-    y_upper = my_int_max
-else:
-    y_lower = cord_y - delta
-    y_upper = cord_y + delta
+if peak_num <= 0:
+    print_error('invalid number of peaks specified')
+    sys.exit(1)
+
+if pyramid_levels > 0 and is_multi:
+    print_error('pyramid cannot be specified in the batch or video mode')
+    sys.exit(1)
 
 #####################################################################
-# main routine
+# external library
 #####################################################################
 
-threshold = 0.95
+try:
+    import cv2
+except ImportError:
+    print_error('opencv not found')
+    sys.exit(1)
+
+try:
+    from cvtest import CvtestError, TemplateMatcher, match_in_full, \
+        match_in_pyramid, search_range, load_gray, trace
+    from cvtest.match import format_locations
+    from cvtest.parallel import map_ordered
+except ImportError:
+    print_error('cvtest not found')
+    sys.exit(1)
+
+x_range = search_range(cord_x, delta)
+y_range = search_range(cord_y, delta)
 
-template_img = cv2.imread(template_file) 
-target_img = cv2.imread(target_file)
+#####################################################################
+# batch routine
+#####################################################################
 
-template_img_gray = cv2.cvtColor(template_img, cv2.COLOR_BGR2GRAY)
-target_img_gray = cv2.cvtColor(target_img, cv2.COLOR_BGR2GRAY)
+def match_target(name, target_img_gray):
+    with tracer.span('match'):
+        loc_list = matcher.match(target_img_gray)
+    return format_locations(name, loc_list)
 
-raw_result = cv2.matchTemplate(target_img_gray, template_img_gray, cv2.TM_CCOEFF_NORMED)
+def match_file(target_file):
+    try:
+        with tracer.span('match'):
+            loc_list = matcher.match_file(target_file)
+        return format_locations(target_file, loc_list)
+    except CvtestError as e:
+        print_error(str(e))
+        return format_locations(target_file, [None] * len(matcher.template_list))
 
-candidate_result = numpy.where(raw_result >= threshold)
-candidate_num = len(candidate_result[0])
+def read_target_list():
+    if target_file == '-':
+        list_file = sys.stdin
+    else:
+        list_file = open(target_file)
 
-if candidate_num <= 0:
-    sys.exit(1)
+    with list_file:
+        for line in list_file:
+            line = line.strip()
+            if line != '':
+                yield (line,)
+
+def read_video_frames():
+    cap = cv2.VideoCapture(target_file)
 
-_, max_val, _, max_loc = cv2.minMaxLoc(raw_result)
-max_loc_x = max_loc[0]
-max_loc_y = max_loc[1]
+    if not cap.isOpened():
+        print_error('cannot open video <' + target_file + '>')
+        sys.exit(1)
 
-if x_lower <= max_loc_x and max_loc_x <= x_upper and \
-   y_lower <= max_loc_y and max_loc_y <= y_upper:
-    print("{} {}".format(max_loc_x, max_loc_y))
+    frame_number = 1
+
+    while True:
+        with tracer.span('decode'):
+            is_frame, frame = cap.read()
+
+        if not is_frame:
+            break
+
+        with tracer.span('gray'):
+            frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        yield "{0:06d}".format(frame_number), frame_gray
+
+        frame_number += 1
+
+    cap.release()
+
+tracer = trace.start_trace(trace_file, __file__, output_info=print_info)
+
+if is_multi:
+    try:
+        matcher = TemplateMatcher(template_file_list, x_range, y_range)
+    except CvtestError as e:
+        print_error(str(e))
+        sys.exit(1)
+
+    # the results are streamed in the order of the targets
+    if is_video:
+        result_iter = map_ordered(match_target, read_video_frames(), job_num)
+    else:
+        result_iter = map_ordered(match_file, read_target_list(), job_num)
+
+    for result in result_iter:
+        print(result, flush=True)
+        tracer.add_frames()
+
+    tracer.close()
     sys.exit(0)
-else:
+
+#####################################################################
+# main routine
+#####################################################################
+
+try:
+    with tracer.span('read'):
+        template_img_gray = load_gray(template_file)
+        target_img_gray = load_gray(target_file)
+except CvtestError as e:
+    print_error(str(e))
+    sys.exit(1)
+
+with tracer.span('match'):
+    if pyramid_levels > 0:
+        max_loc = match_in_pyramid(target_img_gray, template_img_gray,
+                                   x_range, y_range, levels=pyramid_levels,
+                                   peak_num=peak_num)
+    else:
+        max_loc = match_in_full(target_img_gray, template_img_gray, x_range,
+                                y_range)
+
+tracer.add_frames()
+tracer.close()
+
+if max_loc is None:
     sys.exit(1)
 
+print("{} {}".format(max_loc[0], max_loc[1]))
+sys.exit(0)
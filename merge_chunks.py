@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+
+######################################################################
+# default library
+######################################################################
+
+import os
+import sys
+import argparse
+import re
+import shutil
+import subprocess
+import tempfile
+
+#####################################################################
+# utility
+#####################################################################
+
+def output_error(msg):
+  print('ERROR:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+def output_warn(msg):
+  print('WARN:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+def output_info(msg):
+  print('INFO:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+#####################################################################
+# parameter
+#####################################################################
+
+# The chunks are the outputs of homography_transform.py or
+# write_framenumber.py run with --chunk (or --start-frame/--end-frame)
+# on several machines:
+#  lines:  image names or "frame,roi,number" records, which are sorted
+#          by the frame and the roi (a line seen in two chunks is kept once)
+#  videos: the videos of write_framenumber.py -e, which are joined in the
+#          given order without encoding again
+
+VIDEO_EXTENSIONS = ['.mp4', '.mov', '.mkv', '.avi']
+
+# "<prefix>_<frame>[_<roi>].<ext>"
+NAME_PATTERN = re.compile(r'_([0-9]+)(?:_([0-9]+))?\.[^.]+$')
+
+parser = argparse.ArgumentParser(
+  description='merge the outputs of the chunks into one ordered output')
+parser.add_argument('chunk_files', type=str, nargs='+')
+parser.add_argument('-o', '--out-file', type=str, default='',
+  help='output file (default: stdout, required for videos)')
+parser.add_argument('-s', '--stride', type=int, default=0,
+  help='stride of the frames in the chunks, by which the missing frames ' +
+    'are found (0: the smallest step of the frames in a chunk)')
+
+args = parser.parse_args()
+chunk_files = args.chunk_files
+out_file    = args.out_file
+stride      = args.stride
+
+if stride < 0:
+  output_error('invalid stride specified <' + str(stride) + '>')
+  sys.exit(1)
+
+for chunk_file in chunk_files:
+  if not os.access(chunk_file, os.R_OK):
+    output_error('invalid file specified <' + chunk_file + '>')
+    sys.exit(1)
+
+is_video = [os.path.splitext(chunk_file)[1].lower() in VIDEO_EXTENSIONS
+  for chunk_file in chunk_files]
+
+if any(is_video) and not all(is_video):
+  output_error('videos and lines cannot be merged together')
+  sys.exit(1)
+
+is_video = all(is_video)
+
+if is_video and out_file == '':
+  output_error('output file is required for videos')
+  sys.exit(1)
+
+if is_video and shutil.which('ffmpeg') is None:
+  output_error('ffmpeg command not found')
+  sys.exit(1)
+
+#####################################################################
+# function for lines
+#####################################################################
+
+# (frame, roi) of a line, or None
+def line_key(line):
+  fields = line.split(',')
+
+  if len(fields) == 3 and fields[0].isdigit() and fields[1].isdigit():
+    return int(fields[0]), int(fields[1])
+
+  match = NAME_PATTERN.search(line)
+
+  if match is None:
+    return None
+
+  return int(match.group(1)), int(match.group(2) or 0)
+
+# The stride of homography_transform.py --stride is the smallest step of
+# the frames in a chunk (each chunk starts at its own first frame, so the
+# step between two chunks can be smaller).
+def infer_stride(frames_list):
+  step_list = [frame - prev_frame
+    for frames in frames_list
+    for prev_frame, frame in zip(frames, frames[1:])]
+
+  return min(step_list) if step_list else 1
+
+def merge_lines():
+  line_dict = {}
+  frames_list = []
+
+  for chunk_file in chunk_files:
+    frame_set = set()
+
+    with open(chunk_file) as f:
+      for line in f:
+        line = line.strip()
+
+        if line == '':
+          continue
+
+        key = line_key(line)
+
+        if key is None:
+          output_warn('invalid line skipped <' + line + '>')
+          continue
+
+        frame_set.add(key[0])
+
+        if key in line_dict:
+          if line_dict[key] != line:
+            output_warn('different line for the same frame skipped <' +
+              line + '>')
+          continue
+
+        line_dict[key] = line
+
+    frames_list.append(sorted(frame_set))
+
+  if not line_dict:
+    output_error('no line found')
+    sys.exit(1)
+
+  key_list = sorted(line_dict)
+
+  # frames left out between the chunks
+  frame_step = stride if stride > 0 else infer_stride(frames_list)
+  frame_list = sorted(set(key[0] for key in key_list))
+  for prev_frame, frame in zip(frame_list, frame_list[1:]):
+    if frame - prev_frame > frame_step:
+      output_warn('frames are missing <{}-{}>'.format(prev_frame + 1,
+        frame - 1))
+
+  out = open(out_file, 'w') if out_file != '' else sys.stdout
+
+  for key in key_list:
+    print(line_dict[key], file=out)
+
+  if out is not sys.stdout:
+    out.close()
+
+#####################################################################
+# function for videos
+#####################################################################
+
+def merge_videos():
+  with tempfile.NamedTemporaryFile('w', suffix='.txt') as list_file:
+    for chunk_file in chunk_files:
+      path = os.path.abspath(chunk_file).replace("'", "'\\''")
+      print("file '" + path + "'", file=list_file)
+
+    list_file.flush()
+
+    command = [
+      'ffmpeg', '-y', '-loglevel', 'error',
+      '-f', 'concat', '-safe', '0',
+      '-i', list_file.name,
+      '-c', 'copy',
+      out_file
+    ]
+
+    if subprocess.run(command).returncode != 0:
+      output_error('some error on ffmpeg')
+      sys.exit(1)
+
+  print(out_file, flush=True)
+
+#####################################################################
+# main routine
+#####################################################################
+
+if is_video:
+  merge_videos()
+else:
+  merge_lines()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+######################################################################
+# default library
+######################################################################
+
+import os
+import sys
+import argparse
+
+#####################################################################
+# utility
+#####################################################################
+
+def output_error(msg):
+  print('ERROR:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+def output_warn(msg):
+  print('WARN:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+def output_info(msg):
+  print('INFO:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+#####################################################################
+# parameter
+#####################################################################
+
+# The client does not import OpenCV: the work is done by the warm
+# workers of recognition_server.py, and only the result is printed
+# here. The arguments after the subcommand are those of the script, so
+#
+#   recognize_likely_number.py <args>  ->  recognition_client.py recognize <args>
+#   is_match.py <args>                 ->  recognition_client.py match <args>
+#
+# gives the same stdout and exit code, except that:
+#  -j/--jobs: accepted and not used, as a job runs on one worker (the
+#             workers are given by recognition_server.py -j)
+#  --trace:   not written on the server, which is told by a warning
+# and "-" as the file pattern of recognize (without --records) or as the
+# target of match (without -b) reads an image from stdin.
+
+parser = argparse.ArgumentParser(
+  description='run a job on recognition_server.py')
+parser.add_argument('-s', '--socket', type=str, default='',
+  help='unix domain socket (default: $CVTEST_SOCKET or /tmp/cvtest-<uid>.sock)')
+subparsers = parser.add_subparsers(dest='op', required=True)
+
+# same as recognize_likely_number.py
+recognize_parser = subparsers.add_parser('recognize',
+  help='same as recognize_likely_number.py')
+recognize_parser.add_argument('file_pattern', type=str)
+recognize_parser.add_argument('-b', '--boxes', type=str, default='',
+  help='expected qr code boxes as <x>,<y>,<width>,<height>[,...]')
+recognize_parser.add_argument('-l', '--learn-boxes', action='store_true',
+  help='learn the boxes from the successful detections on full images')
+recognize_parser.add_argument('--box-margin', type=int, default=20,
+  help='margin added around each box on cropping')
+recognize_parser.add_argument('-t', '--timeline', type=str, default='',
+  help='write the numbers of all frames and rois to the file (.csv or .npy)')
+recognize_parser.add_argument('--records', action='store_true',
+  help='read "frame,roi,number" records (- for stdin) instead of images')
+recognize_parser.add_argument('-j', '--jobs', type=int, default=1,
+  help='number of processes decoding the images (the boxes are learned ' +
+    'on each of them)')
+recognize_parser.add_argument('--prefilter', type=float, default=0,
+  help='search the image downscaled by the scale (e.g. 0.5) and binarized ' +
+    'first, and the image as it is only when missed (0: no prefilter)')
+recognize_parser.add_argument('--trace', type=str, default='',
+  help='write the time of the stages as Chrome trace events to the file ' +
+    '(also enabled by CVTEST_TRACE)')
+
+# same as is_match.py
+match_parser = subparsers.add_parser('match', help='same as is_match.py')
+match_parser.add_argument('template',   type=str)
+match_parser.add_argument('target',     type=str)
+match_parser.add_argument('-x', '--cord_x', type=int, default='-1')
+match_parser.add_argument('-y', '--cord_y', type=int, default='-1')
+match_parser.add_argument('-d', '--delta', type=int, default='5')
+match_parser.add_argument('-b', '--batch', action='store_true',
+                    help='target is a file listing target images (- for stdin)')
+match_parser.add_argument('-v', '--video', action='store_true',
+                    help='target is a video whose frames are matched')
+match_parser.add_argument('-j', '--jobs', type=int, default=1,
+                    help='number of processes in the batch or video mode')
+match_parser.add_argument('-p', '--pyramid', type=int, default=0,
+                    help='match the target reduced by half N times first ' +
+                    'and refine the peaks at the full resolution ' +
+                    '(0: match at the full resolution)')
+match_parser.add_argument('--peaks', type=int, default=5,
+                    help='number of the peaks refined in the pyramid mode')
+match_parser.add_argument('--trace', type=str, default='',
+                    help='write the time of the stages as Chrome trace ' +
+                    'events to the file (also enabled by CVTEST_TRACE)')
+
+args = parser.parse_args()
+socket_path = args.socket
+
+if args.jobs <= 0:
+  output_error('invalid number of jobs specified <' + str(args.jobs) + '>')
+  sys.exit(1)
+
+if args.trace != '':
+  output_warn('trace is not written on the server <' + args.trace + '>')
+
+#####################################################################
+# external library
+#####################################################################
+
+try:
+  from cvtest.error import CvtestError
+  from cvtest.protocol import get_socket_path, encode_bytes, request_job
+except ImportError:
+  output_error('cvtest not found')
+  sys.exit(1)
+
+if socket_path == '':
+  socket_path = get_socket_path()
+
+#####################################################################
+# main routine
+#####################################################################
+
+# the paths are resolved by the server on the cwd given here
+if args.op == 'recognize':
+  job = {
+    'op':         'recognize',
+    'cwd':        os.getcwd(),
+    'pattern':    args.file_pattern,
+    'boxes':      args.boxes,
+    'learn':      args.learn_boxes,
+    'box_margin': args.box_margin,
+    'timeline':   args.timeline,
+    'records':    args.records,
+    'prefilter':  args.prefilter,
+  }
+
+  if args.file_pattern == '-':
+    if args.records:
+      job['record_lines'] = sys.stdin.readlines()
+    else:
+      job['pattern'] = ''
+      job['images'] = [encode_bytes(sys.stdin.buffer.read())]
+else:
+  job = {
+    'op':       'match',
+    'cwd':      os.getcwd(),
+    'template': args.template,
+    'target':   args.target,
+    'cord_x':   args.cord_x,
+    'cord_y':   args.cord_y,
+    'delta':    args.delta,
+    'batch':    args.batch,
+    'video':    args.video,
+    'pyramid':  args.pyramid,
+    'peaks':    args.peaks,
+  }
+
+  if args.target == '-':
+    if args.batch:
+      job['target_lines'] = sys.stdin.readlines()
+    elif not args.video:
+      job['target_image'] = encode_bytes(sys.stdin.buffer.read())
+
+try:
+  result = request_job(socket_path, job)
+except CvtestError as e:
+  output_error(str(e))
+  sys.exit(1)
+
+for warning in result.get('warnings', []):
+  output_warn(warning)
+
+for error in result['errors']:
+  output_error(error)
+
+sys.stdout.write(result['stdout'])
+sys.exit(result['exit_code'])
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+######################################################################
+# default library
+######################################################################
+
+import os
+import sys
+import argparse
+import signal
+
+#####################################################################
+# utility
+#####################################################################
+
+def output_error(msg):
+  print('ERROR:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+def output_warn(msg):
+  print('WARN:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+def output_info(msg):
+  print('INFO:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+#####################################################################
+# parameter
+#####################################################################
+
+parser = argparse.ArgumentParser(
+  description='serve recognize_likely_number.py and is_match.py jobs')
+parser.add_argument('-s', '--socket', type=str, default='',
+  help='unix domain socket (default: $CVTEST_SOCKET or /tmp/cvtest-<uid>.sock)')
+parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+  help='number of worker processes')
+
+args = parser.parse_args()
+socket_path = args.socket
+job_num     = args.jobs
+
+if job_num <= 0:
+  output_error('invalid number of jobs specified <' + str(job_num) + '>')
+  sys.exit(1)
+
+#####################################################################
+# external library
+#####################################################################
+
+try:
+  import cv2
+except ImportError:
+  output_error('opencv not found')
+  sys.exit(1)
+
+try:
+  from cvtest import CvtestError
+  from cvtest.protocol import get_socket_path
+  from cvtest.server import JobServer
+except ImportError:
+  output_error('cvtest not found')
+  sys.exit(1)
+
+if socket_path == '':
+  socket_path = get_socket_path()
+
+#####################################################################
+# main routine
+#####################################################################
+
+try:
+  server = JobServer(socket_path, job_num)
+except CvtestError as e:
+  output_error(str(e))
+  sys.exit(1)
+
+# stop on SIGTERM as well as on [Ctrl-C]
+def on_terminate(signum, frame):
+  raise KeyboardInterrupt
+
+signal.signal(signal.SIGTERM, on_terminate)
+
+output_info('listening on <' + socket_path + '> with ' + str(job_num) + ' workers')
+
+try:
+  server.serve_forever()
+except KeyboardInterrupt:
+  pass
+finally:
+  server.server_close()
+  output_info('stopped')
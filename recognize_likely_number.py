@@ -7,8 +7,8 @@
 import os
 import sys
 import argparse
+import functools
 import glob
-import re
 
 #####################################################################
 # utility
@@ -29,17 +29,66 @@ def output_info(msg):
 
 parser = argparse.ArgumentParser()
 parser.add_argument('file_pattern', type=str)
+parser.add_argument('-b', '--boxes', type=str, default='',
+  help='expected qr code boxes as <x>,<y>,<width>,<height>[,...]')
+parser.add_argument('-l', '--learn-boxes', action='store_true',
+  help='learn the boxes from the successful detections on full images')
+parser.add_argument('--box-margin', type=int, default=20,
+  help='margin added around each box on cropping')
+parser.add_argument('-t', '--timeline', type=str, default='',
+  help='write the numbers of all frames and rois to the file (.csv or .npy)')
+parser.add_argument('--records', action='store_true',
+  help='read "frame,roi,number" records (- for stdin) instead of images')
+parser.add_argument('-j', '--jobs', type=int, default=1,
+  help='number of processes decoding the images (the boxes are learned ' +
+    'on each of them)')
+parser.add_argument('--prefilter', type=float, default=0,
+  help='search the image downscaled by the scale (e.g. 0.5) and binarized ' +
+    'first, and the image as it is only when missed (0: no prefilter)')
+parser.add_argument('--trace', type=str, default='',
+  help='write the time of the stages as Chrome trace events to the file ' +
+    '(also enabled by CVTEST_TRACE)')
 
 args = parser.parse_args()
-file_pattern = args.file_pattern
+file_pattern  = args.file_pattern
+boxes         = args.boxes
+is_learn      = args.learn_boxes
+box_margin    = args.box_margin
+timeline_file = args.timeline
+is_records    = args.records
+job_num       = args.jobs
+prefilter     = args.prefilter
+trace_file    = args.trace
+is_timeline   = timeline_file != ''
 
-glob_list = glob.glob(file_pattern)
-file_list = list(filter(lambda x: os.access(x, os.F_OK), glob_list))
+if box_margin < 0:
+  output_error('invalid box margin specified <' + str(box_margin) + '>')
+  sys.exit(1)
+
+if job_num <= 0:
+  output_error('invalid number of jobs specified <' + str(job_num) + '>')
+  sys.exit(1)
 
-if not file_list:
-  output_error('no file found <' + file_pattern + '>')
+if prefilter < 0 or prefilter > 1:
+  output_error('invalid prefilter scale specified <' + str(prefilter) + '>')
   sys.exit(1)
 
+if is_records and not is_timeline:
+  output_error('records can be read only with the timeline')
+  sys.exit(1)
+
+if is_records:
+  if file_pattern != '-' and not os.access(file_pattern, os.R_OK):
+    output_error('invalid file specified <' + file_pattern + '>')
+    sys.exit(1)
+else:
+  glob_list = glob.glob(file_pattern)
+  file_list = list(filter(lambda x: os.access(x, os.F_OK), glob_list))
+
+  if not file_list:
+    output_error('no file found <' + file_pattern + '>')
+    sys.exit(1)
+
 #####################################################################
 # external library
 #####################################################################
@@ -50,44 +99,182 @@ except ImportError:
   output_error('opencv not found')
   sys.exit(1)
 
+try:
+  import numpy
+except ImportError:
+  output_error('numpy not found')
+  sys.exit(1)
+
+try:
+  from cvtest import CvtestError, NumberRecognizer, parse_boxes, \
+    most_likely_number, trace
+  from cvtest.timeline import parse_roi_name, parse_record, make_timeline, \
+    write_timeline, timeline_statistics, format_statistics
+  from cvtest.output import open_stack, parse_stack_name
+  from cvtest.parallel import map_ordered
+except ImportError:
+  output_error('cvtest not found')
+  sys.exit(1)
+
 #####################################################################
 # prepare
 #####################################################################
 
-detector = cv2.QRCodeDetectorAruco()
+try:
+  recognizer = NumberRecognizer(parse_boxes(boxes), is_learn, box_margin,
+    prefilter_scale=prefilter)
+except CvtestError as e:
+  output_error(str(e))
+  sys.exit(1)
+
+box_num = len(recognizer.box_list)
+
+# the images are counted as the frames (the frames of the stacks are
+# not known beforehand)
+if is_records or any(file.endswith('.npy') for file in file_list):
+  image_total = 0
+else:
+  image_total = len(file_list)
+
+tracer = trace.start_trace(trace_file, __file__, image_total,
+  output_info=output_info)
+
+#####################################################################
+# function for timeline
+#####################################################################
+
+def read_records():
+  if file_pattern == '-':
+    record_file = sys.stdin
+  else:
+    record_file = open(file_pattern)
 
-pattern = re.compile(r'^[0-9]{6}$')
+  record_list = []
+
+  with record_file:
+    for line in record_file:
+      record = parse_record(line)
+
+      if record is None:
+        output_warn('invalid record skipped <' + line.strip() + '>')
+        continue
+
+      record_list.append(record)
+
+  return record_list
+
+def print_statistics(timeline, roi_values):
+  for line in format_statistics(timeline_statistics(timeline, roi_values)):
+    print(line)
+
+#####################################################################
+# function for recognition
+#####################################################################
+
+# frames of a stack in a task
+STACK_CHUNK = 256
+
+# the stacks are opened once on each worker
+load_stack = functools.lru_cache(maxsize=4)(open_stack)
+
+# Tasks of (file, start, stop): an image, or the frames [start, stop) of
+# a stack of homography_transform.py -f npy, whose frames are mapped from
+# the file and not read at once.
+def make_tasks():
+  for file in file_list:
+    if not file.endswith('.npy'):
+      yield file, 0, 0
+      continue
+
+    frames, _ = load_stack(file)
+
+    for start in range(0, len(frames), STACK_CHUNK):
+      yield file, start, min(start + STACK_CHUNK, len(frames))
+
+# The file and [((frame, roi) or None, number or None), ...] for the
+# images of a task (on a worker with the jobs, which has its own copy of
+# the detector).
+def recognize_task(file, start, stop):
+  if not file.endswith('.npy'):
+    with tracer.span('recognize'):
+      number = recognizer.recognize_file(file)
+    return file, [(parse_roi_name(file), number)]
+
+  frames, frame_list = load_stack(file)
+  roi = parse_stack_name(file)
+  result_list = []
+
+  for frame_number, image in zip(frame_list[start:stop], frames[start:stop]):
+    roi_name = None if roi is None else (frame_number, roi)
+
+    with tracer.span('recognize'):
+      number = recognizer.recognize(numpy.asarray(image))
+    result_list.append((roi_name, number))
+
+  return file, result_list
 
 #####################################################################
 # recognized frame numbers
 #####################################################################
 
 number_list = []
+record_list = []
+
+if is_records:
+  record_list = read_records()
+else:
+  try:
+    # the results come in the order of the files
+    for file, result_list in map_ordered(recognize_task, make_tasks(),
+        job_num):
+      for roi_name, number in result_list:
+        tracer.add_frames()
+
+        if is_timeline:
+          if roi_name is None:
+            output_warn('frame and roi are unknown <' + file + '>')
+            break
 
-for file in file_list:
-  image = cv2.imread(file)
+          record_list.append(roi_name +
+            (-1 if number is None else int(number),))
+          continue
 
-  if image is None:
-    output_error('cannot open file as image <' + file + '>')
+        if number is None:
+          continue
+
+        number_list.append(number)
+  except CvtestError as e:
+    output_error(str(e))
     sys.exit(1)
 
-  _, info_list, _, _ = detector.detectAndDecodeMulti(image)
+for box in recognizer.box_list[box_num:]:
+  output_info('box is learned <{},{},{},{}>'.format(*box))
+
+#####################################################################
+# make the timeline
+#####################################################################
 
-  # It is assumed that there is only one QR code
-  if len(info_list) != 1:
-    continue
+if is_timeline:
+  if not record_list:
+    output_error('no record found <' + file_pattern + '>')
+    sys.exit(1)
 
-  if pattern.match(info_list[0]) is None:
-    continue
+  with tracer.span('timeline'):
+    timeline, roi_values = make_timeline(record_list)
+    write_timeline(timeline_file, timeline, roi_values)
 
-  number_list.append(info_list[0])
+  print_statistics(timeline, roi_values)
+  tracer.close()
+  sys.exit(0)
 
 #####################################################################
 # determine the representative frame number
 #####################################################################
 
+tracer.close()
+
 if not number_list:
   output_error('recognize failed <' + file_pattern + '>')
   sys.exit(1)
 
-print(sorted(number_list, reverse=True)[0])
+print(most_likely_number(number_list))
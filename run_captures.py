@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+
+######################################################################
+# default library
+######################################################################
+
+import os
+import sys
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import shlex
+import time
+
+#####################################################################
+# utility
+#####################################################################
+
+def output_error(msg):
+  print('ERROR:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+def output_warn(msg):
+  print('WARN:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+def output_info(msg):
+  print('INFO:' + os.path.basename(__file__) + ': ' + msg, file=sys.stderr)
+
+#####################################################################
+# parameter
+#####################################################################
+
+# The manifest is a JSON list of captures (paths are relative to the
+# manifest):
+#   [
+#     {"capture": "a.mp4", "matrices": "a_01.txt,a_02.txt",
+#      "cols": 480, "rows": 520},
+#     {"capture": "b.mp4", "matrices": "b_01.txt", "cols": 480, "rows": 520,
+#      "workers": 2, "options": "--gray --module-pixels 3", "name": "b"}
+#   ]
+# Each capture is run through homography_transform.py --recognize and
+# recognize_likely_number.py --records, and gets in the output directory:
+#   <name>.records.csv   "frame,roi,number" records
+#   <name>.timeline.csv  timeline of the numbers
+#   <name>.txt           statistics (the results of the capture)
+
+parser = argparse.ArgumentParser(
+  description='recognize the frame numbers of many captures concurrently')
+parser.add_argument('manifest', type=str)
+parser.add_argument('-d', '--out-dir', type=str, default='.')
+parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+  help='number of captures run at the same time')
+parser.add_argument('-s', '--slots', type=int, default=os.cpu_count(),
+  help='number of cpus shared by the captures (a capture takes its workers)')
+parser.add_argument('-w', '--workers', type=int, default=0,
+  help='default workers of homography_transform.py for a capture')
+parser.add_argument('--options', type=str, default='',
+  help='default options of homography_transform.py for a capture')
+parser.add_argument('-i', '--interval', type=float, default=5.0,
+  help='seconds between the progress lines')
+parser.add_argument('--patience', type=float, default=60.0,
+  help='seconds a capture waiting for its slots lets the later ones go ' +
+    'ahead (0: in order)')
+
+args = parser.parse_args()
+manifest_file = args.manifest
+out_dir       = args.out_dir
+job_num       = args.jobs
+slot_num      = args.slots
+worker_num    = args.workers
+options       = args.options
+interval      = args.interval
+patience      = args.patience
+
+if not os.access(manifest_file, os.R_OK):
+  output_error('invalid file specified <' + manifest_file + '>')
+  sys.exit(1)
+
+if job_num <= 0:
+  output_error('invalid number of jobs specified <' + str(job_num) + '>')
+  sys.exit(1)
+
+if slot_num <= 0:
+  output_error('invalid number of slots specified <' + str(slot_num) + '>')
+  sys.exit(1)
+
+if worker_num < 0:
+  output_error('invalid number of workers specified <' + str(worker_num) + '>')
+  sys.exit(1)
+
+if interval <= 0:
+  output_error('invalid interval specified <' + str(interval) + '>')
+  sys.exit(1)
+
+if patience < 0:
+  output_error('invalid patience specified <' + str(patience) + '>')
+  sys.exit(1)
+
+if os.path.isfile(out_dir):
+  output_error('<' + out_dir + '> exists as file')
+  sys.exit(1)
+elif not os.access(out_dir, os.W_OK):
+  output_info('output directory is newly created <' + out_dir + '>')
+  os.makedirs(out_dir)
+else:
+  pass
+
+#####################################################################
+# external library
+#####################################################################
+
+try:
+  import cv2
+except ImportError:
+  output_error('opencv not found')
+  sys.exit(1)
+
+try:
+  from cvtest import CvtestError, open_capture
+  from cvtest.video import get_frame_count
+except ImportError:
+  output_error('cvtest not found')
+  sys.exit(1)
+
+#####################################################################
+# manifest
+#####################################################################
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+def load_manifest():
+  try:
+    with open(manifest_file) as f:
+      entry_list = json.load(f)
+  except ValueError as e:
+    output_error('invalid manifest <' + manifest_file + '> (' + str(e) + ')')
+    sys.exit(1)
+
+  if not isinstance(entry_list, list) or not entry_list:
+    output_error('no capture found in the manifest <' + manifest_file + '>')
+    sys.exit(1)
+
+  base_dir = os.path.dirname(os.path.abspath(manifest_file))
+  capture_list = []
+  name_set = set()
+
+  for i, entry in enumerate(entry_list, 1):
+    try:
+      capture_file = os.path.join(base_dir, entry['capture'])
+      matrix_files = ','.join(os.path.join(base_dir, file)
+        for file in entry['matrices'].split(','))
+      capture = {
+        'file':     capture_file,
+        'matrices': matrix_files,
+        'cols':     int(entry['cols']),
+        'rows':     int(entry['rows']),
+        'workers':  int(entry.get('workers', worker_num)),
+        'options':  shlex.split(entry.get('options', options)),
+        'name':     entry.get('name',
+          os.path.splitext(os.path.basename(capture_file))[0]),
+      }
+    except (KeyError, TypeError, ValueError, AttributeError):
+      output_error('invalid capture in the manifest <' + str(i) + '>')
+      sys.exit(1)
+
+    if capture['name'] in name_set:
+      output_error('same name of captures <' + capture['name'] + '>')
+      sys.exit(1)
+
+    if capture['workers'] < 0:
+      output_error('invalid number of workers <' + capture['name'] + '>')
+      sys.exit(1)
+
+    try:
+      cap = open_capture(capture_file)
+      capture['frames'] = get_frame_count(cap)
+      cap.release()
+    except CvtestError as e:
+      output_error(str(e))
+      sys.exit(1)
+
+    # the progress of the capture (the last frame and the frames done)
+    capture['frame']     = 0
+    capture['frame_num'] = 0
+    capture['status']    = 'waiting'
+
+    name_set.add(capture['name'])
+    capture_list.append(capture)
+
+  return capture_list
+
+#####################################################################
+# cpu slots
+#####################################################################
+
+# The cpus shared by the captures, and at most job_num captures running.
+# A capture waits for both at once, only until its own number of slots
+# is free, so that a large one does not hold up the smaller ones behind
+# it (nor holds a job while it waits for the slots). The captures wait
+# in order, and once the first of them has waited for the patience, the
+# later ones are not let go ahead of it any more, so that a large one is
+# not starved by the smaller ones.
+class SlotPool:
+  def __init__(self, slot_num, job_num, patience):
+    self.slot_num    = slot_num
+    self.free_num    = slot_num
+    self.job_num     = job_num
+    self.run_num     = 0
+    self.patience    = patience
+    self.condition   = asyncio.Condition()
+    self.ticket_iter = itertools.count()
+    # (ticket, time of the start) of the waiting captures in order
+    self.waiter_list = collections.deque()
+
+  def is_admitted(self, ticket, num):
+    if self.free_num < num or self.run_num >= self.job_num:
+      return False
+
+    head_ticket, head_start = self.waiter_list[0]
+    return ticket == head_ticket or \
+      time.monotonic() - head_start < self.patience
+
+  async def acquire(self, num):
+    async with self.condition:
+      waiter = (next(self.ticket_iter), time.monotonic())
+      self.waiter_list.append(waiter)
+
+      try:
+        await self.condition.wait_for(lambda: self.is_admitted(waiter[0], num))
+      finally:
+        self.waiter_list.remove(waiter)
+
+      self.free_num -= num
+      self.run_num  += 1
+
+      # the ones behind the first can go ahead now
+      self.condition.notify_all()
+
+  async def release(self, num):
+    async with self.condition:
+      self.free_num += num
+      self.run_num  -= 1
+      self.condition.notify_all()
+
+#####################################################################
+# function for a capture
+#####################################################################
+
+def script(name):
+  return [sys.executable, os.path.join(script_dir, name)]
+
+# pass the messages of a script through with the name of the capture
+async def relay_stderr(capture, stream):
+  async for line in stream:
+    print('[' + capture['name'] + '] ' + line.decode(errors='replace'),
+      end='', file=sys.stderr, flush=True)
+
+async def run_transform(capture, records_file):
+  command = script('homography_transform.py') + [
+    capture['file'],
+    '-c', str(capture['cols']),
+    '-r', str(capture['rows']),
+    '-m', capture['matrices'],
+    '--recognize',
+  ] + capture['options']
+
+  if capture['workers'] > 0:
+    command += ['-w', str(capture['workers'])]
+
+  proc = await asyncio.create_subprocess_exec(*command,
+    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+  relay = asyncio.create_task(relay_stderr(capture, proc.stderr))
+
+  # the records come as the frames are processed
+  with open(records_file, 'wb') as f:
+    async for line in proc.stdout:
+      f.write(line)
+      frame = line.split(b',', 1)[0]
+
+      # the records of a frame (one per roi) come together
+      if frame.isdigit() and int(frame) != capture['frame']:
+        capture['frame']      = int(frame)
+        capture['frame_num'] += 1
+
+  await relay
+  return await proc.wait()
+
+async def run_recognize(capture, records_file, timeline_file, result_file):
+  command = script('recognize_likely_number.py') + [
+    records_file, '--records', '-t', timeline_file
+  ]
+
+  with open(result_file, 'wb') as f:
+    proc = await asyncio.create_subprocess_exec(*command, stdout=f,
+      stderr=asyncio.subprocess.PIPE)
+    await relay_stderr(capture, proc.stderr)
+
+    return await proc.wait()
+
+async def run_capture(capture, slot_pool):
+  base = out_dir + '/' + capture['name']
+  records_file  = base + '.records.csv'
+  timeline_file = base + '.timeline.csv'
+  result_file   = base + '.txt'
+
+  # the main process of a capture takes a slot besides the workers (all
+  # the slots at most, so that a capture larger than the pool still runs)
+  slot_need = min(capture['workers'] + 1, slot_pool.slot_num)
+
+  await slot_pool.acquire(slot_need)
+
+  try:
+    capture['status'] = 'running'
+    capture['start']  = time.monotonic()
+
+    exit_code = await run_transform(capture, records_file)
+
+    if exit_code == 0:
+      exit_code = await run_recognize(capture, records_file, timeline_file,
+        result_file)
+  finally:
+    await slot_pool.release(slot_need)
+
+  elapsed = time.monotonic() - capture['start']
+
+  if exit_code != 0:
+    capture['status'] = 'failed'
+    output_error('capture failed <' + capture['name'] + '> (' +
+      str(exit_code) + ')')
+  else:
+    capture['status'] = 'done'
+    output_info('capture done <{}> in {:.1f} seconds -> {}'.format(
+      capture['name'], elapsed, result_file))
+
+#####################################################################
+# function for progress
+#####################################################################
+
+def format_progress(capture_list):
+  done_num = sum(1 for capture in capture_list
+    if capture['status'] in ['done', 'failed'])
+  item_list = []
+
+  for capture in capture_list:
+    if capture['status'] != 'running':
+      continue
+
+    item = '{} {}/{}'.format(capture['name'], capture['frame'],
+      capture['frames'] if capture['frames'] > 0 else '?')
+
+    # the frames done, which differ from the frame number with
+    # --start-frame or --stride
+    elapsed = time.monotonic() - capture['start']
+    if capture['frame_num'] > 0 and elapsed > 0:
+      item += ' ({:.1f} fps)'.format(capture['frame_num'] / elapsed)
+
+    item_list.append(item)
+
+  return '{}/{} captures done'.format(done_num, len(capture_list)) + \
+    (', ' + ', '.join(item_list) if item_list else '')
+
+async def report_progress(capture_list):
+  while True:
+    await asyncio.sleep(interval)
+    output_info(format_progress(capture_list))
+
+#####################################################################
+# main routine
+#####################################################################
+
+async def main(capture_list):
+  slot_pool = SlotPool(slot_num, job_num, patience)
+  reporter = asyncio.create_task(report_progress(capture_list))
+
+  try:
+    await asyncio.gather(*[run_capture(capture, slot_pool)
+      for capture in capture_list])
+  finally:
+    reporter.cancel()
+
+capture_list = load_manifest()
+asyncio.run(main(capture_list))
+
+failed_list = [capture['name'] for capture in capture_list
+  if capture['status'] != 'done']
+
+if failed_list:
+  output_error('failed captures <' + ','.join(failed_list) + '>')
+  sys.exit(1)
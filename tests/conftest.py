@@ -0,0 +1,73 @@
+######################################################################
+# default library
+######################################################################
+
+import os
+import sys
+
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+import pytest
+
+# the scripts import cvtest from the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#####################################################################
+# fixture
+#####################################################################
+
+FRAME_NUM  = 40
+FRAME_SIZE = (160, 120)
+
+# frame n (1-origin) of the test video, which differs from the others
+def make_frame(frame_number, size=FRAME_SIZE):
+  width, height = size
+  frame = numpy.zeros((height, width, 3), dtype=numpy.uint8)
+  x = (frame_number * 7) % (width - 16)
+  frame[:, :, 1] = frame_number * 5 % 256
+  frame[height // 4:height // 4 + 16, x:x + 16] = 255
+  return frame
+
+# A small MJPG video of FRAME_NUM frames, in which every frame is a
+# keyframe, so that OpenCV can seek to any frame.
+@pytest.fixture(scope='session')
+def video_file(tmp_path_factory):
+  video_file = str(tmp_path_factory.mktemp('video') / 'frames.avi')
+  writer = cv2.VideoWriter(video_file, cv2.VideoWriter_fourcc(*'MJPG'), 30,
+    FRAME_SIZE)
+
+  for frame_number in range(1, FRAME_NUM + 1):
+    writer.write(make_frame(frame_number))
+
+  writer.release()
+  return video_file
+
+# all the frames of the video as OpenCV decodes them in order
+@pytest.fixture(scope='session')
+def decoded_frames(video_file):
+  cap = cv2.VideoCapture(video_file)
+  frame_list = []
+
+  while True:
+    is_frame, frame = cap.read()
+
+    if not is_frame:
+      break
+
+    frame_list.append(frame)
+
+  cap.release()
+  return frame_list
+
+# a gray image of a qr code of the text with module_pixels pixels per
+# module and a white border, as a frame number stamped on a display
+def make_qr_image(text, module_pixels=4, border=40):
+  qr = cv2.QRCodeEncoder.create().encode(text)
+  qr = cv2.resize(qr, None, fx=module_pixels, fy=module_pixels,
+    interpolation=cv2.INTER_NEAREST)
+  return cv2.copyMakeBorder(qr, border, border, border, border,
+    cv2.BORDER_CONSTANT, value=255)
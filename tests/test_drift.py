@@ -0,0 +1,124 @@
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+import pytest
+
+from cvtest import CvtestError, DriftTracker
+from cvtest.drift import roi_polygons
+
+SIZE = (640, 480)
+
+# a roi in the middle of the capture, whose contents change every frame
+ROI_BOX = (200, 140, 240, 180)
+ROI_POLYGON = numpy.float32([[200, 140], [440, 140], [440, 320], [200, 320]])
+
+@pytest.fixture(scope='module')
+def scene():
+  rng = numpy.random.default_rng(0)
+  noise = rng.integers(0, 256, (SIZE[1], SIZE[0]), dtype=numpy.uint8)
+  gray = cv2.GaussianBlur(noise, (0, 0), 4)
+  gray = cv2.normalize(gray, None, 0, 255, cv2.NORM_MINMAX)
+  return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+# the scene shifted by (dx, dy) with the roi showing n
+def make_capture(scene, n, dx=0, dy=0):
+  frame = scene.copy()
+  x, y, w, h = ROI_BOX
+  frame[y:y + h, x:x + w] = (n * 37) % 256
+  cv2.putText(frame, str(n), (x + 20, y + 120), cv2.FONT_HERSHEY_SIMPLEX, 3,
+    (255, 255, 255), 6)
+
+  shift = numpy.float64([[1, 0, dx], [0, 1, dy]])
+  return cv2.warpAffine(frame, shift, SIZE, borderMode=cv2.BORDER_REFLECT)
+
+def make_tracker(scene, **options):
+  return DriftTracker(make_capture(scene, 0), polygon_list=[ROI_POLYGON],
+    **options)
+
+#####################################################################
+# tracker
+#####################################################################
+
+def test_no_drift(scene):
+  tracker = make_tracker(scene)
+
+  for n in range(1, 10):
+    assert tracker.update(make_capture(scene, n)) is None
+
+  assert numpy.array_equal(tracker.matrix, numpy.eye(3))
+
+def test_moving_thing(scene):
+  tracker = make_tracker(scene)
+
+  # a block crossing the capture outside the roi
+  for n in range(1, 10):
+    frame = make_capture(scene, n)
+    frame[20:100, 40 + n*40:120 + n*40] = 255
+    assert tracker.update(frame) is None
+
+# the scene creeping to (10, -6) a pixel per frame, as a drift is slow
+CREEP_LIST = [(min(n, 10), -min(n, 6)) for n in range(1, 13)]
+
+@pytest.mark.parametrize('scale', [0.25, 1.0])
+def test_drift(scene, scale):
+  tracker = make_tracker(scene, scale=scale)
+  result_list = [tracker.update(make_capture(scene, n, dx, dy))
+    for n, (dx, dy) in enumerate(CREEP_LIST, 1)]
+
+  # taken out of the dead band, and then each time by the threshold
+  taken_list = [result for result in result_list if result is not None]
+  assert len(taken_list) >= 2
+  assert all(distance > 2.0 for _, distance in taken_list)
+  assert result_list[0] is None
+
+  matrix = tracker.measure(make_capture(scene, 13, 10, -6))
+  assert matrix[:2, 2] == pytest.approx([10, -6], abs=0.5)
+  assert matrix[:2, :2] == pytest.approx(numpy.eye(2), abs=0.01)
+
+  # the roi is warped from where it is now (within the threshold)
+  assert tracker.distance(tracker.matrix, matrix) <= 2.0
+  corrected = tracker.correct([numpy.eye(3)])[0]
+  assert corrected @ [210, 134, 1] == pytest.approx([200, 140, 1], abs=2.0)
+
+def test_sudden_move(scene):
+  tracker = make_tracker(scene)
+
+  # the features moving far between two checks are not trusted
+  with pytest.raises(CvtestError):
+    tracker.update(make_capture(scene, 1, 10, -6))
+
+def test_dead_band(scene):
+  tracker = make_tracker(scene, threshold=1.0)
+
+  assert tracker.update(make_capture(scene, 1, 3, 0)) is None
+  assert numpy.array_equal(tracker.matrix, numpy.eye(3))
+
+  tracker = make_tracker(scene, threshold=1.0, dead_band=0)
+  assert tracker.update(make_capture(scene, 1, 3, 0)) is not None
+
+def test_lost(scene):
+  tracker = make_tracker(scene)
+
+  with pytest.raises(CvtestError):
+    tracker.measure(numpy.zeros_like(scene))
+
+def test_too_few_features(scene):
+  with pytest.raises(CvtestError):
+    DriftTracker(numpy.zeros_like(scene))
+
+@pytest.mark.parametrize('options', [
+  {'scale': 0}, {'scale': 1.5}, {'threshold': 0}, {'dead_band': -1}])
+def test_invalid(scene, options):
+  with pytest.raises(CvtestError):
+    DriftTracker(scene, **options)
+
+def test_roi_polygons():
+  matrix = cv2.getPerspectiveTransform(ROI_POLYGON,
+    numpy.float32([[0, 0], [120, 0], [120, 90], [0, 90]]))
+
+  polygon_list = roi_polygons([matrix], (120, 90))
+  assert len(polygon_list) == 1
+  assert polygon_list[0] == pytest.approx(ROI_POLYGON, abs=1e-3)
@@ -0,0 +1,115 @@
+######################################################################
+# default library
+######################################################################
+
+import shutil
+
+######################################################################
+# external library
+######################################################################
+
+import numpy
+import pytest
+
+from cvtest import CvtestError
+from cvtest.index import FrameIndex, build_index, load_index, read_index, \
+  index_file_name
+
+from conftest import FRAME_NUM
+
+#####################################################################
+# index
+#####################################################################
+
+def test_frame_index():
+  index = FrameIndex([0.0, 0.04, 0.1, 0.2], [1, 0, 0, 1], [48, 900, -1, 2000])
+
+  assert len(index) == 4
+  assert index.pts_of(3) == pytest.approx(0.1)
+  assert index.keyframe_of(3) == 1
+  assert index.keyframe_of(4) == 4
+  assert index.frame_at(0.0) == 1
+  assert index.frame_at(0.06) == 2
+  assert index.frame_at(0.08) == 3
+  assert index.frame_at(5.0) == 4
+
+  with pytest.raises(CvtestError):
+    index.pts_of(5)
+
+def test_unknown_keyframe():
+  index = FrameIndex([0.0, 0.04], [-1, -1], [-1, -1])
+
+  assert index.keyframe_of(2) is None
+
+def test_save_and_read(tmp_path):
+  index_file = str(tmp_path / 'a.index.csv')
+  index = FrameIndex([0.0, 1 / 3, 2 / 3], [1, 0, 0], [48, 900, 1700], 1234)
+  index.save(index_file)
+  loaded = read_index(index_file)
+
+  assert loaded.video_size == 1234
+  assert numpy.allclose(loaded.pts, index.pts)
+  assert list(loaded.keyframe) == [1, 0, 0]
+  assert list(loaded.pos) == [48, 900, 1700]
+
+def test_invalid_index(tmp_path):
+  index_file = tmp_path / 'a.index.csv'
+  index_file.write_text('frame,pts,keyframe,pos\n1,0.0,1,48\n')
+
+  with pytest.raises(CvtestError):
+    read_index(str(index_file))
+
+#####################################################################
+# build
+#####################################################################
+
+def test_build_by_opencv(video_file):
+  index = build_index(video_file, 'opencv')
+
+  assert len(index) == FRAME_NUM
+  assert index.pts[0] == 0.0
+  assert numpy.allclose(numpy.diff(index.pts), 1 / 30, atol=1e-3)
+  assert (index.keyframe == -1).all()
+
+def test_build_without_ffprobe(video_file, monkeypatch):
+  monkeypatch.setattr(shutil, 'which', lambda name: None)
+
+  assert len(build_index(video_file, 'auto')) == FRAME_NUM
+
+  with pytest.raises(CvtestError):
+    build_index(video_file, 'ffprobe')
+
+@pytest.mark.skipif(shutil.which('ffprobe') is None,
+  reason='ffprobe command not found')
+def test_build_by_ffprobe(video_file):
+  index = build_index(video_file, 'ffprobe')
+  scanned = build_index(video_file, 'opencv')
+
+  assert len(index) == FRAME_NUM
+  assert numpy.allclose(index.pts, scanned.pts, atol=1e-3)
+  assert index.keyframe_of(FRAME_NUM) is not None
+  assert (index.pos > 0).all()
+
+def test_load_index(video_file, tmp_path):
+  stale_file = str(tmp_path / 'stale.avi')
+  shutil.copy(video_file, stale_file)
+
+  assert load_index(stale_file) is None
+
+  index = build_index(stale_file, 'opencv')
+  index.save(index_file_name(stale_file))
+
+  assert len(load_index(stale_file)) == FRAME_NUM
+
+  with open(stale_file, 'ab') as f:
+    f.write(b'\0')
+
+  # told and not used, by which the video is seeked as without it
+  warn_list = []
+  assert load_index(stale_file, warn_list.append) is None
+  assert len(warn_list) == 1 and 'stale' in warn_list[0]
+
+  with open(index_file_name(stale_file), 'w') as f:
+    f.write('broken\n')
+
+  assert load_index(stale_file) is None
@@ -0,0 +1,214 @@
+######################################################################
+# default library
+######################################################################
+
+import os
+import sys
+import subprocess
+
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+import pytest
+
+from cvtest import TemplateMatcher, match_in_full, match_in_window, \
+  match_in_pyramid, search_range
+from cvtest.match import match_max_in_window, format_locations, INT_MIN, \
+  INT_MAX
+
+ANYWHERE = (INT_MIN, INT_MAX)
+
+TARGET_SIZE = (320, 240)
+TEMPLATE_SIZE = (80, 64)
+
+# smooth noise, which keeps its pattern on the reduced levels
+def make_texture(size, seed):
+  rng = numpy.random.default_rng(seed)
+  noise = rng.integers(0, 256, (size[1], size[0]), dtype=numpy.uint8)
+  texture = cv2.GaussianBlur(noise, (0, 0), 2)
+  return cv2.normalize(texture, None, 0, 255, cv2.NORM_MINMAX)
+
+@pytest.fixture(scope='module')
+def template():
+  return make_texture(TEMPLATE_SIZE, 1)
+
+# the template at (x, y) on another texture, with the noise of sigma
+def make_target(template, x, y, sigma=0, seed=2):
+  target = make_texture(TARGET_SIZE, seed)
+  height, width = template.shape
+  target[y:y + height, x:x + width] = template
+
+  if sigma > 0:
+    rng = numpy.random.default_rng(seed)
+    noise = rng.normal(0, sigma, target.shape)
+    target = numpy.clip(target + noise, 0, 255).astype(numpy.uint8)
+
+  return target
+
+def max_score(target, template):
+  raw_result = cv2.matchTemplate(target, template, cv2.TM_CCOEFF_NORMED)
+  return raw_result.max()
+
+#####################################################################
+# full resolution
+#####################################################################
+
+def test_full_hit(template):
+  target = make_target(template, 101, 37)
+
+  assert match_in_full(target, template, ANYWHERE, ANYWHERE) == (101, 37)
+  assert match_in_full(target, template, search_range(100, 5),
+    search_range(40, 5)) == (101, 37)
+  assert match_in_full(target, template, search_range(90, 5),
+    ANYWHERE) is None
+
+def test_full_miss(template):
+  assert match_in_full(make_texture(TARGET_SIZE, 2), template, ANYWHERE,
+    ANYWHERE) is None
+
+def test_window(template):
+  target = make_target(template, 101, 37)
+
+  assert match_in_window(target, template, search_range(100, 5),
+    search_range(40, 5)) == (101, 37)
+  assert match_in_window(target, template, search_range(80, 5),
+    search_range(40, 5)) is None
+
+  # the template does not fit in the ranges
+  assert match_max_in_window(target, template, (300, 310), ANYWHERE) is None
+
+#####################################################################
+# pyramid
+#####################################################################
+
+# (x, y) of the template, including the borders of the target
+LOCATION_LIST = [(101, 37), (0, 0), (TARGET_SIZE[0] - TEMPLATE_SIZE[0],
+  TARGET_SIZE[1] - TEMPLATE_SIZE[1]), (3, 170), (237, 1)]
+
+@pytest.mark.parametrize('levels', [1, 2])
+@pytest.mark.parametrize('x, y', LOCATION_LIST)
+def test_pyramid_hit(template, levels, x, y):
+  target = make_target(template, x, y)
+
+  assert match_in_pyramid(target, template, ANYWHERE, ANYWHERE,
+    levels=levels) == (x, y)
+  assert match_in_pyramid(target, template, search_range(x, 5),
+    search_range(y, 5), levels=levels) == (x, y)
+  assert match_in_pyramid(target, template, search_range(x + 20, 5),
+    ANYWHERE, levels=levels) is None
+
+@pytest.mark.parametrize('levels', [1, 2])
+def test_pyramid_miss(template, levels):
+  target = make_texture(TARGET_SIZE, 2)
+
+  assert match_in_pyramid(target, template, ANYWHERE, ANYWHERE,
+    levels=levels) is None
+
+# the noise takes the score of the template around the threshold
+@pytest.mark.parametrize('sigma', [4, 8, 10, 11, 12, 13, 14, 16, 20])
+def test_pyramid_near_threshold(template, sigma):
+  target = make_target(template, 101, 37, sigma)
+  expected = match_in_full(target, template, ANYWHERE, ANYWHERE)
+
+  assert match_in_pyramid(target, template, ANYWHERE, ANYWHERE) == expected
+
+def test_near_threshold_covered(template):
+  # the noise above gives scores on both sides of the threshold
+  score_list = [max_score(make_target(template, 101, 37, sigma), template)
+    for sigma in [4, 20]]
+
+  assert score_list[0] >= 0.95 > score_list[1]
+
+# The same template twice, whose scores differ only by the rounding,
+# which is not the same on the full target and on a window. Either of
+# them can be taken then.
+def test_pyramid_twice(template):
+  target = make_target(template, 200, 150)
+  target[20:84, 30:110] = template
+
+  assert match_in_full(target, template, ANYWHERE, ANYWHERE) in \
+    [(30, 20), (200, 150)]
+  assert match_in_pyramid(target, template, ANYWHERE, ANYWHERE) in \
+    [(30, 20), (200, 150)]
+
+# A copy with a fine pattern added (smoothed away on the reduced level)
+# is the first peak of the reduced match, while the template itself is
+# the maximum at the full resolution.
+def test_pyramid_peaks(template):
+  target = make_target(template, 203, 151)
+  checker = (numpy.indices(template.shape).sum(axis=0) % 2) * 20 - 10
+  target[20:84, 32:112] = numpy.clip(template + checker, 0, 255)
+
+  assert match_in_pyramid(target, template, ANYWHERE, ANYWHERE, levels=1) == \
+    match_in_full(target, template, ANYWHERE, ANYWHERE) == (203, 151)
+
+  # only the first peak is refined
+  assert match_in_pyramid(target, template, ANYWHERE, ANYWHERE, levels=1,
+    peak_num=1) == (32, 20)
+
+def test_pyramid_fallback(template):
+  # too small for the levels, which are reduced to 0 (the full match)
+  small = template[:20, :24].copy()
+  target = make_target(small, 77, 55)
+
+  assert min(small.shape) >> 1 < 16
+  assert match_in_pyramid(target, small, ANYWHERE, ANYWHERE,
+    levels=2) == (77, 55)
+
+  target = make_texture(TARGET_SIZE, 2)
+  assert match_in_pyramid(target, small, ANYWHERE, ANYWHERE, levels=2) == \
+    match_in_full(target, small, ANYWHERE, ANYWHERE)
+
+def test_pyramid_template_over_target(template):
+  target = make_texture((40, 40), 3)
+
+  assert match_in_pyramid(target, template, ANYWHERE, ANYWHERE,
+    levels=1) is None
+
+#####################################################################
+# matcher
+#####################################################################
+
+def test_template_matcher(template, tmp_path):
+  template_file = str(tmp_path / 'template.png')
+  cv2.imwrite(template_file, template)
+  target = make_target(template, 101, 37)
+
+  matcher = TemplateMatcher([template_file, template_file],
+    search_range(100, 5), search_range(40, 5))
+  assert matcher.match(target) == [(101, 37), (101, 37)]
+
+  loc_list = matcher.match(make_texture(TARGET_SIZE, 2))
+  assert format_locations('000001', loc_list) == '000001 - - - -'
+  assert format_locations('a.png', [(1, 2), None]) == 'a.png 1 2 - -'
+
+#####################################################################
+# script
+#####################################################################
+
+# is_match.py -p prints the same "x y" and exits with the same code
+@pytest.mark.parametrize('x, y, arg_list', [
+  (101, 37, []), (101, 37, ['-x', '100', '-y', '40']),
+  (101, 37, ['-x', '150', '-y', '40']), (None, None, [])])
+def test_script_pyramid(template, tmp_path, x, y, arg_list):
+  template_file = str(tmp_path / 'template.png')
+  target_file = str(tmp_path / 'target.png')
+  cv2.imwrite(template_file, template)
+
+  if x is None:
+    cv2.imwrite(target_file, make_texture(TARGET_SIZE, 2))
+  else:
+    cv2.imwrite(target_file, make_target(template, x, y))
+
+  script = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'is_match.py')
+  command = [sys.executable, script, template_file, target_file] + arg_list
+
+  expected = subprocess.run(command, capture_output=True)
+  result = subprocess.run(command + ['-p', '2'], capture_output=True)
+
+  assert result.returncode == expected.returncode
+  assert result.stdout == expected.stdout
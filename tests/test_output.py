@@ -0,0 +1,152 @@
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+import pytest
+
+from cvtest import CvtestError, RoiOutput, StackWriter, open_stack
+from cvtest.output import parse_stack_name, write_frame_list
+
+from conftest import make_frame
+
+ROI_SHAPE = (30, 40, 3)
+
+def make_rois(n):
+  return [make_frame(n)[:ROI_SHAPE[0], :ROI_SHAPE[1]].copy(),
+    make_frame(n)[ROI_SHAPE[0]:ROI_SHAPE[0]*2, :ROI_SHAPE[1]].copy()]
+
+#####################################################################
+# stack of frames
+#####################################################################
+
+def test_stack_writer(tmp_path):
+  stack_file = str(tmp_path / 'test_roi_01.npy')
+  frame_list = [make_rois(n)[0] for n in range(1, 6)]
+
+  writer = StackWriter(stack_file, ROI_SHAPE)
+  for frame in frame_list:
+    writer.write(frame)
+  writer.close()
+
+  frames = numpy.load(stack_file, mmap_mode='r')
+  assert frames.shape == (5,) + ROI_SHAPE
+  assert numpy.array_equal(frames, numpy.stack(frame_list))
+
+def test_stack_writer_gray(tmp_path):
+  stack_file = str(tmp_path / 'test_roi_01.npy')
+  frame = cv2.cvtColor(make_rois(1)[0], cv2.COLOR_BGR2GRAY)
+
+  writer = StackWriter(stack_file, frame.shape)
+  writer.write(frame)
+  writer.close()
+
+  assert numpy.array_equal(numpy.load(stack_file)[0], frame)
+
+def test_empty_stack(tmp_path):
+  stack_file = str(tmp_path / 'test_roi_01.npy')
+  StackWriter(stack_file, ROI_SHAPE).close()
+
+  frames, frame_list = open_stack(stack_file)
+  assert frames.shape == (0,) + ROI_SHAPE
+  assert frame_list == []
+
+def test_stack_invalid_frame(tmp_path):
+  writer = StackWriter(str(tmp_path / 'test_roi_01.npy'), ROI_SHAPE)
+
+  with pytest.raises(CvtestError):
+    writer.write(numpy.zeros(ROI_SHAPE[:2], dtype=numpy.uint8))
+
+  with pytest.raises(CvtestError):
+    writer.write(numpy.zeros(ROI_SHAPE, dtype=numpy.float32))
+
+  writer.close()
+
+def test_open_stack_frames(tmp_path):
+  stack_file = str(tmp_path / 'test_roi_01.npy')
+  numpy.save(stack_file, numpy.zeros((3,) + ROI_SHAPE, dtype=numpy.uint8))
+
+  # numbered from 1 without the frame list
+  assert open_stack(stack_file)[1] == [1, 2, 3]
+
+  write_frame_list(stack_file, [10, 20, 30])
+  assert open_stack(stack_file)[1] == [10, 20, 30]
+
+  write_frame_list(stack_file, [10, 20])
+  with pytest.raises(CvtestError):
+    open_stack(stack_file)
+
+def test_open_stack_invalid(tmp_path):
+  stack_file = tmp_path / 'test_roi_01.npy'
+  stack_file.write_bytes(b'not a stack')
+
+  with pytest.raises(CvtestError):
+    open_stack(str(stack_file))
+
+@pytest.mark.parametrize('file, roi', [
+  ('out/test_roi_01.npy', 1), ('test_roi_12.mkv', 12),
+  ('test_000001_01.png', None)])
+def test_parse_stack_name(file, roi):
+  assert parse_stack_name(file) == roi
+
+#####################################################################
+# output of the rois
+#####################################################################
+
+@pytest.mark.parametrize('out_format, extension', [
+  ('png', '.png'), ('jpeg', '.jpg')])
+def test_roi_output_images(tmp_path, out_format, extension):
+  output = RoiOutput(str(tmp_path), 'test', out_format)
+  roi_list = make_rois(7)
+
+  assert output.is_per_frame()
+
+  line_list = output.write(roi_list, 7)
+  assert line_list == ['test_000007_01' + extension,
+    'test_000007_02' + extension]
+  assert output.close() == []
+
+  image = cv2.imread(str(tmp_path / line_list[1]))
+  if out_format == 'png':
+    assert numpy.array_equal(image, roi_list[1])
+  else:
+    assert cv2.absdiff(image, roi_list[1]).mean() < 4
+
+def test_roi_output_npy(tmp_path):
+  output = RoiOutput(str(tmp_path), 'test', 'npy')
+  number_list = [3, 5, 7]
+
+  assert not output.is_per_frame()
+
+  for n in number_list:
+    assert output.write(make_rois(n), n) == []
+
+  assert output.close() == ['test_roi_01.npy', 'test_roi_02.npy']
+
+  frames, frame_list = open_stack(str(tmp_path / 'test_roi_02.npy'))
+  assert frame_list == number_list
+  for frame, n in zip(frames, number_list):
+    assert numpy.array_equal(frame, make_rois(n)[1])
+
+def test_roi_output_video(tmp_path):
+  output = RoiOutput(str(tmp_path), 'test', 'video', writer='opencv')
+
+  for n in range(1, 4):
+    output.write(make_rois(n), n)
+
+  assert output.close() == ['test_roi_01.mkv', 'test_roi_02.mkv']
+  assert (tmp_path / 'test_roi_01.mkv.frames').read_text() == '1\n2\n3\n'
+
+  cap = cv2.VideoCapture(str(tmp_path / 'test_roi_01.mkv'))
+  for n in range(1, 4):
+    is_frame, frame = cap.read()
+    assert is_frame
+    assert numpy.array_equal(frame, make_rois(n)[0])
+  cap.release()
+
+@pytest.mark.parametrize('options', [
+  {'out_format': 'tiff'}, {'png_level': 10}, {'jpeg_quality': 101}])
+def test_roi_output_invalid(tmp_path, options):
+  with pytest.raises(CvtestError):
+    RoiOutput(str(tmp_path), 'test', **options)
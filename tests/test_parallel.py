@@ -0,0 +1,143 @@
+######################################################################
+# default library
+######################################################################
+
+import os
+import random
+import time
+
+######################################################################
+# external library
+######################################################################
+
+import numpy
+import pytest
+
+from cvtest import CvtestError
+from cvtest.parallel import map_ordered, map_frames
+
+FRAME_SHAPE = (16, 16, 3)
+
+#####################################################################
+# task (at the top level to be run on the workers)
+#####################################################################
+
+def sleep_task(key):
+  time.sleep(random.random() * 0.01)
+  return key, os.getpid()
+
+def failing_task(key):
+  if key == 7:
+    raise ValueError('task failed')
+  return key
+
+def cvtest_failing_task(key):
+  if key == 7:
+    raise CvtestError('task failed')
+  return key
+
+# the slot is read before and after a random sleep, during which the
+# caller would write the next frame into it if it were reused too early
+def slot_task(frame, key):
+  first = int(frame[0, 0, 0]), int(frame[-1, -1, -1])
+  time.sleep(random.Random(key).random() * 0.01)
+  last = int(frame[0, 0, 0]), int(frame[-1, -1, -1])
+  return key, first, last
+
+def failing_slot_task(frame, key):
+  if key == 5:
+    raise RuntimeError('warp failed')
+  return key
+
+#####################################################################
+# ordered map
+#####################################################################
+
+@pytest.mark.parametrize('job_num', [1, 3])
+def test_map_ordered(job_num):
+  output_list = list(map_ordered(sleep_task, ((key,) for key in range(40)),
+    job_num))
+
+  assert [key for key, _ in output_list] == list(range(40))
+
+  pid_set = set(pid for _, pid in output_list)
+  if job_num == 1:
+    assert pid_set == {os.getpid()}
+  else:
+    assert os.getpid() not in pid_set
+
+def test_map_ordered_depth():
+  submitted = []
+
+  def args_iter():
+    for key in range(20):
+      submitted.append(key)
+      yield (key,)
+
+  # at most depth tasks are taken ahead of the one given back
+  for key, _ in map_ordered(sleep_task, args_iter(), 2, depth=3):
+    assert len(submitted) <= key + 1 + 3
+
+@pytest.mark.parametrize('task', [failing_task, cvtest_failing_task])
+def test_map_ordered_error(task):
+  output_list = []
+
+  with pytest.raises(CvtestError, match='task failed'):
+    for output in map_ordered(task, ((key,) for key in range(20)), 2):
+      output_list.append(output)
+
+  assert output_list == list(range(7))
+
+#####################################################################
+# frame slots
+#####################################################################
+
+# frames written into the slot given (or a new one on the first and
+# every 5th frame) with the value of the key
+def make_reader(frame_num):
+  state = {'key': 0, 'dst_set': set()}
+
+  def read_frame(dst):
+    if state['key'] == frame_num:
+      return None
+
+    state['key'] += 1
+    key = state['key']
+
+    if dst is None or key % 5 == 0:
+      return numpy.full(FRAME_SHAPE, key, dtype=numpy.uint8), key
+
+    state['dst_set'].add(dst.ctypes.data)
+    dst[:] = key
+    return dst, key
+
+  return read_frame, state
+
+@pytest.mark.parametrize('job_num', [1, 2, 3])
+def test_map_frames(job_num):
+  # more frames than the slots (two per job)
+  read_frame, state = make_reader(50)
+  output_list = list(map_frames(slot_task, read_frame, job_num))
+
+  assert [output[0] for output in output_list] == list(range(1, 51))
+
+  for key, first, last in output_list:
+    assert first == last == (key, key)
+
+  # decoded into each of the slots
+  assert len(state['dst_set']) == job_num * 2
+
+def test_map_frames_empty():
+  read_frame, _ = make_reader(0)
+
+  assert list(map_frames(slot_task, read_frame, 2)) == []
+
+def test_map_frames_error():
+  read_frame, _ = make_reader(50)
+  output_list = []
+
+  with pytest.raises(CvtestError, match='warp failed'):
+    for output in map_frames(failing_slot_task, read_frame, 2):
+      output_list.append(output)
+
+  assert output_list == list(range(1, 5))
@@ -0,0 +1,105 @@
+######################################################################
+# default library
+######################################################################
+
+import os
+import socket
+import tempfile
+import threading
+
+######################################################################
+# external library
+######################################################################
+
+import pytest
+
+from cvtest import CvtestError
+from cvtest.protocol import send_message, receive_message, encode_bytes, \
+  decode_bytes, make_result, get_socket_path, request_job
+
+#####################################################################
+# message
+#####################################################################
+
+def test_message_round_trip():
+  sock_a, sock_b = socket.socketpair()
+
+  with sock_a, sock_b, sock_a.makefile('rwb') as stream_a, \
+       sock_b.makefile('rwb') as stream_b:
+    job = {'op': 'recognize', 'pattern': '/tmp/a\nb', 'images': ['x', 'y']}
+    send_message(stream_a, job)
+    send_message(stream_a, make_result(1))
+
+    assert receive_message(stream_b) == job
+    assert receive_message(stream_b) == make_result(1)
+
+    # end of the stream
+    sock_a.shutdown(socket.SHUT_WR)
+    assert receive_message(stream_b) is None
+
+def test_bytes():
+  data = bytes(range(256))
+  text = encode_bytes(data)
+
+  assert isinstance(text, str)
+  assert decode_bytes(text) == data
+
+def test_make_result():
+  assert make_result(0) == {'exit_code': 0, 'stdout': '', 'errors': [],
+    'warnings': []}
+  assert make_result(1, 'out\n', ('a', 'b'), ['c']) == {'exit_code': 1,
+    'stdout': 'out\n', 'errors': ['a', 'b'], 'warnings': ['c']}
+
+def test_get_socket_path(monkeypatch):
+  monkeypatch.delenv('CVTEST_SOCKET', raising=False)
+  assert get_socket_path().endswith('-' + str(os.getuid()) + '.sock')
+
+  monkeypatch.setenv('CVTEST_SOCKET', '/tmp/test.sock')
+  assert get_socket_path() == '/tmp/test.sock'
+
+#####################################################################
+# client
+#####################################################################
+
+# the path of a unix domain socket is limited (about 100 bytes), which
+# the tmp_path of pytest can be over
+@pytest.fixture
+def socket_path():
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    yield tmp_dir + '/test.sock'
+
+# serve one connection on another thread by handler(job)
+def serve_once(socket_path, handler):
+  server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  server.bind(socket_path)
+  server.listen(1)
+
+  def serve():
+    conn, _ = server.accept()
+    with conn, conn.makefile('rwb') as stream:
+      result = handler(receive_message(stream))
+      if result is not None:
+        send_message(stream, result)
+    server.close()
+
+  thread = threading.Thread(target=serve)
+  thread.start()
+  return thread
+
+def test_request_job(socket_path):
+  thread = serve_once(socket_path,
+    lambda job: make_result(0, job['op'] + '\n'))
+
+  assert request_job(socket_path, {'op': 'match'}) == make_result(0, 'match\n')
+  thread.join()
+
+def test_request_job_no_result(socket_path):
+  thread = serve_once(socket_path, lambda job: None)
+
+  with pytest.raises(CvtestError, match='no result'):
+    request_job(socket_path, {'op': 'match'})
+  thread.join()
+
+def test_request_job_no_server(socket_path):
+  with pytest.raises(CvtestError, match='cannot connect'):
+    request_job(socket_path, {'op': 'match'})
@@ -0,0 +1,308 @@
+######################################################################
+# default library
+######################################################################
+
+import os
+import sys
+import subprocess
+
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+import pytest
+
+from cvtest import CvtestError, NumberRecognizer, parse_boxes, \
+  most_likely_number
+
+from conftest import make_qr_image
+
+FRAME_SHAPE = (360, 640)
+
+# a frame with the qr code of the number at (x, y), and the box of its
+# modules (inside the quiet zone)
+def make_qr_frame(number, x=400, y=100, module_pixels=4):
+  frame = numpy.full(FRAME_SHAPE, 160, dtype=numpy.uint8)
+  qr = make_qr_image(number, module_pixels, border=0)
+  frame[y:y + qr.shape[0], x:x + qr.shape[1]] = qr
+
+  dark = numpy.argwhere(qr < 128)
+  top, left = dark.min(axis=0)
+  bottom, right = dark.max(axis=0)
+  return frame, (x + left, y + top, right - left + 1, bottom - top + 1)
+
+# count the searches on the full image
+@pytest.fixture
+def full_count(monkeypatch):
+  count = {'full': 0}
+  recognize_in_full = NumberRecognizer.recognize_in_full
+
+  def counted(self, image, scale=1.0):
+    count['full'] += 1
+    return recognize_in_full(self, image, scale)
+
+  monkeypatch.setattr(NumberRecognizer, 'recognize_in_full', counted)
+  return count
+
+#####################################################################
+# box
+#####################################################################
+
+@pytest.mark.parametrize('boxes, box_list', [
+  ('', []), ('1,2,3,4', [(1, 2, 3, 4)]),
+  ('1,2,3,4,10,20,30,40', [(1, 2, 3, 4), (10, 20, 30, 40)])])
+def test_parse_boxes(boxes, box_list):
+  assert parse_boxes(boxes) == box_list
+
+@pytest.mark.parametrize('boxes', ['1,2,3', '1,2,3,x', '1,,2,3', '-1,2,3,4'])
+def test_parse_invalid_boxes(boxes):
+  with pytest.raises(CvtestError):
+    parse_boxes(boxes)
+
+def test_most_likely_number():
+  assert most_likely_number([]) is None
+  assert most_likely_number(['000099', '000101', '000100']) == '000101'
+
+#####################################################################
+# recognizer
+#####################################################################
+
+def test_full_image(full_count):
+  frame, _ = make_qr_frame('000123')
+  recognizer = NumberRecognizer()
+
+  assert recognizer.recognize(frame) == '000123'
+  assert full_count['full'] == 1
+
+  # not a frame number
+  frame, _ = make_qr_frame('hello')
+  assert recognizer.recognize(frame) is None
+
+def test_box_hit(full_count):
+  frame, box = make_qr_frame('000123')
+  recognizer = NumberRecognizer([box])
+
+  assert recognizer.recognize(frame) == '000123'
+  assert full_count['full'] == 0
+
+def test_box_miss(full_count):
+  frame, _ = make_qr_frame('000123')
+  recognizer = NumberRecognizer([(20, 20, 100, 100)])
+
+  # found on the full image
+  assert recognizer.recognize(frame) == '000123'
+  assert full_count['full'] == 1
+  assert recognizer.box_list == [(20, 20, 100, 100)]
+
+  # a box out of the image
+  recognizer = NumberRecognizer([(1000, 1000, 100, 100)])
+  assert recognizer.recognize(frame) == '000123'
+
+def test_box_margin(full_count):
+  frame, (x, y, w, h) = make_qr_frame('000123')
+
+  # the box of the qr code without its finder patterns
+  inner_box = (x + 30, y + 30, w - 60, h - 60)
+
+  assert NumberRecognizer([inner_box], box_margin=40).recognize(frame) == \
+    '000123'
+  assert full_count['full'] == 0
+
+  assert NumberRecognizer([inner_box], box_margin=0).recognize(frame) == \
+    '000123'
+  assert full_count['full'] == 1
+
+  with pytest.raises(CvtestError):
+    NumberRecognizer(box_margin=-1)
+
+def test_learn(full_count):
+  frame, (x, y, w, h) = make_qr_frame('000123')
+  recognizer = NumberRecognizer(learn=True)
+
+  assert recognizer.recognize(frame) == '000123'
+  assert full_count['full'] == 1
+
+  # learned on the first success
+  assert len(recognizer.box_list) == 1
+  bx, by, bw, bh = recognizer.box_list[0]
+  assert abs(bx - x) <= 2 and abs(by - y) <= 2
+  assert abs(bw - w) <= 4 and abs(bh - h) <= 4
+
+  # and used on the next frames, where it is not learned again
+  frame, _ = make_qr_frame('000124', x + 3, y + 2)
+  assert recognizer.recognize(frame) == '000124'
+  assert full_count['full'] == 1
+  assert len(recognizer.box_list) == 1
+
+def test_learn_other_position(full_count):
+  recognizer = NumberRecognizer(learn=True, learn_max=2)
+
+  for i, (x, y) in enumerate([(400, 100), (40, 40), (300, 200),
+      (400, 100)]):
+    frame, _ = make_qr_frame('00012' + str(i), x, y)
+    assert recognizer.recognize(frame) == '00012' + str(i)
+
+  # up to learn_max boxes
+  assert len(recognizer.box_list) == 2
+  assert full_count['full'] == 3
+
+def test_no_learn():
+  frame, _ = make_qr_frame('000123')
+  recognizer = NumberRecognizer()
+
+  recognizer.recognize(frame)
+  assert recognizer.box_list == []
+
+def test_recognize_file(tmp_path):
+  frame, _ = make_qr_frame('000123')
+  image_file = str(tmp_path / 'frame.png')
+  cv2.imwrite(image_file, frame)
+
+  assert NumberRecognizer().recognize_file(image_file) == '000123'
+
+  with pytest.raises(CvtestError):
+    NumberRecognizer().recognize_file(str(tmp_path / 'none.png'))
+
+#####################################################################
+# prefilter
+#####################################################################
+
+# the scales of the images searched, and the numbers found on them
+@pytest.fixture
+def search_list(monkeypatch):
+  search_list = []
+  recognize_in_image = NumberRecognizer.recognize_in_image
+
+  def recorded(self, image, scale=1.0):
+    number = recognize_in_image(self, image, scale)
+    search_list.append((scale, number))
+    return number
+
+  monkeypatch.setattr(NumberRecognizer, 'recognize_in_image', recorded)
+  return search_list
+
+def test_prefilter_image():
+  frame, _ = make_qr_frame('000123')
+  recognizer = NumberRecognizer(prefilter_scale=0.5)
+
+  for image in [frame, cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)]:
+    prefiltered = recognizer.prefilter(image)
+
+    assert prefiltered.shape == (FRAME_SHAPE[0] // 2, FRAME_SHAPE[1] // 2)
+    assert set(numpy.unique(prefiltered)) <= {0, 255}
+
+def test_prefilter_hit(search_list):
+  frame, _ = make_qr_frame('000123')
+
+  assert NumberRecognizer(prefilter_scale=0.5).recognize(frame) == '000123'
+  assert search_list == [(0.5, '000123')]
+
+def test_prefilter_miss(search_list):
+  # too small modules for the scale
+  frame, _ = make_qr_frame('000123', module_pixels=2)
+
+  assert NumberRecognizer(prefilter_scale=0.5).recognize(frame) == '000123'
+  assert search_list == [(0.5, None), (1.0, '000123')]
+
+def test_prefilter_none(search_list):
+  frame = numpy.full(FRAME_SHAPE, 160, dtype=numpy.uint8)
+
+  assert NumberRecognizer(prefilter_scale=0.5).recognize(frame) is None
+  assert search_list == [(0.5, None), (1.0, None)]
+
+def test_prefilter_scale_one(search_list):
+  frame, _ = make_qr_frame('000123')
+
+  # binarized without downscaling
+  assert NumberRecognizer(prefilter_scale=1).recognize(frame) == '000123'
+  assert search_list == [(1, '000123')]
+
+@pytest.mark.parametrize('scale', [-0.1, 1.5])
+def test_prefilter_invalid(scale):
+  with pytest.raises(CvtestError):
+    NumberRecognizer(prefilter_scale=scale)
+
+def test_prefilter_boxes(search_list):
+  frame, (x, y, w, h) = make_qr_frame('000123')
+  recognizer = NumberRecognizer(learn=True, prefilter_scale=0.5)
+
+  assert recognizer.recognize(frame) == '000123'
+
+  # learned on the prefiltered image in the scale of the image as given
+  bx, by, bw, bh = recognizer.box_list[0]
+  assert abs(bx - x) <= 4 and abs(by - y) <= 4
+  assert abs(bw - w) <= 6 and abs(bh - h) <= 6
+
+  # and cropped on the prefiltered image by the scale
+  frame, _ = make_qr_frame('000124')
+  assert recognizer.recognize(frame) == '000124'
+  assert search_list[-1] == (0.5, '000124')
+
+def test_prefilter_file(tmp_path):
+  frame, _ = make_qr_frame('000123', module_pixels=2)
+  image_file = str(tmp_path / 'frame.png')
+  cv2.imwrite(image_file, cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR))
+
+  # read in gray, and the fallback on it
+  assert NumberRecognizer(prefilter_scale=0.5).recognize_file(image_file) == \
+    '000123'
+
+#####################################################################
+# script
+#####################################################################
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_recognize(arg_list):
+  return subprocess.run([sys.executable,
+    os.path.join(REPO_DIR, 'recognize_likely_number.py')] + arg_list,
+    capture_output=True)
+
+# rois of homography_transform.py with the numbers of the frames
+@pytest.fixture
+def roi_files(tmp_path):
+  box_list = []
+
+  for frame_number in range(1, 7):
+    frame, box = make_qr_frame('{0:06d}'.format(frame_number + 100))
+    cv2.imwrite(str(tmp_path / 'test_{0:06d}_01.png'.format(frame_number)),
+      frame)
+    box_list.append(box)
+
+  return str(tmp_path / 'test_*.png'), box_list[0]
+
+def test_script_boxes(roi_files):
+  pattern, box = roi_files
+
+  result = run_recognize([pattern, '-b', ','.join(map(str, box))])
+  assert result.returncode == 0
+  assert result.stdout == b'000106\n'
+
+  result = run_recognize([pattern, '-l'])
+  assert result.returncode == 0
+  assert result.stdout == b'000106\n'
+  assert result.stderr.count(b'box is learned') == 1
+
+  result = run_recognize([pattern, '--box-margin', '-1'])
+  assert result.returncode == 1
+  assert b'invalid box margin' in result.stderr
+
+@pytest.mark.parametrize('arg_list', [[], ['-l'], ['--prefilter', '0.5'],
+  ['-t', 'timeline.csv']])
+def test_script_jobs(roi_files, tmp_path, monkeypatch, arg_list):
+  pattern, _ = roi_files
+  monkeypatch.chdir(tmp_path)
+
+  expected = run_recognize([pattern] + arg_list)
+  expected_timeline = (tmp_path / 'timeline.csv').read_bytes() \
+    if '-t' in arg_list else b''
+
+  result = run_recognize([pattern, '-j', '3'] + arg_list)
+
+  assert result.returncode == expected.returncode == 0
+  assert result.stdout == expected.stdout
+
+  if '-t' in arg_list:
+    assert (tmp_path / 'timeline.csv').read_bytes() == expected_timeline
@@ -0,0 +1,210 @@
+######################################################################
+# default library
+######################################################################
+
+import os
+import sys
+import random
+import threading
+import subprocess
+import time
+
+######################################################################
+# external library
+######################################################################
+
+import numpy
+import pytest
+
+from cvtest.ring import FrameRing
+
+from conftest import FRAME_NUM
+
+FRAME_SHAPE = (8, 8, 3)
+OUT_NUM = 2
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Frames of a capture as the reader of homography_transform.py, which
+# sleep a random time on decoding. The slots given to decode into are
+# checked not to be in use by the ring (read and not handed back yet).
+class FakeCapture:
+  def __init__(self, ring, frame_num, copy=False, fail_at=0):
+    self.ring      = ring
+    self.frame_num = frame_num
+    self.copy      = copy
+    self.fail_at   = fail_at
+    self.key       = 0
+    self.busy_set  = set()
+    self.lock      = threading.Lock()
+    self.rng       = random.Random(0)
+
+  def slot_of(self, array):
+    for slot, frame_slot in enumerate(self.ring.frame_slots):
+      if frame_slot is array:
+        return slot
+
+    for slot, out_list in enumerate(self.ring.out_slots):
+      if out_list is array:
+        return slot
+
+    raise AssertionError('not a slot of the ring')
+
+  def read_frame(self, dst):
+    if self.key == self.frame_num:
+      return None
+
+    slot = self.slot_of(dst)
+
+    with self.lock:
+      assert slot not in self.busy_set
+      self.busy_set.add(slot)
+
+    self.key += 1
+
+    if self.key == self.fail_at:
+      raise RuntimeError('decode failed')
+
+    time.sleep(self.rng.random() * 0.002)
+
+    if self.copy:
+      return numpy.full(FRAME_SHAPE, self.key, dtype=numpy.uint8), self.key
+
+    dst[:] = self.key
+    return dst, self.key
+
+  # the caller is done with the slot of dst_list
+  def release(self, dst_list):
+    with self.lock:
+      self.busy_set.remove(self.slot_of(dst_list))
+
+def warp_frame(frame, dst_list, key):
+  time.sleep(random.random() * 0.002)
+
+  for i, dst in enumerate(dst_list):
+    dst[:] = frame[:4, :4] + i
+
+def run_ring(ring, capture, warp=warp_frame, stop_at=0):
+  key_list = []
+
+  for dst_list, key in ring.run(capture.read_frame, warp):
+    # slow on the caller as well
+    time.sleep(random.random() * 0.002)
+
+    for i, dst in enumerate(dst_list):
+      assert (dst == key % 256 + i).all()
+
+    key_list.append(key)
+    capture.release(dst_list)
+
+    if key == stop_at:
+      break
+
+  return key_list
+
+def make_ring(depth):
+  return FrameRing(depth, FRAME_SHAPE, (4, 4, 3), OUT_NUM)
+
+#####################################################################
+# ring
+#####################################################################
+
+@pytest.mark.parametrize('depth', [2, 3, 8])
+@pytest.mark.parametrize('copy', [False, True])
+def test_ring_order(depth, copy):
+  ring = make_ring(depth)
+  capture = FakeCapture(ring, 50, copy)
+
+  assert run_ring(ring, capture) == list(range(1, 51))
+  assert capture.busy_set == set()
+
+def test_ring_empty():
+  ring = make_ring(2)
+
+  assert run_ring(ring, FakeCapture(ring, 0)) == []
+
+def test_ring_early_stop():
+  ring = make_ring(3)
+  capture = FakeCapture(ring, 50)
+  thread_num = threading.active_count()
+
+  assert run_ring(ring, capture, stop_at=10) == list(range(1, 11))
+
+  # no more than the slots are read ahead, and the threads are joined
+  assert capture.key <= 10 + 3
+  assert threading.active_count() == thread_num
+
+def test_ring_read_error():
+  ring = make_ring(3)
+  capture = FakeCapture(ring, 50, fail_at=20)
+  key_list = []
+
+  with pytest.raises(RuntimeError, match='decode failed'):
+    for dst_list, key in ring.run(capture.read_frame, warp_frame):
+      key_list.append(key)
+      capture.release(dst_list)
+
+  # the frames read before are given
+  assert key_list == list(range(1, 20))
+
+def test_ring_warp_error():
+  ring = make_ring(3)
+  capture = FakeCapture(ring, 50)
+  thread_num = threading.active_count()
+
+  def failing_warp(frame, dst_list, key):
+    if key == 20:
+      raise ValueError('warp failed')
+    warp_frame(frame, dst_list, key)
+
+  with pytest.raises(ValueError, match='warp failed'):
+    run_ring(ring, capture, failing_warp)
+
+  assert capture.key <= 20 + 3
+  assert threading.active_count() == thread_num
+
+#####################################################################
+# script
+#####################################################################
+
+def run_transform(video_file, out_dir, arg_list):
+  matrix_file = str(out_dir / 'matrix.txt')
+  numpy.savetxt(matrix_file, numpy.float64([[1, 0, -8], [0, 1, -4],
+    [0, 0, 1]]))
+
+  command = [sys.executable, os.path.join(REPO_DIR, 'homography_transform.py'),
+    video_file, '-o', 'test', '-d', str(out_dir), '-c', '64', '-r', '48',
+    '-m', matrix_file + ',' + matrix_file, '-f', 'npy'] + arg_list
+  result = subprocess.run(command, capture_output=True)
+
+  assert result.returncode == 0, result.stderr
+  return result.stdout, [numpy.load(str(out_dir / ('test_roi_0' + str(roi) +
+    '.npy'))) for roi in [1, 2]]
+
+# the same outputs in the same order as one frame at a time
+@pytest.mark.parametrize('arg_list', [[], ['--end-frame', '17'],
+  ['--start-frame', '5', '--end-frame', '30', '--stride', '3']])
+def test_transform_depth(video_file, tmp_path, arg_list):
+  (tmp_path / 'serial').mkdir()
+  (tmp_path / 'ring').mkdir()
+
+  stdout, stack_list = run_transform(video_file, tmp_path / 'serial',
+    arg_list)
+  ring_stdout, ring_stack_list = run_transform(video_file, tmp_path / 'ring',
+    arg_list + ['--depth', '3'])
+
+  assert ring_stdout == stdout
+  assert len(stack_list[0]) <= FRAME_NUM
+
+  for stack, ring_stack in zip(stack_list, ring_stack_list):
+    assert stack.shape[1:] == (48, 64, 3)
+    assert numpy.array_equal(ring_stack, stack)
+
+  frames = (tmp_path / 'ring' / 'test_roi_01.npy.frames').read_text()
+  assert frames == (tmp_path / 'serial' / 'test_roi_01.npy.frames').read_text()
+
+def test_transform_depth_frames(video_file, tmp_path):
+  run_transform(video_file, tmp_path, ['--end-frame', '17', '--depth', '2'])
+
+  frames = (tmp_path / 'test_roi_02.npy.frames').read_text().split()
+  assert frames == [str(n) for n in range(1, 18)]
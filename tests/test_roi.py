@@ -0,0 +1,155 @@
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+import pytest
+
+from cvtest import CvtestError, locate_displays, locate_stamped_frame
+from cvtest.layout import qr_corners
+from cvtest.roi import assign_qr_codes, fit_homography, order_corners, \
+  rect_corners
+
+FRAME_SIZE   = (1280, 960)
+CAPTURE_SIZE = (960, 720)
+POINT_LIST   = [(40, 20), (880, 20), (40, 460), (880, 460)]
+
+# the frame of write_framenumber.py to the capture by a camera looking
+# at the display from the side
+TRUE_MATRIX = cv2.getPerspectiveTransform(rect_corners(FRAME_SIZE),
+  numpy.float32([[50, 70], [910, 40], [900, 690], [60, 640]]))
+
+# distance on the frame between the corners of the stamped codes and
+# the corners on the capture mapped back by the matrix
+def frame_error(matrix):
+  corners = numpy.float32([qr_corners(point) for point in POINT_LIST])
+  corners = corners.reshape(1, -1, 2)
+  captured = cv2.perspectiveTransform(corners, TRUE_MATRIX)
+
+  return numpy.linalg.norm(cv2.perspectiveTransform(captured, matrix) -
+    corners, axis=2).max()
+
+# a qr code of the text at the stamped place of the point, as
+# write_framenumber.py (without the text)
+def stamp_qr(frame, point, text):
+  code = cv2.QRCodeEncoder.create().encode(text)
+  code = code[2:-2, 2:-2]
+  code = cv2.resize(code, None, fx=10, fy=10, interpolation=cv2.INTER_NEAREST)
+
+  matrix = cv2.getPerspectiveTransform(rect_corners(code.shape[::-1]),
+    qr_corners(point))
+  mask = cv2.warpPerspective(numpy.full_like(code, 255), matrix,
+    FRAME_SIZE)
+  warped = cv2.warpPerspective(code, matrix, FRAME_SIZE)
+  frame[mask > 0] = warped[mask > 0][:, numpy.newaxis]
+
+def make_capture(point_list, text='000123'):
+  frame = numpy.full((FRAME_SIZE[1], FRAME_SIZE[0], 3), 255,
+    dtype=numpy.uint8)
+
+  for point in point_list:
+    stamp_qr(frame, point, text)
+
+  return cv2.warpPerspective(frame, TRUE_MATRIX, CAPTURE_SIZE,
+    borderValue=(40, 40, 40))
+
+#####################################################################
+# stamped qr codes
+#####################################################################
+
+def test_locate_stamped_frame():
+  matrix = locate_stamped_frame([make_capture(POINT_LIST)], POINT_LIST)
+
+  assert frame_error(matrix) < 4
+
+def test_locate_stamped_frame_some_codes():
+  # the codes found on different captures (the others hidden on each)
+  image_list = [make_capture(POINT_LIST[0::3], '000001'),
+    make_capture(POINT_LIST[1:3], '000002')]
+
+  assert frame_error(locate_stamped_frame(image_list, POINT_LIST)) < 4
+
+def test_locate_stamped_frame_not_found():
+  blank = numpy.full((CAPTURE_SIZE[1], CAPTURE_SIZE[0], 3), 128,
+    dtype=numpy.uint8)
+
+  with pytest.raises(CvtestError, match='no qr code'):
+    locate_stamped_frame([blank], POINT_LIST)
+
+def test_assign_qr_codes():
+  code_list = [cv2.perspectiveTransform(qr_corners(point)[numpy.newaxis],
+    TRUE_MATRIX)[0] for point in POINT_LIST]
+
+  # in any order, and with a false detection far from the points
+  order = [2, 0, 3, 1]
+  false_code = numpy.float32([[450, 300], [480, 300], [480, 330], [450, 330]])
+
+  assert assign_qr_codes([code_list[i] for i in order] + [false_code],
+    POINT_LIST) == order + [-1]
+
+def test_assign_qr_codes_repeated():
+  # the points on a row, where only the others tell which point a code is
+  point_list = [(40, 20), (480, 20), (920, 20)]
+  code_list = [cv2.perspectiveTransform(qr_corners(point)[numpy.newaxis],
+    TRUE_MATRIX)[0] for point in point_list[1:]]
+
+  assert assign_qr_codes(code_list, point_list) in [[1, 2], [0, 1]]
+  assert assign_qr_codes([], point_list) == []
+
+def test_too_few_points():
+  with pytest.raises(CvtestError, match='too few points'):
+    fit_homography(numpy.zeros((3, 2)), numpy.zeros((3, 2)))
+
+#####################################################################
+# display quadrilateral
+#####################################################################
+
+DISPLAY_LIST = [
+  numpy.float32([[60, 100], [420, 80], [430, 330], [70, 360]]),
+  numpy.float32([[520, 120], [900, 140], [890, 400], [510, 380]]),
+]
+OUT_SIZE = (640, 360)
+
+def make_display_capture(display_list):
+  capture = numpy.full((CAPTURE_SIZE[1], CAPTURE_SIZE[0], 3), 30,
+    dtype=numpy.uint8)
+
+  for display in display_list:
+    cv2.fillConvexPoly(capture, numpy.int32(numpy.round(display)),
+      (230, 230, 230))
+
+    # some dark contents inside
+    center = numpy.int32(display.mean(axis=0))
+    cv2.putText(capture, '12', tuple(center - 20), cv2.FONT_HERSHEY_SIMPLEX,
+      1, (0, 0, 0), 3)
+
+  return capture
+
+def test_order_corners():
+  corners = DISPLAY_LIST[0]
+
+  for shift in range(4):
+    assert numpy.array_equal(order_corners(numpy.roll(corners, shift,
+      axis=0)[::-1]), corners)
+
+def test_locate_displays():
+  matrix_list = locate_displays([make_display_capture(DISPLAY_LIST)], 2,
+    OUT_SIZE)
+
+  assert len(matrix_list) == 2
+
+  # from left to right
+  for matrix, display in zip(matrix_list, DISPLAY_LIST):
+    corners = cv2.perspectiveTransform(display[numpy.newaxis], matrix)[0]
+    assert numpy.abs(corners - rect_corners(OUT_SIZE)).max() < 4
+
+def test_locate_displays_not_found():
+  blank = numpy.zeros((CAPTURE_SIZE[1], CAPTURE_SIZE[0], 3), dtype=numpy.uint8)
+
+  with pytest.raises(CvtestError, match='display is not found'):
+    locate_displays([blank], 1, OUT_SIZE)
+
+  # the order is not known with one of the two
+  with pytest.raises(CvtestError, match='display is not found'):
+    locate_displays([make_display_capture(DISPLAY_LIST[:1])], 2, OUT_SIZE)
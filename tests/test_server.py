@@ -0,0 +1,243 @@
+######################################################################
+# default library
+######################################################################
+
+import os
+import sys
+import socket
+import tempfile
+import threading
+import subprocess
+
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+import pytest
+
+from cvtest import CvtestError
+from cvtest.protocol import encode_bytes, request_job
+from cvtest.server import JobServer, run_job
+
+from conftest import make_qr_image
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#####################################################################
+# fixture
+#####################################################################
+
+# the path of a unix domain socket is limited (about 100 bytes), which
+# the tmp_path of pytest can be over
+@pytest.fixture
+def socket_path():
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    yield tmp_dir + '/test.sock'
+
+@pytest.fixture
+def server(socket_path):
+  server = JobServer(socket_path, 1)
+  thread = threading.Thread(target=server.serve_forever)
+  thread.start()
+
+  yield server
+
+  server.shutdown()
+  thread.join()
+  server.server_close()
+
+# rois of homography_transform.py showing the frame numbers
+@pytest.fixture
+def image_dir(tmp_path):
+  for frame_number, roi_number, number in [(1, 1, '000101'),
+      (1, 2, '000100'), (2, 1, '000102'), (2, 2, '000101')]:
+    cv2.imwrite(str(tmp_path / 'test_{0:06d}_{1:02d}.png'.format(
+      frame_number, roi_number)), make_qr_image(number))
+
+  return tmp_path
+
+# a target with a textured block at (x, y) = (50, 30) and its template
+@pytest.fixture
+def match_dir(tmp_path):
+  rng = numpy.random.default_rng(0)
+  target = numpy.full((120, 160), 128, dtype=numpy.uint8)
+  target[30:60, 50:90] = rng.integers(0, 256, (30, 40), dtype=numpy.uint8)
+
+  cv2.imwrite(str(tmp_path / 'target.png'), target)
+  cv2.imwrite(str(tmp_path / 'blank.png'), numpy.full_like(target, 128))
+  cv2.imwrite(str(tmp_path / 'template.png'), target[25:65, 45:95])
+  return tmp_path
+
+#####################################################################
+# job
+#####################################################################
+
+def test_recognize_job(server, image_dir):
+  result = request_job(server.socket_path, {'op': 'recognize',
+    'cwd': str(image_dir), 'pattern': 'test_*.png'})
+
+  assert result['exit_code'] == 0
+  assert result['stdout'] == '000102\n'
+
+def test_recognize_timeline_job(server, image_dir):
+  result = request_job(server.socket_path, {'op': 'recognize',
+    'cwd': str(image_dir), 'pattern': 'test_*.png', 'timeline': 'tl.csv',
+    'prefilter': 0.5})
+
+  assert result['exit_code'] == 0
+  assert result['stdout'].splitlines()[2] == \
+    'roi_02 latency_mean=1.00 latency_min=1 latency_max=1'
+  assert (image_dir / 'tl.csv').read_text().splitlines() == [
+    'frame,roi_01,roi_02', '1,101,100', '2,102,101']
+
+def test_recognize_records_job(server, tmp_path):
+  result = request_job(server.socket_path, {'op': 'recognize',
+    'pattern': '-', 'timeline': str(tmp_path / 'tl.npy'),
+    'records': True, 'record_lines': ['1,1,5\n', 'x\n', '2,1,6\n']})
+
+  assert result['exit_code'] == 0
+  assert result['stdout'].startswith('roi_01 recognized=2 missed=0')
+  assert result['warnings'] == ['invalid record skipped <x>']
+  assert numpy.load(str(tmp_path / 'tl.npy')).tolist() == [[1, 5], [2, 6]]
+
+def test_stdin_jobs(server, match_dir):
+  qr_bytes = cv2.imencode('.png', make_qr_image('000123'))[1].tobytes()
+  result = request_job(server.socket_path, {'op': 'recognize',
+    'images': [encode_bytes(qr_bytes)]})
+
+  assert result['exit_code'] == 0
+  assert result['stdout'] == '000123\n'
+
+  target_bytes = (match_dir / 'target.png').read_bytes()
+  result = request_job(server.socket_path, {'op': 'match',
+    'template': str(match_dir / 'template.png'),
+    'target_image': encode_bytes(target_bytes)})
+
+  assert result['exit_code'] == 0
+  assert result['stdout'] == '45 25\n'
+
+def test_match_job(server, match_dir):
+  job = {'op': 'match', 'cwd': str(match_dir), 'template': 'template.png',
+    'target': 'target.png'}
+
+  assert request_job(server.socket_path, job)['stdout'] == '45 25\n'
+  assert request_job(server.socket_path, dict(job, pyramid=1))['stdout'] == \
+    '45 25\n'
+
+  # out of the range of the location, and no match
+  assert request_job(server.socket_path,
+    dict(job, cord_x=100, cord_y=25))['exit_code'] == 1
+  assert request_job(server.socket_path,
+    dict(job, target='blank.png')) == {'exit_code': 1, 'stdout': '',
+      'errors': [], 'warnings': []}
+
+def test_match_batch_job(server, match_dir):
+  result = request_job(server.socket_path, {'op': 'match',
+    'cwd': str(match_dir), 'template': 'template.png,template.png',
+    'batch': True, 'target_lines': ['target.png\n', 'blank.png\n',
+      'none.png\n']})
+
+  assert result['exit_code'] == 0
+  assert result['stdout'] == 'target.png 45 25 45 25\n' + \
+    'blank.png - - - -\n' + 'none.png - - - -\n'
+  assert len(result['errors']) == 1
+
+@pytest.mark.parametrize('job', [
+  {'op': 'recognize', 'pattern': '/nonexistent/*.png'},
+  {'op': 'recognize', 'pattern': '-', 'records': True},
+  {'op': 'recognize', 'pattern': '', 'box_margin': -1},
+  {'op': 'match', 'template': '/nonexistent.png', 'target': '/'},
+  {'op': 'match', 'template': '/', 'target': '/', 'batch': True,
+    'video': True},
+  {'op': 'match', 'template': '/', 'target': '/', 'batch': True,
+    'pyramid': 1},
+  {'op': 'match'},
+  {'op': 'unknown'},
+])
+def test_error_job(job):
+  # the same as on the server, which only passes it to a worker
+  result = run_job(job)
+
+  assert result['exit_code'] == 1
+  assert result['stdout'] == ''
+  assert len(result['errors']) == 1
+
+def test_invalid_message(server):
+  with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+    sock.connect(server.socket_path)
+    sock.sendall(b'not json\n')
+
+    assert b'invalid message' in sock.makefile('rb').readline()
+
+#####################################################################
+# server
+#####################################################################
+
+def test_server_shutdown(socket_path):
+  server = JobServer(socket_path, 1)
+
+  assert os.path.exists(socket_path)
+
+  server.server_close()
+  assert not os.path.exists(socket_path)
+
+  # a socket left by a killed server is taken over
+  server = JobServer(socket_path, 1)
+  server.socket.close()
+  server.executor.shutdown()
+
+  server = JobServer(socket_path, 1)
+  server.server_close()
+
+def test_server_running(server):
+  with pytest.raises(CvtestError, match='already running'):
+    JobServer(server.socket_path, 1)
+
+#####################################################################
+# client
+#####################################################################
+
+def run_script(script, arg_list, env=None, stdin=None):
+  return subprocess.run([sys.executable, os.path.join(REPO_DIR, script)] +
+    arg_list, env=env, input=stdin, capture_output=True)
+
+# options of --help after the usage line
+def help_options(script, arg_list):
+  env = dict(os.environ, COLUMNS='200')
+  stdout = run_script(script, arg_list + ['--help'], env).stdout.decode()
+  return stdout[stdout.index('\n\n'):]
+
+@pytest.mark.parametrize('script, op', [
+  ('recognize_likely_number.py', 'recognize'), ('is_match.py', 'match')])
+def test_client_arguments(script, op):
+  assert help_options('recognition_client.py', [op]) == \
+    help_options(script, [])
+
+@pytest.mark.parametrize('script, op, arg_list', [
+  ('recognize_likely_number.py', 'recognize', ['test_*.png']),
+  ('recognize_likely_number.py', 'recognize',
+    ['test_*.png', '-t', 'tl.csv', '-l']),
+  ('recognize_likely_number.py', 'recognize', ['none_*.png']),
+  ('is_match.py', 'match', ['template.png', 'target.png', '-p', '1']),
+  ('is_match.py', 'match', ['template.png', 'blank.png']),
+  ('is_match.py', 'match', ['template.png', '-', '-b']),
+])
+def test_client_as_script(server, image_dir, match_dir, monkeypatch, script,
+                          op, arg_list):
+  # the images and the targets in one directory
+  for file in match_dir.iterdir():
+    if not (image_dir / file.name).exists():
+      os.link(str(file), str(image_dir / file.name))
+
+  monkeypatch.chdir(image_dir)
+  env = dict(os.environ, CVTEST_SOCKET=server.socket_path)
+  stdin = b'target.png\nblank.png\n'
+
+  expected = run_script(script, arg_list, stdin=stdin)
+  result = run_script('recognition_client.py', [op] + arg_list, env,
+    stdin=stdin)
+
+  assert result.returncode == expected.returncode
+  assert result.stdout == expected.stdout
@@ -0,0 +1,172 @@
+######################################################################
+# default library
+######################################################################
+
+import os
+
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+import pytest
+
+pytest.importorskip('qrcode')
+pytest.importorskip('PIL')
+
+from PIL import ImageDraw, Image
+
+from cvtest.layout import FONT_SIZE, MARGIN, QR_WIDTH, QR_HEIGHT
+from cvtest.stamp import FrameStamper, FONT_COLOR, RECT_COLOR, QR_BOXSIZE, \
+  default_font_file
+
+FRAME_SIZE = (1280, 720)
+
+# a truetype font with the digits, by CVTEST_FONT or the default one (the
+# original one or the one of fc-match)
+@pytest.fixture(scope='module')
+def font_file():
+  font_file = os.environ.get('CVTEST_FONT', default_font_file())
+
+  if not os.access(font_file, os.R_OK):
+    pytest.skip('font not found <' + font_file + '> (set CVTEST_FONT)')
+
+  return font_file
+
+def decode_qr(image):
+  info, _, _ = cv2.QRCodeDetector().detectAndDecode(image)
+  return info
+
+#####################################################################
+# patches
+#####################################################################
+
+# the number drawn by PIL at once on the rectangle
+def draw_text(stamper, num_str):
+  image = Image.new('RGB', (stamper.rect_width, stamper.rect_height),
+    RECT_COLOR)
+  ImageDraw.Draw(image).text((MARGIN - stamper.rect_box[0],
+    MARGIN - stamper.rect_box[1]), num_str, fill=FONT_COLOR,
+    font=stamper.font)
+  return numpy.array(image)
+
+@pytest.mark.parametrize('num_str', ['000000', '123456', '987650'])
+def test_text_patch(font_file, num_str):
+  stamper = FrameStamper(FRAME_SIZE, [(0, 0)], font_file)
+  patch = stamper.make_text_patch(num_str)
+
+  assert patch.shape == (stamper.rect_height, stamper.rect_width, 3)
+  assert cv2.absdiff(patch, draw_text(stamper, num_str)).max() <= 1
+
+def test_text_patch_by_advances(font_file):
+  stamper = FrameStamper(FRAME_SIZE, [(0, 0)], font_file)
+
+  # a proportional font: a narrow 1 moves the digits after it
+  stamper.digit_advances[1] = stamper.digit_advances[1] / 2
+  narrow = stamper.make_text_patch('111111')
+  wide   = stamper.make_text_patch('888888')
+
+  assert narrow.shape == wide.shape
+  assert not narrow[:, stamper.rect_width * 3 // 4:].any()
+
+@pytest.mark.parametrize('num_str', ['000001', '123456'])
+def test_qr_patch(font_file, num_str):
+  stamper = FrameStamper(FRAME_SIZE, [(0, 0)], font_file)
+  patch = stamper.make_qr_patch(num_str)
+
+  # the same as the modules repeated and resized
+  modules = stamper.load_qr_modules(num_str)
+  image = numpy.where(modules, 0, 255).astype(numpy.uint8)
+  image = numpy.repeat(numpy.repeat(image, QR_BOXSIZE, axis=0), QR_BOXSIZE,
+    axis=1)
+
+  assert patch.shape == (QR_HEIGHT, QR_WIDTH)
+  assert cv2.absdiff(patch, cv2.resize(image, (QR_WIDTH, QR_HEIGHT))).max() <= 1
+  assert decode_qr(patch) == num_str
+
+def test_qr_cache(font_file, tmp_path):
+  stamper = FrameStamper(FRAME_SIZE, [(0, 0)], font_file,
+    cache_dir=str(tmp_path))
+  modules = stamper.load_qr_modules('000042')
+  cache_list = list(tmp_path.glob('qr_*/000042.npy'))
+
+  assert len(cache_list) == 1
+  assert numpy.array_equal(numpy.load(str(cache_list[0])), modules)
+  assert numpy.array_equal(stamper.load_qr_modules('000042'), modules)
+
+#####################################################################
+# stamp
+#####################################################################
+
+POINT_LIST = [(40, 40), (700, 100)]
+
+def gray_frame():
+  return numpy.full((FRAME_SIZE[1], FRAME_SIZE[0], 3), 128, dtype=numpy.uint8)
+
+# the top left of the qr code of the point (with the border)
+def qr_box(point):
+  return point[1] + MARGIN*2 + FONT_SIZE, point[0]
+
+def test_stamp_all_points(font_file):
+  stamper = FrameStamper(FRAME_SIZE, POINT_LIST, font_file)
+  frame = gray_frame()
+
+  assert stamper.stamp(frame, 123, all_points=True) is frame
+
+  for point in POINT_LIST:
+    top, left = qr_box(point)
+    assert decode_qr(frame[top:top + QR_HEIGHT, left:left + QR_WIDTH]) == \
+      '000123'
+
+  # nothing is drawn apart from the stamps
+  changed = (frame != 128).any(axis=2)
+  assert not changed[:, 1200:].any()
+  assert not changed[650:, :].any()
+
+@pytest.mark.parametrize('frame_number', [1, 2, 3])
+def test_stamp_in_rotation(font_file, frame_number):
+  stamper = FrameStamper(FRAME_SIZE, POINT_LIST, font_file)
+  frame = stamper.stamp(gray_frame(), frame_number)
+
+  for i, point in enumerate(POINT_LIST):
+    top, left = qr_box(point)
+    qr_area = frame[top:top + QR_HEIGHT, left:left + QR_WIDTH]
+
+    if i == (frame_number - 1) % len(POINT_LIST):
+      assert decode_qr(qr_area) == format(frame_number, '06d')
+    else:
+      assert (qr_area == 128).all()
+
+def test_stamp_by_slices(font_file):
+  stamper = FrameStamper(FRAME_SIZE, POINT_LIST, font_file)
+  frame = stamper.stamp(gray_frame(), 42, all_points=True)
+  text_patch = stamper.make_text_patch('000042')
+
+  for x, y in POINT_LIST:
+    top  = y + stamper.rect_box[1] - MARGIN
+    left = x + stamper.rect_box[0] - MARGIN
+    assert numpy.array_equal(frame[top:top + stamper.rect_height,
+      left:left + stamper.rect_width], text_patch)
+
+def test_stamp_clipped(font_file):
+  # partly out of the frame on every side, and wholly out of it
+  point_list = [(FRAME_SIZE[0] - 100, FRAME_SIZE[1] - 100), (0, 0),
+    (FRAME_SIZE[0] + 10, 0)]
+  stamper = FrameStamper(FRAME_SIZE, point_list, font_file)
+  frame = stamper.stamp(gray_frame(), 7, all_points=True)
+
+  assert frame.shape == (FRAME_SIZE[1], FRAME_SIZE[0], 3)
+  assert (frame[-1, -1] != 128).any()
+
+def test_stamp_view(font_file):
+  stamper = FrameStamper(FRAME_SIZE, POINT_LIST, font_file)
+  frame = gray_frame()
+  whole = numpy.zeros((FRAME_SIZE[1], FRAME_SIZE[0] * 2, 3), dtype=numpy.uint8)
+  whole[:, ::2] = frame
+
+  # a frame which is not contiguous is stamped in place
+  stamper.stamp(whole[:, ::2], 5, all_points=True)
+  stamper.stamp(frame, 5, all_points=True)
+
+  assert numpy.array_equal(whole[:, ::2], frame)
@@ -0,0 +1,86 @@
+######################################################################
+# external library
+######################################################################
+
+import numpy
+import pytest
+
+from cvtest import make_timeline, write_timeline, timeline_statistics
+from cvtest.timeline import parse_roi_name, parse_record, format_record
+
+#####################################################################
+# record
+#####################################################################
+
+@pytest.mark.parametrize('file, key', [
+  ('out/test_000012_03.png', (12, 3)), ('test_000001_01.jpg', (1, 1)),
+  ('test_roi_01.npy', None), ('test.png', None)])
+def test_parse_roi_name(file, key):
+  assert parse_roi_name(file) == key
+
+@pytest.mark.parametrize('line, record', [
+  ('12,3,000345\n', (12, 3, 345)), ('12,3,', (12, 3, -1)),
+  ('12,3,abc', (12, 3, -1)), ('12,3', None), ('x,3,345', None),
+  ('12,3,345,1', None), ('', None)])
+def test_parse_record(line, record):
+  assert parse_record(line) == record
+
+def test_format_record():
+  assert format_record(12, 3, 345) == '12,3,345'
+  assert format_record(12, 3, None) == '12,3,'
+  assert parse_record(format_record(12, 3, None)) == (12, 3, -1)
+
+#####################################################################
+# timeline
+#####################################################################
+
+# frames 1-5 of two rois, where the second one is behind by a frame,
+# drops a number and misses a frame
+RECORD_LIST = [
+  (1, 1, 100), (1, 2, 99),
+  (2, 1, 101), (2, 2, 100),
+  (3, 1, 102), (3, 2, 100),
+  (4, 1, 103), (4, 2, -1),
+  (5, 1, 104), (5, 2, 103),
+]
+
+def test_make_timeline():
+  # the order of the records does not matter
+  timeline, roi_values = make_timeline(RECORD_LIST[::-1])
+
+  assert roi_values == [1, 2]
+  assert timeline.tolist() == [
+    [1, 100, 99], [2, 101, 100], [3, 102, 100], [4, 103, -1], [5, 104, 103]]
+
+def test_make_timeline_missing_record():
+  # a roi without a record on a frame is not recognized there
+  timeline, roi_values = make_timeline([(1, 1, 100), (2, 1, 101),
+    (2, 4, 100)])
+
+  assert roi_values == [1, 4]
+  assert timeline.tolist() == [[1, 100, -1], [2, 101, 100]]
+
+def test_timeline_statistics():
+  statistics = timeline_statistics(*make_timeline(RECORD_LIST))
+
+  assert statistics[0] == {'roi': 1, 'recognized': 5, 'missed': 0,
+    'dropped': 0, 'repeated': 0}
+  assert statistics[1] == {'roi': 2, 'recognized': 4, 'missed': 1,
+    'dropped': 2, 'repeated': 1, 'latency_mean': 1.25, 'latency_min': 1,
+    'latency_max': 2}
+
+@pytest.mark.parametrize('name', ['timeline.csv', 'timeline.npy'])
+def test_write_timeline(tmp_path, name):
+  timeline, roi_values = make_timeline(RECORD_LIST)
+  timeline_file = str(tmp_path / name)
+  write_timeline(timeline_file, timeline, roi_values)
+
+  if name.endswith('.npy'):
+    loaded = numpy.load(timeline_file)
+  else:
+    with open(timeline_file) as f:
+      assert f.readline().strip() == 'frame,roi_01,roi_02'
+    loaded = numpy.loadtxt(timeline_file, delimiter=',', skiprows=1,
+      dtype=numpy.int64)
+
+  assert numpy.array_equal(loaded, timeline)
@@ -0,0 +1,180 @@
+######################################################################
+# default library
+######################################################################
+
+import os
+import sys
+import json
+import subprocess
+
+######################################################################
+# external library
+######################################################################
+
+import numpy
+import pytest
+
+from cvtest import trace
+from cvtest.parallel import map_ordered, map_frames
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the tracer of the library is given back after each test
+@pytest.fixture(autouse=True)
+def null_tracer(monkeypatch):
+  monkeypatch.setattr(trace, 'tracer', trace.NullTracer())
+  monkeypatch.delenv(trace.TRACE_ENV, raising=False)
+
+def load_trace(trace_file):
+  with open(trace_file) as f:
+    return json.load(f)
+
+#####################################################################
+# tracer
+#####################################################################
+
+def test_trace_events(tmp_path):
+  trace_file = str(tmp_path / 'trace.json')
+  info_list = []
+  tracer = trace.start_trace(trace_file, '/path/to/script.py', 4,
+    output_info=info_list.append)
+
+  assert tracer is trace.tracer and tracer.enabled
+
+  for _ in range(2):
+    with tracer.span('decode'):
+      pass
+    tracer.counter('ring', read=1, warped=0)
+    tracer.add_bytes(100)
+    tracer.add_frames()
+
+  tracer.close()
+  data = load_trace(trace_file)
+
+  metadata = data['traceEvents'][0]
+  assert metadata == {'name': 'process_name', 'ph': 'M',
+    'pid': os.getpid(), 'args': {'name': 'script.py'}}
+
+  span_list = [event for event in data['traceEvents'] if event['ph'] == 'X']
+  assert len(span_list) == 2
+  for event in span_list:
+    assert event['name'] == 'decode'
+    assert event['pid'] == os.getpid()
+    assert set(event) == {'name', 'ph', 'ts', 'dur', 'pid', 'tid', 'args'}
+    assert event['dur'] >= 0 and 'cpu_us' in event['args']
+
+  counter_list = [event for event in data['traceEvents'] if event['ph'] == 'C']
+  assert [event['args'] for event in counter_list
+    if event['name'] == 'frames'] == [{'frames': 1}, {'frames': 2}]
+  assert {'read': 1, 'warped': 0} in [event['args'] for event in counter_list]
+
+  other = data['otherData']
+  assert other['process'] == 'script.py'
+  assert other['frames'] == 2
+  assert other['bytes_written'] == 200
+  assert other['stages']['decode']['count'] == 2
+  assert set(other['stages']['decode']) == {'count', 'wall_s', 'cpu_s',
+    'per_frame_ms'}
+  assert other['worker_stages'] == {}
+
+  assert info_list[0].startswith('frames 2/4 in ')
+  assert info_list[-1] == 'trace is written <' + trace_file + '>'
+
+def test_max_events(tmp_path):
+  tracer = trace.start_trace(str(tmp_path / 'trace.json'), 'script.py')
+  tracer.max_events = 3
+
+  for _ in range(10):
+    with tracer.span('warp'):
+      pass
+
+  # the totals are kept beyond the events
+  assert len(tracer.event_list) == 3
+  assert tracer.stage_dict['warp']['count'] == 10
+
+def test_trace_env(tmp_path, monkeypatch):
+  monkeypatch.setenv(trace.TRACE_ENV, str(tmp_path))
+  tracer = trace.start_trace('', 'script.py')
+  tracer.close()
+
+  assert os.listdir(str(tmp_path)) == ['script.{}.json'.format(os.getpid())]
+
+def test_null_tracer(tmp_path, monkeypatch):
+  monkeypatch.chdir(tmp_path)
+  tracer = trace.start_trace('', 'script.py')
+
+  assert isinstance(tracer, trace.NullTracer) and not tracer.enabled
+
+  # the same empty context every time
+  assert tracer.span('decode') is tracer.span('warp')
+  with tracer.span('decode'):
+    tracer.counter('ring', read=1)
+    tracer.add_bytes(100)
+    tracer.add_frames()
+
+  assert tracer.take_totals() is None
+  tracer.merge_totals(({'warp': {'count': 1, 'wall_s': 0.1, 'cpu_s': 0.1}},
+    10))
+  tracer.close()
+
+  assert os.listdir(str(tmp_path)) == []
+
+#####################################################################
+# worker
+#####################################################################
+
+def traced_task(key):
+  with trace.tracer.span('work'):
+    trace.tracer.add_bytes(10)
+  return key
+
+def traced_slot_task(frame, key):
+  return traced_task(key)
+
+def test_worker_totals(tmp_path):
+  trace_file = str(tmp_path / 'trace.json')
+  tracer = trace.start_trace(trace_file, 'script.py')
+
+  # the totals of the caller are not given back again from the workers
+  with tracer.span('before'):
+    tracer.add_bytes(1)
+
+  assert list(map_ordered(traced_task, ((key,) for key in range(20)), 2)) == \
+    list(range(20))
+
+  def read_frame(dst, frame_list=list(range(1, 11))):
+    if not frame_list:
+      return None
+    return numpy.zeros((4, 4), dtype=numpy.uint8), frame_list.pop(0)
+
+  assert list(map_frames(traced_slot_task, read_frame, 2)) == \
+    list(range(1, 11))
+
+  tracer.close()
+  other = load_trace(trace_file)['otherData']
+
+  assert other['bytes_written'] == 1 + 10 * 30
+  assert other['worker_stages']['work']['count'] == 30
+  assert 'work' not in other['stages']
+  assert other['stages']['wait']['count'] == 30
+  assert other['stages']['before']['count'] == 1
+
+def test_script_workers(video_file, tmp_path):
+  matrix_file = str(tmp_path / 'matrix.txt')
+  numpy.savetxt(matrix_file, numpy.eye(3))
+  trace_file = str(tmp_path / 'trace.json')
+
+  command = [sys.executable, os.path.join(REPO_DIR, 'homography_transform.py'),
+    video_file, '-o', 'test', '-d', str(tmp_path), '-c', '64', '-r', '48',
+    '-m', matrix_file, '-w', '2', '--trace', trace_file]
+  result = subprocess.run(command, capture_output=True)
+  assert result.returncode == 0, result.stderr
+
+  other = load_trace(trace_file)['otherData']
+  image_bytes = sum(os.path.getsize(str(tmp_path / line))
+    for line in result.stdout.decode().split())
+
+  assert other['bytes_written'] == image_bytes > 0
+  assert other['worker_stages']['warp']['count'] == other['frames']
+  assert other['worker_stages']['write']['count'] == other['frames']
+  assert 'decode' in other['stages']
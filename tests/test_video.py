@@ -0,0 +1,197 @@
+######################################################################
+# default library
+######################################################################
+
+import shutil
+
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+import pytest
+
+from cvtest import CvtestError, VideoEncoder, open_capture
+from cvtest.index import build_index
+from cvtest.video import FFmpegCapture, seek_capture
+
+from conftest import FRAME_NUM, FRAME_SIZE, make_frame
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which('ffmpeg') is None,
+  reason='ffmpeg command not found')
+
+#####################################################################
+# seek
+#####################################################################
+
+@pytest.mark.parametrize('frame_number', [1, 2, 17, FRAME_NUM])
+def test_seek_by_frame(video_file, decoded_frames, frame_number):
+  cap = open_capture(video_file)
+  seek_capture(cap, frame_number)
+  is_frame, frame = cap.read()
+
+  assert is_frame
+  assert numpy.array_equal(frame, decoded_frames[frame_number - 1])
+
+@pytest.mark.parametrize('frame_number', [2, 17, FRAME_NUM])
+def test_seek_by_index(video_file, decoded_frames, frame_number):
+  index = build_index(video_file, 'opencv')
+  cap = open_capture(video_file)
+  seek_capture(cap, frame_number, index)
+  is_frame, frame = cap.read()
+
+  assert is_frame
+  assert numpy.array_equal(frame, decoded_frames[frame_number - 1])
+
+# a backend that takes the time but lands on another frame
+class MissingCapture:
+  def __init__(self, video_file):
+    self.cap = cv2.VideoCapture(video_file)
+
+  def get(self, prop):
+    return self.cap.get(prop)
+
+  def set(self, prop, value):
+    if prop == cv2.CAP_PROP_POS_MSEC:
+      return self.cap.set(cv2.CAP_PROP_POS_FRAMES, 3)
+    return self.cap.set(prop, value)
+
+  def grab(self):
+    return self.cap.grab()
+
+  def read(self):
+    return self.cap.read()
+
+def test_seek_by_index_is_verified(video_file, decoded_frames):
+  cap = MissingCapture(video_file)
+  seek_capture(cap, 20, build_index(video_file, 'opencv'))
+  is_frame, frame = cap.read()
+
+  assert is_frame
+  assert numpy.array_equal(frame, decoded_frames[19])
+
+#####################################################################
+# ffmpeg
+#####################################################################
+
+def test_ffmpeg_not_found(video_file, monkeypatch):
+  monkeypatch.setattr(shutil, 'which', lambda name: None)
+
+  with pytest.raises(CvtestError):
+    open_capture(video_file, 'ffmpeg')
+
+  with pytest.raises(CvtestError):
+    VideoEncoder(video_file + '.mkv', FRAME_SIZE, writer='ffmpeg')
+
+@needs_ffmpeg
+def test_ffmpeg_capture_reads_all_frames(video_file, decoded_frames):
+  cap = open_capture(video_file, 'ffmpeg')
+  frame = None
+  frame_num = 0
+
+  assert isinstance(cap, FFmpegCapture)
+
+  while True:
+    is_frame, frame = cap.read(frame)
+
+    if not is_frame:
+      break
+
+    # the jpeg decoders of ffmpeg and of OpenCV may round differently
+    assert cv2.absdiff(frame, decoded_frames[frame_num]).max() <= 2
+    frame_num += 1
+
+  cap.release()
+  assert frame_num == FRAME_NUM
+
+@needs_ffmpeg
+@pytest.mark.parametrize('frame_number', [2, 17, FRAME_NUM])
+def test_ffmpeg_capture_seek(video_file, frame_number):
+  cap = open_capture(video_file, 'ffmpeg')
+  seek_capture(cap, frame_number, build_index(video_file, 'opencv'))
+
+  # the same frame decoded by ffmpeg from the start
+  reference = open_capture(video_file, 'ffmpeg')
+  for _ in range(frame_number):
+    _, expected = reference.read()
+  reference.release()
+
+  is_frame, frame = cap.read()
+  cap.release()
+
+  assert is_frame
+  assert cap.get(cv2.CAP_PROP_POS_FRAMES) == frame_number
+  assert numpy.array_equal(frame, expected)
+
+@needs_ffmpeg
+def test_ffmpeg_capture_error(video_file, tmp_path):
+  cap = open_capture(video_file, 'ffmpeg')
+  cap.video_file = str(tmp_path / 'missing.avi')
+  cap.start(0)
+
+  with pytest.raises(CvtestError):
+    cap.read()
+
+  cap.release()
+
+#####################################################################
+# encoder
+#####################################################################
+
+# the frames read back from a video of frames 1 to frame_num
+def assert_encoded(video_file, frame_num):
+  cap = cv2.VideoCapture(video_file)
+
+  for frame_number in range(1, frame_num + 1):
+    is_frame, frame = cap.read()
+
+    assert is_frame
+    assert numpy.array_equal(frame, make_frame(frame_number))
+
+  assert not cap.read()[0]
+  cap.release()
+
+@pytest.mark.parametrize('writer', ['opencv',
+  pytest.param('ffmpeg', marks=needs_ffmpeg)])
+def test_lossless_encoder(tmp_path, writer):
+  video_file = str(tmp_path / 'encoded.mkv')
+  encoder = VideoEncoder(video_file, FRAME_SIZE, writer=writer,
+    lossless=True)
+
+  for frame_number in range(1, 11):
+    encoder.write(make_frame(frame_number))
+
+  encoder.close()
+  assert_encoded(video_file, 10)
+
+@needs_ffmpeg
+def test_ffmpeg_encoder_keeps_frames(tmp_path):
+  video_file = str(tmp_path / 'encoded.mp4')
+  encoder = VideoEncoder(video_file, FRAME_SIZE, writer='ffmpeg')
+
+  for frame_number in range(1, 11):
+    encoder.write(make_frame(frame_number))
+
+  encoder.close()
+
+  # neither duplicated nor dropped by the frame rate
+  cap = cv2.VideoCapture(video_file)
+  frame_num = 0
+
+  while cap.grab():
+    frame_num += 1
+
+  cap.release()
+  assert frame_num == 10
+
+@needs_ffmpeg
+def test_ffmpeg_encoder_error(tmp_path):
+  encoder = VideoEncoder(str(tmp_path / 'encoded.mp4'), FRAME_SIZE,
+    writer='ffmpeg', ffmpeg_options='-no-such-option')
+
+  with pytest.raises(CvtestError):
+    for frame_number in range(1, 11):
+      encoder.write(make_frame(frame_number))
+
+    encoder.close()
@@ -0,0 +1,121 @@
+######################################################################
+# external library
+######################################################################
+
+import cv2
+import numpy
+import pytest
+
+from cvtest import CvtestError, FrameWarper, load_matrix, build_remap_table, \
+  load_remap_table
+
+OUT_SIZE = (120, 90)
+
+# a slanted quadrilateral of the frame into OUT_SIZE
+MATRIX = cv2.getPerspectiveTransform(
+  numpy.float32([[30, 20], [200, 35], [190, 150], [25, 130]]),
+  numpy.float32([[0, 0], [OUT_SIZE[0], 0], [OUT_SIZE[0], OUT_SIZE[1]],
+    [0, OUT_SIZE[1]]]))
+
+@pytest.fixture(scope='module')
+def frame():
+  rng = numpy.random.default_rng(0)
+  noise = rng.integers(0, 256, (180, 240, 3), dtype=numpy.uint8)
+  return cv2.GaussianBlur(noise, (0, 0), 3)
+
+#####################################################################
+# remap table
+#####################################################################
+
+def test_remap_shift(frame):
+  # whole pixels are moved as they are
+  matrix = numpy.float64([[1, 0, -10], [0, 1, -5], [0, 0, 1]])
+  map1, map2 = build_remap_table(matrix, OUT_SIZE)
+
+  assert map1.dtype == numpy.int16 and map1.shape == (OUT_SIZE[1],
+    OUT_SIZE[0], 2)
+  assert numpy.array_equal(cv2.remap(frame, map1, map2, cv2.INTER_LINEAR),
+    frame[5:5 + OUT_SIZE[1], 10:10 + OUT_SIZE[0]])
+
+def test_remap_as_perspective(frame):
+  map1, map2 = build_remap_table(MATRIX, OUT_SIZE)
+  remapped = cv2.remap(frame, map1, map2, cv2.INTER_LINEAR)
+  warped = cv2.warpPerspective(frame, MATRIX, OUT_SIZE)
+  diff = cv2.absdiff(remapped, warped)
+
+  # only rounded differently
+  assert diff.mean() < 0.5
+  assert diff.max() <= 3
+
+def test_remap_at_infinity():
+  # the line w = 0 crosses the output
+  matrix = numpy.float64([[1, 0, 0], [0, 1, 0], [0, -0.02, 1]])
+  map1, map2 = build_remap_table(numpy.linalg.inv(matrix), OUT_SIZE)
+  remapped = cv2.remap(numpy.full((180, 240), 255, dtype=numpy.uint8), map1,
+    map2, cv2.INTER_LINEAR)
+
+  assert remapped.shape == (OUT_SIZE[1], OUT_SIZE[0])
+  assert (remapped[OUT_SIZE[1] - 1] == 0).all()
+
+def test_remap_cache(tmp_path):
+  map1, map2 = load_remap_table(MATRIX, OUT_SIZE, str(tmp_path))
+  cache_list = list(tmp_path.glob('remap_*.npz'))
+
+  assert len(cache_list) == 1
+
+  cached1, cached2 = load_remap_table(MATRIX, OUT_SIZE, str(tmp_path))
+  assert numpy.array_equal(cached1, map1)
+  assert numpy.array_equal(cached2, map2)
+
+  load_remap_table(MATRIX * 2, OUT_SIZE, str(tmp_path))
+  assert len(list(tmp_path.glob('remap_*.npz'))) == 2
+
+#####################################################################
+# warper
+#####################################################################
+
+def test_warper_default(frame):
+  warper = FrameWarper([MATRIX], OUT_SIZE)
+
+  assert warper.method == 'perspective'
+  assert numpy.array_equal(warper.warp_all(frame)[0],
+    cv2.warpPerspective(frame, MATRIX, OUT_SIZE))
+
+def test_warper_remap(frame):
+  warper = FrameWarper([MATRIX, MATRIX], OUT_SIZE, 'remap')
+  dst = numpy.empty(warper.out_shape(), dtype=numpy.uint8)
+
+  assert warper.warp(frame, 1, dst) is dst
+  assert cv2.absdiff(dst, cv2.warpPerspective(frame, MATRIX,
+    OUT_SIZE)).max() <= 3
+
+def test_warper_set_matrices(frame):
+  warper = FrameWarper([MATRIX, MATRIX], OUT_SIZE, 'remap')
+  table_list = list(warper.table_list)
+  shifted = numpy.float64([[1, 0, -10], [0, 1, -5], [0, 0, 1]])
+  warper.set_matrices([MATRIX, shifted])
+
+  assert warper.table_list[0] is table_list[0]
+  assert warper.table_list[1] is not table_list[1]
+  assert numpy.array_equal(warper.warp(frame, 1),
+    frame[5:5 + OUT_SIZE[1], 10:10 + OUT_SIZE[0]])
+
+def test_warper_gray(frame):
+  warper = FrameWarper([MATRIX], OUT_SIZE, gray=True)
+  roi = warper.warp_all(frame)[0]
+
+  assert roi.shape == warper.out_shape() == (OUT_SIZE[1], OUT_SIZE[0])
+
+def test_invalid_method():
+  with pytest.raises(CvtestError):
+    FrameWarper([MATRIX], OUT_SIZE, 'nearest')
+
+def test_load_matrix(tmp_path):
+  matrix_file = tmp_path / 'roi_01.txt'
+  numpy.savetxt(str(matrix_file), MATRIX)
+
+  assert numpy.allclose(load_matrix(str(matrix_file)), MATRIX)
+
+  matrix_file.write_text('1 0\n0 1\n')
+  with pytest.raises(CvtestError):
+    load_matrix(str(matrix_file))
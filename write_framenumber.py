@@ -7,7 +7,7 @@
 import os
 import sys
 import argparse
-import re
+import shutil
 
 #####################################################################
 # utility
@@ -31,21 +31,90 @@ parser.add_argument('in_file', type=str)
 parser.add_argument('-p', '--points', type=str, default='')
 parser.add_argument('-d', '--out-dir', type=str, default='', help='output direcotry')
 parser.add_argument('--round-only', action='store_true')
+parser.add_argument('-a', '--all-points', action='store_true',
+  help='stamp every point on every frame instead of one point per frame')
+parser.add_argument('-f', '--font-file', type=str, default='',
+  help='font file of the numbers (default: the font of the original ' +
+    'setting, or a monospace font found by fc-match)')
+parser.add_argument('--cache-dir', type=str, default='',
+  help='directory to cache the qr code modules in')
+parser.add_argument('-e', '--encode', type=str, default='',
+  help='encode the frames into the video instead of writing images')
+parser.add_argument('--writer', type=str, default='ffmpeg',
+  choices=['ffmpeg', 'opencv'])
+parser.add_argument('-r', '--frame-rate', type=int, default=30)
+parser.add_argument('--profile', type=str, default='main',
+  choices=['baseline', 'main', 'high'])
+parser.add_argument('-5', '--h265', action='store_true',
+  help='enable the encoding of H265 (default: H264)')
+parser.add_argument('--ffmpeg-options', type=str, default='',
+  help='other custom options for ffmpeg')
+parser.add_argument('--decoder', type=str, default='opencv',
+  choices=['opencv', 'ffmpeg'],
+  help='decoder of the video (ffmpeg: decoded on threads of an ffmpeg ' +
+    'subprocess)')
+parser.add_argument('--start-frame', type=int, default=1,
+  help='first frame to stamp (1-origin)')
+parser.add_argument('--end-frame', type=int, default=0,
+  help='last frame to stamp (0: until the end)')
+parser.add_argument('--chunk', type=str, default='',
+  help='stamp the i-th of n even parts of the video as <i>/<n>')
+parser.add_argument('--trace', type=str, default='',
+  help='write the time of the stages as Chrome trace events to the file ' +
+    '(also enabled by CVTEST_TRACE)')
 
 args = parser.parse_args()
 in_file       = args.in_file
 points        = args.points
 out_dir       = args.out_dir
 is_round_only = args.round_only
+is_all_points = args.all_points
+font_file     = args.font_file
+cache_dir     = args.cache_dir
+encode_file   = args.encode
+writer        = args.writer
+frame_rate    = args.frame_rate
+profile       = args.profile
+is_h265       = args.h265
+ffmpeg_opts   = args.ffmpeg_options
+decoder       = args.decoder
+start_frame   = args.start_frame
+end_frame     = args.end_frame
+chunk         = args.chunk
+trace_file    = args.trace
+is_encode     = encode_file != ''
 
 if not os.access(in_file, os.F_OK) or not os.access(in_file, os.R_OK):
   output_error('invalid file specified <' + in_file + '>')
   sys.exit(1)
 
+if frame_rate <= 0:
+  output_error('invalid frame rate specified <' + str(frame_rate) + '>')
+  sys.exit(1)
+
+if is_h265 and profile != 'main':
+  output_error('invalid profile specified <' + profile + '>')
+  sys.exit(1)
+
+if is_encode and writer == 'ffmpeg' and shutil.which('ffmpeg') is None:
+  output_error('ffmpeg command not found')
+  sys.exit(1)
+
+if decoder == 'ffmpeg' and shutil.which('ffmpeg') is None:
+  output_error('ffmpeg command not found')
+  sys.exit(1)
+
+if chunk != '' and (start_frame != 1 or end_frame != 0):
+  output_error('chunk cannot be specified with start or end frame')
+  sys.exit(1)
+
 if out_dir == "":
   out_dir = os.path.splitext(os.path.basename(in_file))[0] + '_numbered'
 
-if os.path.isfile(out_dir):
+if is_encode:
+  # no image is written in the encoding mode
+  pass
+elif os.path.isfile(out_dir):
   output_error('<' + out_dir + '> exists as file')
   sys.exit(1)
 elif not os.access(out_dir, os.W_OK):
@@ -54,6 +123,10 @@ elif not os.access(out_dir, os.W_OK):
 else:
   pass
 
+if os.path.isfile(cache_dir):
+  output_error('<' + cache_dir + '> exists as file')
+  sys.exit(1)
+
 #####################################################################
 # external library
 #####################################################################
@@ -82,145 +155,117 @@ except ImportError:
   output_error('numpy not found')
   sys.exit(1)
 
-#####################################################################
-# prepare points information
-#####################################################################
-
-if re.match(r'^[0-9]+(,[0-9]+)*$', points) == None:
-  output_error('invalid points specified <' + points + '>')
-  sys.exit(1)
-
-points_all = points.split(",")
-
-if len(points_all) % 2 != 0:
-  output_error('invalid number of points specified')
-  sys.exit(1)
-
-point_num = int(len(points_all) / 2)
-xs = list(map(lambda x: int(x), points_all[0::2]))
-ys = list(map(lambda y: int(y), points_all[1::2]))
-
-points = []
-for i in range(point_num):
-  points.append((xs[i], ys[i]))
-
-#####################################################################
-# prepare video capture
-#####################################################################
-
-cap = cv2.VideoCapture(in_file)
-
-if not cap.isOpened():
-  output_error('capture cannot be opened <' + in_file + '>')
+try:
+  from cvtest import CvtestError, VideoEncoder, open_capture, trace
+  from cvtest.video import encode_file_name, get_frame_size, frame_range, \
+    seek_capture, get_frame_count
+  from cvtest.stamp import FrameStamper, default_font_file
+  from cvtest.layout import parse_points
+  from cvtest.index import load_index
+except ImportError:
+  output_error('cvtest not found')
   sys.exit(1)
 
 #####################################################################
-# setting for drawing
+# prepare
 #####################################################################
 
-font_file  = "/Users/xxxx/Library/Fonts/RictyDiminished-Regular.ttf"
-font_size  = 100
-font_color = (255, 255, 255)
+if font_file == '':
+  font_file = default_font_file()
 
-sample_str = '888888'
-margin = 30
-rect_color = (0, 0, 0)
+  if font_file == '':
+    output_error('no font file found (specify it by -f)')
+    sys.exit(1)
 
-#####################################################################
-# prepare for drawing
-#####################################################################
+encoder = None
 
-if not os.access(font_file, os.F_OK) or not os.access(font_file, os.R_OK):
-  output_error('invalid font file specified <' + font_file + '>')
+try:
+  cap = open_capture(in_file, decoder)
+
+  # the frames keep their numbers (and so their stamps) in the whole video
+  start_frame, end_frame = frame_range(cap, start_frame, end_frame, chunk)
+  seek_capture(cap, start_frame, load_index(in_file, output_warn))
+
+  frame_size = get_frame_size(cap)
+  stamper = FrameStamper(frame_size, parse_points(points), font_file,
+    cache_dir=cache_dir)
+
+  if is_encode:
+    encode_file = encode_file_name(encode_file)
+    encoder = VideoEncoder(encode_file, frame_size, frame_rate, profile,
+      is_h265, ffmpeg_opts, writer)
+except CvtestError as e:
+  output_error(str(e))
   sys.exit(1)
 
-font = ImageFont.truetype(font_file, font_size)
+point_num = len(stamper.point_list)
 
-digit_num  = len(sample_str)
-str_format = '0' + str(digit_num) + 'd'
+last_frame = end_frame if end_frame > 0 else get_frame_count(cap)
+tracer = trace.start_trace(trace_file, __file__,
+  last_frame - start_frame + 1 if last_frame > 0 else 0,
+  output_info=output_info)
 
-frame_width  = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-dummy_image = Image.new("RGB", (frame_width, frame_height), (0, 0, 0))
-dummy_draw  = ImageDraw.Draw(dummy_image)
-
-dboxs = []
-for i in range(point_num):
-  dbox_original = dummy_draw.textbbox(points[i], sample_str, font=font)
-  dbox_margin   = (
-    dbox_original[0] - margin,
-    dbox_original[1] - margin,
-    dbox_original[2] + margin,
-    dbox_original[3] + margin
-  )
-  dboxs.append(dbox_margin)
-
-#####################################################################
-# setting for QR code
-#####################################################################
+def write_frame(frame, frame_number):
+  if encoder is not None:
+    with tracer.span('encode'):
+      encoder.write(frame)
+  else:
+    out_base = out_dir + '_' + "{0:06d}".format(frame_number) + '.png'
+    out_file = out_dir + '/' + out_base
 
-qr_version = 1
-qr_level   = qrcode.constants.ERROR_CORRECT_H
-qr_boxsize = 20
-qr_border  = 4
-qr = qrcode.QRCode(qr_version, qr_level, qr_boxsize, qr_border)
+    with tracer.span('write'):
+      is_written = cv2.imwrite(out_file, frame)
 
-qr_width  = 300
-qr_height = 300
-qr_size = (qr_width, qr_height)
+    if is_written and tracer.enabled:
+      tracer.add_bytes(os.path.getsize(out_file))
+    print(out_file, flush=True)
 
 #####################################################################
 # main routine
 #####################################################################
 
-frame_number = 1
+frame_number = start_frame
+frame = None
 
-while True:
-  is_frame, frame = cap.read()
-
-  if not is_frame:
-    break
-  else:
-    frame_pil = Image.fromarray(frame)
-    draw = ImageDraw.Draw(frame_pil)
-
-    # overwrite frame number
-    num_str = format(frame_number, str_format)
-    cur_idx = int((frame_number - 1) % point_num)
-    point = points[cur_idx]
-    draw.rectangle(dboxs[cur_idx], fill=rect_color)
-    draw.text(point, num_str, fill=font_color, font=font)
-    drawn_frame = numpy.array(frame_pil)
-
-    # make qr code
-    qr.clear()
-    qr.add_data(num_str)
-    qr.make()
-    qr_image = numpy.asarray(qr.make_image()).astype(numpy.uint8)
-    cv2.normalize(qr_image, qr_image, 0, 255, cv2.NORM_MINMAX)
-    qr_resized_image = cv2.resize(qr_image, qr_size)
-    qr_rgb_image = cv2.cvtColor(qr_resized_image, cv2.COLOR_GRAY2RGB)
-
-    # overwrite qr code
-    qr_left   = point[0]
-    qr_top    = point[1] + margin*2 + font_size
-    qr_right  = qr_left + qr_width
-    qr_bottom = qr_top  + qr_height
-    drawn_frame[qr_top:qr_bottom, qr_left:qr_right] = qr_rgb_image
-
-    # write out
-    out_base = out_dir + '_' + "{0:06d}".format(frame_number) + '.png'
-    out_file = out_dir + '/' + out_base
-    cv2.imwrite(out_file, drawn_frame)
-    print(out_file, flush=True)
+try:
+  while end_frame == 0 or frame_number <= end_frame:
+    # the frame read (and stamped) last time is decoded into again
+    with tracer.span('decode'):
+      is_frame, frame = cap.read(frame)
 
-    frame_number += 1
-    if is_round_only and (frame_number > point_num):
+    if not is_frame:
       break
+    else:
+      # overwrite frame number and qr code
+      with tracer.span('stamp'):
+        frame = stamper.stamp(frame, frame_number, is_all_points)
+
+      # write out
+      write_frame(frame, frame_number)
+      tracer.add_frames()
+
+      frame_number += 1
+      # every point is stamped once from the start frame
+      if is_round_only and (frame_number - start_frame >= point_num):
+        break
+
+  if encoder is not None:
+    with tracer.span('close'):
+      encoder.close()
+
+    if tracer.enabled:
+      tracer.add_bytes(os.path.getsize(encode_file))
+except CvtestError as e:
+  output_error(str(e))
+  sys.exit(1)
 
 #####################################################################
 # cleanup
 #####################################################################
 
 cap.release()
+
+if is_encode:
+  print(encode_file, flush=True)
+
+tracer.close()